@@ -0,0 +1,75 @@
+"""Résolution de l'abattage : pots annexes, partages et paiements.
+
+Toutes les mains encore en jeu sont évaluées en un seul passage : la clé du
+tableau est calculée une fois et chaque main n'y ajoute que ses deux cartes.
+Pour sept mains, c'est plus rapide qu'un appel à ``evaluate_batch``, dont le
+coût fixe ne s'amortit qu'à partir de quelques centaines de mains. Les pots
+sont construits en un seul balayage des contributions triées : chaque niveau
+de tapis ouvre un pot auquel n'ont droit que les joueurs encore en jeu ayant
+misé au moins ce niveau. Les joueurs couchés ou partis alimentent les pots sans y avoir droit.
+"""
+
+import evaluateur
+
+
+def construire_pots(contributions, vivants):
+    """Découpe les contributions de la manche en pot principal et pots annexes
+
+    ``contributions`` associe chaque joueur (y compris couchés ou partis) au
+    total misé pendant la manche ; ``vivants`` est l'ensemble des joueurs
+    encore en jeu. Retourne une liste de ``(montant, joueurs éligibles)``,
+    du pot principal au dernier pot annexe.
+    """
+    tries = sorted(contributions.items(), key=lambda item: item[1])
+    # Les éligibles d'un pot sont un suffixe de la liste des joueurs en jeu triés
+    en_jeu = [j for j, _ in tries if j in vivants]
+    pots = []
+    precedent = 0
+    reste = len(tries)  # joueurs dont la contribution atteint le niveau courant
+    suivant = 0  # premier joueur en jeu pas encore dépassé
+    en_attente = 0  # contributions partielles des joueurs déjà dépassés
+    for joueur, niveau in tries:
+        if joueur in vivants:
+            if niveau > precedent:
+                montant = en_attente + (niveau - precedent) * reste
+                pots.append((montant, en_jeu[suivant:]))
+                precedent = niveau
+                en_attente = 0
+            suivant += 1
+        elif niveau > precedent:
+            en_attente += niveau - precedent
+        reste -= 1
+    if en_attente and pots:
+        # Mises des joueurs couchés au-delà du plus gros tapis encore en jeu
+        montant, eligibles = pots[-1]
+        pots[-1] = (montant + en_attente, eligibles)
+    return pots
+
+
+def evaluer_mains(mains, tableau):
+    """Rangs de toutes les mains, la clé du tableau n'étant calculée qu'une fois"""
+    cle_tableau = evaluateur.cle_main(tableau)
+    cles = evaluateur.CLES
+    return [evaluateur.rang_depuis_cle(cle_tableau + cles[a] + cles[b], [a, b] + tableau)
+            for a, b in mains]
+
+
+def repartir(pots, rangs, ordre):
+    """Attribue chaque pot à la meilleure main parmi ses éligibles
+
+    ``rangs`` associe chaque joueur en jeu à son rang, ``ordre`` donne les
+    joueurs à partir de la gauche du donneur : en cas de partage, les jetons
+    indivisibles vont aux premiers gagnants dans cet ordre. Retourne les gains
+    par joueur et le détail ``(montant, gagnants)`` de chaque pot.
+    """
+    position = {joueur: i for i, joueur in enumerate(ordre)}
+    gains = {}
+    details = []
+    for montant, eligibles in pots:
+        meilleur = max(rangs[j] for j in eligibles)
+        gagnants = sorted((j for j in eligibles if rangs[j] == meilleur), key=lambda j: position.get(j, len(ordre)))
+        part, reste = divmod(montant, len(gagnants))
+        for i, joueur in enumerate(gagnants):
+            gains[joueur] = gains.get(joueur, 0) + part + (1 if i < reste else 0)
+        details.append((montant, gagnants))
+    return gains, details
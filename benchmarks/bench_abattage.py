@@ -0,0 +1,80 @@
+"""Mesure du débit de l'abattage à 7 joueurs (pots annexes compris).
+
+Usage : python benchmarks/bench_abattage.py [--mains 20000] [--graine 1]
+
+Compare la résolution actuelle (``abattage``) à la logique de l'ancienne :
+un appel à ``evaluateur.evaluer`` par joueur (l'évaluateur actuel, pas
+l'ancien ``Counter``) et un seul gagnant, sans pots annexes. L'écart mesure
+donc le partage de la clé du tableau et la construction des pots, pas
+l'évaluateur.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import abattage  # noqa: E402
+import evaluateur  # noqa: E402
+
+JOUEURS = 7
+
+
+def tirer_abattages(nombre, rng):
+    """Mains, tableaux et contributions aléatoires (tapis de tailles variées)"""
+    cartes = np.argsort(rng.random((nombre, 52)), axis=1)[:, :2 * JOUEURS + 5].astype(np.uint8)
+    mains = cartes[:, :2 * JOUEURS].reshape(nombre, JOUEURS, 2)
+    tableaux = cartes[:, 2 * JOUEURS:]
+    contributions = rng.choice([50, 100, 250, 500, 1000], size=(nombre, JOUEURS))
+    couches = rng.random((nombre, JOUEURS)) < 0.3
+    couches[:, 0] = False
+    return mains.tolist(), tableaux.tolist(), contributions.tolist(), couches.tolist()
+
+
+def resoudre(mains, tableau, contributions, couches):
+    joueurs = [f'j{i}' for i in range(JOUEURS)]
+    vivants = [j for j, c in zip(joueurs, couches) if not c]
+    rangs = abattage.evaluer_mains([m for m, c in zip(mains, couches) if not c], tableau)
+    pots = abattage.construire_pots(dict(zip(joueurs, contributions)), set(vivants))
+    return abattage.repartir(pots, dict(zip(vivants, rangs)), joueurs)
+
+
+def resoudre_ancien(mains, tableau, contributions, couches):
+    """Une évaluation scalaire par joueur, tout le pot au meilleur"""
+    meilleur, gagnant = -1, None
+    for i, (main, couche) in enumerate(zip(mains, couches)):
+        if couche:
+            continue
+        rang = evaluateur.evaluer(main + tableau)
+        if rang > meilleur:
+            meilleur, gagnant = rang, i
+    return {gagnant: sum(contributions)}
+
+
+def chronometrer(fonction, donnees):
+    debut = time.perf_counter()
+    for args in zip(*donnees):
+        fonction(*args)
+    return time.perf_counter() - debut
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mains', type=int, default=20000)
+    parser.add_argument('--graine', type=int, default=1)
+    args = parser.parse_args()
+
+    donnees = tirer_abattages(args.mains, np.random.default_rng(args.graine))
+    resoudre(*(d[0] for d in donnees))  # Construction des tables hors mesure
+
+    for nom, fonction in (('abattage', resoudre), ('scalaire, pot unique', resoudre_ancien)):
+        duree = chronometrer(fonction, donnees)
+        print(f'{nom:22s} {args.mains / duree:10.0f} abattages/s  ({duree * 1e6 / args.mains:.1f} µs)')
+
+
+if __name__ == '__main__':
+    main()
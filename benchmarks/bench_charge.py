@@ -0,0 +1,291 @@
+"""Test de charge du serveur Socket.IO avec des tables simulées.
+
+Usage : python benchmarks/bench_charge.py [--tables 10,50,100] [--joueurs 3] [--duree 20]
+                                          [--reflexion 0.2] [--serveur hôte:port --pid PID]
+
+Chaque client simulé parle le même protocole que ``templates/index.html``
+(``creer_table``, ``rejoindre_partie``, ``joueur_pret``, ``action_joueur``,
+``ping_client`` ; le serveur enchaîne lui-même les manches) sur une
+connexion WebSocket Engine.IO 4, sans dépendance en dehors d'eventlet. Le serveur est lancé comme en
+production (gunicorn, un worker eventlet ; journal et historique dans un
+dossier temporaire), sauf si ``--serveur`` est donné. Les tables sont ajoutées par paliers ; pour chaque palier sont
+affichés le débit d'actions, les latences p50/p95/p99 entre l'envoi d'une
+action et la mise à jour d'état qui la suit, et la mémoire du serveur.
+
+Le client et le serveur se partagent la machine : sur peu de cœurs, le
+client consomme une partie du temps mesuré.
+"""
+
+import argparse
+import base64
+import json
+import os
+import random
+import socket as socket_systeme
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+import eventlet
+from eventlet.green import socket
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ClientSocketIO:
+    """Client Socket.IO minimal : WebSocket, textes JSON, espace de noms par défaut"""
+    def __init__(self, hote, port):
+        self.sock = socket.create_connection((hote, port))
+        cle = base64.b64encode(os.urandom(16)).decode()
+        self.sock.sendall((f'GET /socket.io/?EIO=4&transport=websocket HTTP/1.1\r\n'
+                           f'Host: {hote}:{port}\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                           f'Sec-WebSocket-Key: {cle}\r\nSec-WebSocket-Version: 13\r\n\r\n').encode())
+        self.tampon = b''
+        while b'\r\n\r\n' not in self.tampon:
+            self.tampon += self._recevoir()
+        reponse, self.tampon = self.tampon.split(b'\r\n\r\n', 1)
+        if not reponse.startswith(b'HTTP/1.1 101'):
+            raise ConnectionError(reponse.split(b'\r\n', 1)[0].decode())
+        self.lire_trame()  # Paquet OPEN d'Engine.IO
+        self.envoyer_trame('40')  # CONNECT Socket.IO
+
+    def _recevoir(self):
+        donnees = self.sock.recv(65536)
+        if not donnees:
+            raise ConnectionError('connexion fermée par le serveur')
+        return donnees
+
+    def _lire(self, taille):
+        while len(self.tampon) < taille:
+            self.tampon += self._recevoir()
+        donnees, self.tampon = self.tampon[:taille], self.tampon[taille:]
+        return donnees
+
+    def lire_trame(self):
+        octet1, octet2 = self._lire(2)
+        longueur = octet2 & 0x7f
+        if longueur == 126:
+            longueur, = struct.unpack('>H', self._lire(2))
+        elif longueur == 127:
+            longueur, = struct.unpack('>Q', self._lire(8))
+        donnees = self._lire(longueur)  # Les trames du serveur ne sont pas masquées
+        if octet1 & 0x0f == 8:
+            raise ConnectionError('fermeture WebSocket')
+        return donnees.decode()
+
+    def envoyer_trame(self, texte):
+        donnees = texte.encode()
+        masque = os.urandom(4)
+        if len(donnees) < 126:
+            entete = struct.pack('>BB', 0x81, 0x80 | len(donnees))
+        elif len(donnees) < 65536:
+            entete = struct.pack('>BBH', 0x81, 0x80 | 126, len(donnees))
+        else:
+            entete = struct.pack('>BBQ', 0x81, 0x80 | 127, len(donnees))
+        masquees = bytes(o ^ masque[i % 4] for i, o in enumerate(donnees))
+        self.sock.sendall(entete + masque + masquees)
+
+    def emit(self, evenement, donnees=None):
+        self.envoyer_trame('42' + json.dumps([evenement] if donnees is None else [evenement, donnees]))
+
+    def evenements(self):
+        """Événements reçus ``(nom, données)``, lots dépliés ; répond aux pings Engine.IO"""
+        while True:
+            trame = self.lire_trame()
+            if trame == '2':
+                self.envoyer_trame('3')
+            elif trame.startswith('42'):
+                nom, *donnees = json.loads(trame[2:])
+                if nom == 'lot':
+                    yield from (tuple(evenement) for evenement in donnees[0])
+                else:
+                    yield nom, donnees[0] if donnees else None
+
+
+def appliquer_patch(cible, patch):
+    """Même règle que le client web : None supprime, les objets sont fusionnés"""
+    for cle, valeur in patch.items():
+        if valeur is None:
+            cible.pop(cle, None)
+        elif isinstance(valeur, dict) and isinstance(cible.get(cle), dict):
+            appliquer_patch(cible[cle], valeur)
+        else:
+            cible[cle] = valeur
+
+
+class Mesures:
+    def __init__(self):
+        self.latences = []
+        self.actions = 0
+        self.erreurs = 0
+
+
+class Joueur:
+    def __init__(self, client, room, username, mesures, reflexion, rng):
+        self.client = client
+        self.room = room
+        self.username = username
+        self.mesures = mesures
+        self.reflexion = reflexion
+        self.rng = rng
+        self.etat = None
+        self.a_jouer = False  # Action en préparation ou envoyée
+        self.envoi = None  # Instant d'envoi de l'action en attente de mise à jour
+
+    def choisir(self):
+        moi = self.etat['joueurs'][self.username]
+        manque = self.etat['mise_actuelle'] - moi['mise_tour']
+        tirage = self.rng.random()
+        if manque <= 0:
+            if tirage < 0.3 and moi['jetons'] > 20:
+                return 'mise', 20
+            return 'check', 0
+        if tirage < 0.15 or manque > moi['jetons']:
+            return 'coucher', 0
+        if tirage < 0.25 and moi['jetons'] > manque + 20:
+            return 'mise', manque + 20
+        return 'suivre', 0
+
+    def jouer(self):
+        eventlet.sleep(self.reflexion * self.rng.uniform(0.5, 1.5))
+        action, montant = self.choisir()
+        self.envoi = time.perf_counter()
+        self.client.emit('action_joueur', {'room': self.room, 'username': self.username,
+                                           'action': action, 'montant': montant})
+
+    def etat_modifie(self):
+        if self.envoi is not None:
+            self.mesures.latences.append(time.perf_counter() - self.envoi)
+            self.mesures.actions += 1
+            self.envoi = None
+            self.a_jouer = False
+        etat = self.etat
+        if etat.get('tour_actuel') == self.username and etat.get('phase') != 'attente' and not self.a_jouer:
+            self.a_jouer = True
+            eventlet.spawn_n(self.jouer)
+
+    def boucle(self):
+        for nom, donnees in self.client.evenements():
+            if nom == 'update_game_state':
+                donnees.pop('v', None)
+                self.etat = donnees
+                self.etat_modifie()
+            elif nom == 'patch_etat' and self.etat is not None:
+                appliquer_patch(self.etat, donnees['etat'])
+                self.etat_modifie()
+            elif nom == 'erreur' and self.envoi is not None:
+                # Action refusée : se coucher plutôt que bloquer la table
+                self.mesures.erreurs += 1
+                self.envoi = time.perf_counter()
+                self.client.emit('action_joueur', {'room': self.room, 'username': self.username,
+                                                   'action': 'coucher', 'montant': 0})
+
+
+def pinger(client, intervalle=10):
+    while True:
+        eventlet.sleep(intervalle)
+        client.emit('ping_client')
+
+
+def ouvrir_table(numero, joueurs, adresse, mesures, reflexion, rng):
+    room = f'charge_{numero}'
+    places = []
+    for i in range(joueurs):
+        client = ClientSocketIO(*adresse)
+        username = f'c{numero}_{i}'
+        client.emit('creer_table' if i == 0 else 'rejoindre_partie', {'username': username, 'room': room})
+        joueur = Joueur(client, room, username, mesures, reflexion, random.Random(rng.random()))
+        places.append(joueur)
+        eventlet.spawn_n(joueur.boucle)
+        eventlet.spawn_n(pinger, client)
+        eventlet.sleep(0.05)  # Le créateur d'abord
+    for joueur in places:
+        joueur.client.emit('joueur_pret', {'room': room, 'username': joueur.username})
+
+
+def memoire(pid):
+    """Mémoire résidente du serveur et de ses processus fils en Mo (Linux)"""
+    try:
+        with open(f'/proc/{pid}/status') as fichier:
+            rss = next(int(ligne.split()[1]) for ligne in fichier if ligne.startswith('VmRSS:')) / 1024
+        with open(f'/proc/{pid}/task/{pid}/children') as fichier:
+            return rss + sum(memoire(int(fils)) or 0 for fils in fichier.read().split())
+    except (OSError, TypeError, StopIteration):
+        return None
+
+
+def percentile(valeurs, p):
+    return valeurs[min(len(valeurs) - 1, int(p / 100 * len(valeurs)))] if valeurs else float('nan')
+
+
+def lancer_serveur():
+    with socket_systeme.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    dossier = tempfile.mkdtemp(prefix='poker-charge-')
+    env = dict(os.environ, POKER_JOURNAL=os.path.join(dossier, 'journal'),
+               POKER_HISTORIQUE=os.path.join(dossier, 'historique.bin'))
+    serveur = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--worker-class', 'eventlet', '-w', '1',
+         '--bind', f'127.0.0.1:{port}', 'main:app'],
+        cwd=RACINE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(300):
+        try:
+            socket_systeme.create_connection(('127.0.0.1', port)).close()
+            return serveur, ('127.0.0.1', port)
+        except OSError:
+            time.sleep(0.1)
+    serveur.kill()
+    raise RuntimeError('le serveur ne démarre pas')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tables', default='10,50,100')
+    parser.add_argument('--joueurs', type=int, default=3)
+    parser.add_argument('--duree', type=float, default=20, help='secondes de mesure par palier')
+    parser.add_argument('--reflexion', type=float, default=0.2, help='temps de réflexion moyen en secondes')
+    parser.add_argument('--serveur', help='hôte:port d\'un serveur déjà lancé')
+    parser.add_argument('--pid', type=int, help='processus du serveur déjà lancé, pour sa mémoire')
+    parser.add_argument('--graine', type=int, default=1)
+    args = parser.parse_args()
+
+    serveur = None
+    if args.serveur:
+        hote, port = args.serveur.rsplit(':', 1)
+        adresse, pid = (hote, int(port)), args.pid
+    else:
+        serveur, adresse = lancer_serveur()
+        pid = serveur.pid
+
+    rng = random.Random(args.graine)
+    mesures = Mesures()
+    ouvertes = 0
+    print(f'{"tables":>6} {"clients":>7} {"actions/s":>9} {"p50 ms":>7} {"p95 ms":>7} {"p99 ms":>7} '
+          f'{"refus":>5} {"RSS Mo":>7}')
+    try:
+        for palier in (int(n) for n in args.tables.split(',')):
+            while ouvertes < palier:
+                ouvrir_table(ouvertes, args.joueurs, adresse, mesures, args.reflexion, rng)
+                ouvertes += 1
+            eventlet.sleep(2)  # Mise en route des nouvelles tables
+            mesures.latences, mesures.actions, mesures.erreurs = [], 0, 0
+            pics = []
+            debut = time.perf_counter()
+            while time.perf_counter() - debut < args.duree:
+                eventlet.sleep(0.5)
+                pics.append(memoire(pid) or 0)
+            duree = time.perf_counter() - debut
+            latences = sorted(mesures.latences)
+            print(f'{palier:6d} {palier * args.joueurs:7d} {mesures.actions / duree:9.1f} '
+                  f'{percentile(latences, 50) * 1000:7.1f} {percentile(latences, 95) * 1000:7.1f} '
+                  f'{percentile(latences, 99) * 1000:7.1f} {mesures.erreurs:5d} {max(pics):7.0f}', flush=True)
+    finally:
+        if serveur:
+            serveur.terminate()
+
+
+if __name__ == '__main__':
+    main()
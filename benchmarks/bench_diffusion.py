@@ -0,0 +1,100 @@
+"""Coût de la diffusion d'une table à ses spectateurs.
+
+Usage : python benchmarks/bench_diffusion.py [--spectateurs 0,100,500] [--joueurs 3] [--duree 10]
+
+Une table de joueurs simulés (ceux de ``bench_charge.py``) est regardée par
+un nombre croissant de spectateurs. Pour chaque palier sont affichés le
+débit d'actions, la latence des joueurs, le temps CPU du serveur par
+action, et, d'après ``/metrics``, le nombre d'encodages (appels à ``emit``,
+un par lot) rapporté au nombre de paquets écrits : le nombre d'encodages ne
+doit pas dépendre du nombre de spectateurs. La dernière colonne compte les
+``patch_etat`` remis aux clients : envoyés dans des lots, ils doivent rester
+visibles sous leur nom dans les métriques, sinon le script échoue.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import urllib.request
+
+import eventlet
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_charge import ClientSocketIO, Mesures, lancer_serveur, ouvrir_table, percentile  # noqa: E402
+
+
+def cpu(pid):
+    """Temps CPU en secondes du serveur et de ses processus fils (Linux)"""
+    with open(f'/proc/{pid}/stat') as fichier:
+        champs = fichier.read().rsplit(')', 1)[1].split()
+    total = (int(champs[11]) + int(champs[12])) / os.sysconf('SC_CLK_TCK')
+    with open(f'/proc/{pid}/task/{pid}/children') as fichier:
+        return total + sum(cpu(int(fils)) for fils in fichier.read().split())
+
+
+def compteurs(adresse):
+    """(encodages, paquets envoyés, patch_etat remis) de tous les événements, lus sur /metrics"""
+    valeurs = {'poker_emissions_total': 0, 'poker_paquets_envoyes_total': 0, 'patch_etat': 0}
+    with urllib.request.urlopen(f'http://{adresse[0]}:{adresse[1]}/metrics') as reponse:
+        for ligne in reponse.read().decode().splitlines():
+            nom = ligne.split('{', 1)[0]
+            if nom in valeurs and '(protocole)' not in ligne:
+                valeurs[nom] += int(ligne.rsplit(' ', 1)[1])
+            elif nom == 'poker_evenements_envoyes_total' and 'evenement="patch_etat"' in ligne:
+                valeurs['patch_etat'] += int(ligne.rsplit(' ', 1)[1])
+    return valeurs['poker_emissions_total'], valeurs['poker_paquets_envoyes_total'], valeurs['patch_etat']
+
+
+def regarder(adresse, room):
+    client = ClientSocketIO(*adresse)
+    client.emit('regarder_table', {'room': room})
+    for _ in client.evenements():
+        pass  # Lit tout ce que le serveur envoie ; les pings reçoivent leur réponse
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--spectateurs', default='0,100,500')
+    parser.add_argument('--joueurs', type=int, default=3)
+    parser.add_argument('--duree', type=float, default=10, help='secondes de mesure par palier')
+    parser.add_argument('--reflexion', type=float, default=0.2, help='temps de réflexion moyen en secondes')
+    parser.add_argument('--graine', type=int, default=1)
+    args = parser.parse_args()
+
+    serveur, adresse = lancer_serveur()
+    mesures = Mesures()
+    ouvrir_table(0, args.joueurs, adresse, mesures, args.reflexion, random.Random(args.graine))
+    room = 'charge_0'
+    presents = 0
+    print(f'{"spectateurs":>11} {"actions/s":>9} {"p50 ms":>7} {"p95 ms":>7} {"CPU ms/action":>13} '
+          f'{"encodages":>9} {"paquets":>8} {"patch_etat":>10}')
+    try:
+        for palier in (int(n) for n in args.spectateurs.split(',')):
+            while presents < palier:
+                eventlet.spawn_n(regarder, adresse, room)
+                presents += 1
+                if presents % 50 == 0:
+                    eventlet.sleep(0.1)
+            eventlet.sleep(2)  # Arrivée des spectateurs
+            mesures.latences, mesures.actions, mesures.erreurs = [], 0, 0
+            encodages, paquets, patchs = compteurs(adresse)
+            cpu_debut, debut = cpu(serveur.pid), time.perf_counter()
+            eventlet.sleep(args.duree)
+            duree, cpu_fin = time.perf_counter() - debut, cpu(serveur.pid)
+            encodages_fin, paquets_fin, patchs_fin = compteurs(adresse)
+            latences = sorted(mesures.latences)
+            print(f'{palier:11d} {mesures.actions / duree:9.1f} {percentile(latences, 50) * 1000:7.1f} '
+                  f'{percentile(latences, 95) * 1000:7.1f} '
+                  f'{(cpu_fin - cpu_debut) * 1000 / max(mesures.actions, 1):13.2f} '
+                  f'{encodages_fin - encodages:9d} {paquets_fin - paquets:8d} {patchs_fin - patchs:10d}', flush=True)
+            if mesures.actions and patchs_fin == patchs:
+                sys.exit('patch_etat absent de poker_evenements_envoyes_total alors que la table joue')
+    finally:
+        serveur.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Écriture et relecture de l'historique des mains.
+
+Usage : python benchmarks/bench_historique.py [--mains 200000] [--fichier /tmp/historique.bin] [--graine 1]
+
+Des mains simulées par le moteur (comme ``bench_moteur``) sont réécrites
+bloc après bloc jusqu'à ``--mains``, puis relues main par main
+(``lire_mains``) et par colonnes (``lire_colonnes``). La mémoire maximale
+du processus ne doit pas dépendre du nombre de mains relues.
+"""
+
+import argparse
+import os
+import random
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import historique  # noqa: E402
+from bench_moteur import jouer_main  # noqa: E402
+from moteur import Partie, SortieNulle  # noqa: E402
+
+
+class Collecte:
+    def __init__(self):
+        self.mains = []
+
+    def ajouter(self, main):
+        self.mains.append(main)
+
+
+def simuler(nombre, graine):
+    rng = random.Random(graine)
+    collecte = Collecte()
+    partie = Partie('simulation', sortie=SortieNulle(), historique=collecte, graine=graine)
+    for i in range(6):
+        partie.ajouter_joueur(f'joueur{i}')
+    while len(collecte.mains) < nombre:
+        if sum(1 for j in partie.joueurs.values() if j.jetons > 0) < 2:
+            for joueur in partie.joueurs.values():
+                joueur.jetons = 1000
+        jouer_main(partie, rng)
+    return collecte.mains
+
+
+def memoire_max():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Mo (Linux)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mains', type=int, default=200000)
+    parser.add_argument('--fichier', default='/tmp/historique.bin')
+    parser.add_argument('--graine', type=int, default=1)
+    args = parser.parse_args()
+
+    bloc = simuler(historique.TAILLE_BLOC, args.graine)
+    debut = time.perf_counter()
+    with open(args.fichier, 'wb') as fichier:
+        fichier.write(historique.MAGIQUE)
+        for _ in range(0, args.mains, len(bloc)):
+            fichier.write(historique.encoder_bloc(bloc))
+    duree = time.perf_counter() - debut
+    mains = -(-args.mains // len(bloc)) * len(bloc)
+    taille = os.path.getsize(args.fichier)
+    print(f'écriture  {mains / duree:10.0f} mains/s, {taille / mains:.1f} octets/main')
+    memoire = memoire_max()
+
+    debut = time.perf_counter()
+    actions = sum(len(m.actions) for m in historique.lire_mains(args.fichier))
+    duree = time.perf_counter() - debut
+    print(f'lire_mains     {mains / duree:10.0f} mains/s ({actions} actions)')
+
+    debut = time.perf_counter()
+    pot = sum(int(b['main_pot'].sum()) for b in historique.lire_colonnes(args.fichier, ('main_pot',)))
+    duree = time.perf_counter() - debut
+    print(f'lire_colonnes  {mains / duree:10.0f} mains/s (pot moyen {pot / mains:.0f}€)')
+    print(f'mémoire maximale {memoire_max():.0f} Mo (dont {memoire_max() - memoire:.0f} Mo pendant la relecture)')
+
+
+if __name__ == '__main__':
+    main()
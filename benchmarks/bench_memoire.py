@@ -0,0 +1,47 @@
+"""Mémoire occupée par les tables, au repos et pendant une manche.
+
+Usage : python benchmarks/bench_memoire.py [--tables 2000] [--joueurs 3]
+
+Mesure avec ``tracemalloc`` les octets alloués par table : ``Partie`` et
+ses joueurs, sans service d'équité ni serveur.
+"""
+
+import argparse
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from moteur import Partie, SortieNulle  # noqa: E402
+
+
+def octets_par_table(nombre, joueurs, en_jeu):
+    sortie = SortieNulle()
+    tracemalloc.start()
+    avant = tracemalloc.get_traced_memory()[0]
+    tables = []
+    for i in range(nombre):
+        partie = Partie(f'table{i}', sortie=sortie, graine=i)
+        for j in range(joueurs):
+            partie.ajouter_joueur(f'joueur{j}')
+        if en_jeu:
+            partie.distribuer_cartes()
+        tables.append(partie)
+    apres = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (apres - avant) / nombre
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tables', type=int, default=2000)
+    parser.add_argument('--joueurs', type=int, default=3)
+    args = parser.parse_args()
+
+    for libelle, en_jeu in (('au repos', False), ('en cours de manche', True)):
+        print(f'{libelle:20s} {octets_par_table(args.tables, args.joueurs, en_jeu):8.0f} octets/table')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+"""Microbenchmarks des chemins chauds du moteur, avec comparaison à une référence.
+
+Usage : python benchmarks/bench_micro.py [-k filtre] [--sauver resultats.json]
+                                         [--comparer reference.json] [--seuil 0.10]
+
+Chaque mesure est répétée (``--repetitions``) et l'on garde la médiane du
+temps par appel. ``--sauver`` écrit les résultats en JSON ; ``--comparer``
+les confronte à un fichier sauvé auparavant (sur la même machine) et sort
+avec le code 1 si un chemin a ralenti de plus de ``--seuil``.
+
+    python benchmarks/bench_micro.py --sauver reference.json   # avant la modification
+    python benchmarks/bench_micro.py --comparer reference.json # après
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lobby import Lobby, resume_table  # noqa: E402
+from moteur import CARTES, GestionTour, Partie, SortieNulle  # noqa: E402
+
+
+def _c(rang, couleur):
+    return CARTES[rang * 4 + couleur]
+
+
+# Une main de 7 cartes par catégorie, de la carte haute à la quinte flush royale
+MAINS = {
+    'carte_haute': [_c(0, 0), _c(3, 1), _c(5, 2), _c(7, 3), _c(9, 0), _c(11, 1), _c(1, 2)],
+    'paire': [_c(0, 0), _c(0, 1), _c(5, 2), _c(7, 3), _c(9, 0), _c(11, 1), _c(1, 2)],
+    'deux_paires': [_c(0, 0), _c(0, 1), _c(5, 2), _c(5, 3), _c(9, 0), _c(11, 1), _c(1, 2)],
+    'brelan': [_c(0, 0), _c(0, 1), _c(0, 2), _c(7, 3), _c(9, 0), _c(11, 1), _c(1, 2)],
+    'quinte': [_c(2, 0), _c(3, 1), _c(4, 2), _c(5, 3), _c(6, 0), _c(11, 1), _c(0, 2)],
+    'couleur': [_c(0, 0), _c(3, 0), _c(5, 0), _c(7, 0), _c(9, 0), _c(11, 1), _c(1, 2)],
+    'full': [_c(0, 0), _c(0, 1), _c(0, 2), _c(7, 3), _c(7, 0), _c(11, 1), _c(1, 2)],
+    'carre': [_c(0, 0), _c(0, 1), _c(0, 2), _c(0, 3), _c(9, 0), _c(11, 1), _c(1, 2)],
+    'quinte_flush': [_c(2, 0), _c(3, 0), _c(4, 0), _c(5, 0), _c(6, 0), _c(11, 1), _c(0, 2)],
+    'quinte_flush_royale': [_c(8, 1), _c(9, 1), _c(10, 1), _c(11, 1), _c(12, 1), _c(1, 0), _c(0, 2)],
+}
+
+
+class SortieEcoutee(SortieNulle):
+    """Sortie non muette qui jette les événements : l'état est construit comme en production"""
+    muette = False
+
+    def emettre(self, evenement):
+        pass
+
+
+def partie_assise(joueurs=6, sortie=None):
+    partie = Partie('bench', sortie=sortie or SortieNulle())
+    for i in range(joueurs):
+        partie.ajouter_joueur(f'joueur{i}')
+    return partie
+
+
+def bench_evaluer_main(categorie):
+    partie = Partie('bench')
+    main = MAINS[categorie]
+    return lambda: partie.evaluer_main(main)
+
+
+def bench_distribuer_cartes():
+    partie = partie_assise()
+
+    def distribuer():
+        for joueur in partie.joueurs.values():
+            joueur.jetons = 1000
+        partie.phase = 'attente'
+        partie.initialiser_deck()
+        partie.distribuer_cartes()
+    return distribuer
+
+
+def bench_passer_au_suivant():
+    partie = partie_assise(7)
+    partie.distribuer_cartes()
+    partie.joueurs['joueur2'].en_jeu = False  # Un joueur couché, un à tapis
+    partie.joueurs['joueur4'].jetons = 0
+    gestion = GestionTour(partie.joueurs)
+    return gestion.passer_au_suivant
+
+
+def bench_verifier_tour_complet():
+    partie = partie_assise(7)
+    partie.distribuer_cartes()
+    for joueur in partie.joueurs.values():
+        joueur.mise_tour = partie.grande_blind
+    gestion = GestionTour(partie.joueurs)
+    gestion.dernier_miseur = 'joueur3'
+    gestion.index_actuel = 3
+    return lambda: gestion.verifier_tour_complet(partie.grande_blind)
+
+
+def bench_update_game_state():
+    """Différence et patch après une mise (une seule valeur change par appel)"""
+    partie = partie_assise(sortie=SortieEcoutee())
+    partie.distribuer_cartes()
+
+    def mettre_a_jour():
+        partie.pot += 1
+        partie.update_game_state()
+    return mettre_a_jour
+
+
+def bench_etat_complet():
+    partie = partie_assise(sortie=SortieEcoutee())
+    partie.distribuer_cartes()
+    return partie.etat_complet
+
+
+def _tables(nombre):
+    return {f'table{i}': partie_assise(i % 7 + 1) for i in range(nombre)}
+
+
+def bench_liste_tables(nombre):
+    """Résumé de toutes les tables, comme l'ancien update_tables complet"""
+    tables = _tables(nombre)
+    return lambda: {room: resume_table(partie) for room, partie in tables.items()}
+
+
+def bench_patch_tables(nombre):
+    """Une table modifiée parmi ``nombre`` : patch du lobby"""
+    tables = _tables(nombre)
+    lobby = Lobby(lambda evenement, donnees: None, lambda delai, fonction: None)
+    for room, partie in tables.items():
+        lobby.table_modifiee(room, partie)
+    lobby.envoyer()
+    partie = tables['table0']
+
+    def modifier():
+        partie.joueurs['joueur0'].jetons += 1
+        lobby.table_modifiee('table0', partie)
+        lobby.envoyer()
+    return modifier
+
+
+BENCHMARKS = {
+    **{f'evaluer_main[{categorie}]': (bench_evaluer_main, categorie) for categorie in MAINS},
+    'initialiser_deck+distribuer_cartes': (bench_distribuer_cartes,),
+    'GestionTour.passer_au_suivant': (bench_passer_au_suivant,),
+    'GestionTour.verifier_tour_complet': (bench_verifier_tour_complet,),
+    'update_game_state': (bench_update_game_state,),
+    'etat_complet': (bench_etat_complet,),
+    'liste_tables[1000]': (bench_liste_tables, 1000),
+    'patch_tables[1000]': (bench_patch_tables, 1000),
+}
+
+
+def mesurer(fonction, repetitions):
+    """Temps par appel en secondes : (médiane, minimum, appels par répétition)"""
+    minuteur = timeit.Timer(fonction)
+    nombre, _ = minuteur.autorange()  # Au moins 0,2 s par répétition
+    temps = [t / nombre for t in minuteur.repeat(repetitions, nombre)]
+    return statistics.median(temps), min(temps), nombre
+
+
+def comparer(resultats, reference, seuil):
+    """Affiche l'écart à la référence ; retourne les noms des régressions"""
+    regressions = []
+    print(f'\n{"":40s} {"référence":>12s} {"actuel":>12s} {"écart":>8s}')
+    for nom, mesure in resultats.items():
+        avant = reference.get(nom)
+        if avant is None:
+            continue
+        ecart = mesure['median_ns'] / avant['median_ns'] - 1
+        verdict = ''
+        if ecart > seuil:
+            verdict = 'RÉGRESSION'
+            regressions.append(nom)
+        elif ecart < -seuil:
+            verdict = 'amélioration'
+        print(f'{nom:40s} {avant["median_ns"]:10.0f}ns {mesure["median_ns"]:10.0f}ns {ecart:+7.1%} {verdict}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-k', dest='filtre', default='', help='ne lancer que les mesures dont le nom contient ce texte')
+    parser.add_argument('--repetitions', type=int, default=5)
+    parser.add_argument('--sauver', help='fichier JSON où écrire les résultats')
+    parser.add_argument('--comparer', help='fichier JSON de référence')
+    parser.add_argument('--seuil', type=float, default=0.10, help='ralentissement toléré (0.10 = 10 %%)')
+    args = parser.parse_args()
+
+    resultats = {}
+    for nom, (fabrique, *parametres) in BENCHMARKS.items():
+        if args.filtre not in nom:
+            continue
+        median, minimum, nombre = mesurer(fabrique(*parametres), args.repetitions)
+        resultats[nom] = {'median_ns': median * 1e9, 'min_ns': minimum * 1e9, 'appels': nombre}
+        print(f'{nom:40s} {median * 1e9:10.0f} ns  (min {minimum * 1e9:.0f} ns)', flush=True)
+
+    if args.sauver:
+        with open(args.sauver, 'w') as fichier:
+            json.dump({
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'processeur': platform.processor(),
+                'resultats': resultats
+            }, fichier, indent=2)
+
+    if args.comparer:
+        with open(args.comparer) as fichier:
+            reference = json.load(fichier)['resultats']
+        if comparer(resultats, reference, args.seuil):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+"""Format binaire compact des événements de jeu, au choix du client.
+
+Un client qui se connecte avec ``auth = {format: 'binaire'}`` reçoit les
+événements les plus fréquents (état et patchs de la table, cartes, fin de
+manche, liste des tables, notifications) sous l'événement Socket.IO ``b``,
+dont la charge commence par un octet de type, suivi des champs.
+
+- entiers : varint zigzag (un octet jusqu'à ±63) ;
+- cartes : un octet, l'index 0-51 (``rang * 4 + couleur``) ;
+- joueurs d'une table : numéro de siège, le nom n'étant envoyé qu'avec
+  l'entrée complète d'un joueur (arrivée, état complet) ;
+- champs optionnels : un octet de présence, un bit par champ ;
+- textes : longueur puis UTF-8.
+
+Une pièce jointe binaire Socket.IO coûte une quarantaine d'octets d'en-tête
+(``451-["b",{"_placeholder":true,"num":0}]``), plus que la plupart des
+charges : en dessous de ``SEUIL_TEXTE`` octets, la charge part en texte
+base64 dans un paquet ordinaire.
+
+``encoder`` renvoie None pour une charge que le format ne sait pas
+représenter : l'événement part alors en JSON. Le décodeur, qui reconstruit
+les mêmes objets que le JSON, est dans ``templates/index.html``.
+"""
+
+import base64
+
+import evaluateur
+
+EVENEMENT = 'b'
+SEUIL_TEXTE = 96  # octets : au-delà, base64 coûte plus que l'en-tête d'une pièce jointe
+
+TYPES = ['update_game_state', 'patch_etat', 'recevoir_cartes', 'fin_manche', 'update_tables', 'patch_tables',
+         'notification']
+CODES = {nom: code for code, nom in enumerate(TYPES)}
+PHASES = ['attente', 'preflop', 'flop', 'turn', 'river']
+TYPES_NOTIFICATION = ['action', 'phase', 'success', 'error', 'info']
+CHAMPS_ETAT = ['pot', 'tour_actuel', 'mise_actuelle', 'phase', 'cartes_communes', 'partie_en_cours', 'joueurs']
+CHAMPS_JOUEUR = ['jetons', 'mise_tour', 'en_jeu', 'is_dealer', 'is_big_blind']
+CHAMPS_FIN = ['gagnant', 'gain', 'gains', 'pots', 'mains']
+CHAMPS_MAIN = ['valeur', 'combinaison', 'cartes', 'cartes_gagnantes', 'gain']
+AUCUN_SIEGE = 255
+NOM = 1 << 5  # Entrée de joueur : le nom suit
+RETIRE = 1 << 6  # Entrée de joueur : le joueur a quitté la table (nom seul)
+
+
+class FormatInconnu(Exception):
+    pass
+
+
+class Tampon(bytearray):
+    def entier(self, n):
+        n = n << 1 if n >= 0 else (-n << 1) - 1  # zigzag
+        while n > 0x7f:
+            self.append(n & 0x7f | 0x80)
+            n >>= 7
+        self.append(n)
+
+    def texte(self, s):
+        octets = s.encode()
+        self.entier(len(octets))
+        self += octets
+
+    def cartes(self, cartes):
+        self.append(len(cartes))
+        self += bytes(evaluateur.index_carte(c['valeur'], c['couleur']) for c in cartes)
+
+    def presence(self, champs, donnees):
+        """Octet de présence des ``champs`` de ``donnees`` (dans l'ordre de la liste)"""
+        if donnees.keys() - set(champs):
+            raise FormatInconnu(donnees.keys() - set(champs))
+        self.append(sum(1 << i for i, champ in enumerate(champs) if champ in donnees))
+
+
+def _siege(joueurs, username):
+    joueur = joueurs.get(username)
+    if joueur is None:
+        raise FormatInconnu(username)
+    return joueur.siege
+
+
+def _etat(tampon, etat, joueurs):
+    tampon.presence(CHAMPS_ETAT, etat)
+    if 'pot' in etat:
+        tampon.entier(etat['pot'])
+    if 'tour_actuel' in etat:
+        tampon.append(AUCUN_SIEGE if etat['tour_actuel'] is None else _siege(joueurs, etat['tour_actuel']))
+    if 'mise_actuelle' in etat:
+        tampon.entier(etat['mise_actuelle'])
+    if 'phase' in etat:
+        tampon.append(PHASES.index(etat['phase']))
+    if 'cartes_communes' in etat:
+        tampon.cartes(etat['cartes_communes'])
+    if 'partie_en_cours' in etat:
+        tampon.append(etat['partie_en_cours'])
+    if 'joueurs' in etat:
+        tampon.append(len(etat['joueurs']))
+        for username, joueur in etat['joueurs'].items():
+            if joueur is None:
+                tampon.append(AUCUN_SIEGE)
+                tampon.append(RETIRE | NOM)
+                tampon.texte(username)
+                continue
+            tampon.append(_siege(joueurs, username))
+            tampon.presence(CHAMPS_JOUEUR, joueur)
+            complet = len(joueur) == len(CHAMPS_JOUEUR)
+            if complet:
+                tampon[-1] |= NOM
+            if 'jetons' in joueur:
+                tampon.entier(joueur['jetons'])
+            if 'mise_tour' in joueur:
+                tampon.entier(joueur['mise_tour'])
+            # Valeurs des booléens présents, dans un octet
+            tampon.append(sum(1 << i for i, champ in enumerate(CHAMPS_JOUEUR[2:]) if joueur.get(champ)))
+            if complet:
+                tampon.texte(username)
+
+
+def _fin_manche(tampon, fin, joueurs):
+    tampon.presence(CHAMPS_FIN, fin)
+    if 'gagnant' in fin:
+        tampon.append(_siege(joueurs, fin['gagnant']))
+    if 'gain' in fin:
+        tampon.entier(fin['gain'])
+    if 'gains' in fin:
+        tampon.append(len(fin['gains']))
+        for username, gain in fin['gains'].items():
+            tampon.append(_siege(joueurs, username))
+            tampon.entier(gain)
+    if 'pots' in fin:
+        tampon.append(len(fin['pots']))
+        for pot in fin['pots']:
+            tampon.entier(pot['montant'])
+            tampon.append(len(pot['gagnants']))
+            tampon += bytes(_siege(joueurs, username) for username in pot['gagnants'])
+    if 'mains' in fin:
+        tampon.append(len(fin['mains']))
+        for username, main in fin['mains'].items():
+            tampon.append(_siege(joueurs, username))
+            tampon.presence(CHAMPS_MAIN, main)
+            if 'valeur' in main:
+                tampon.append(main['valeur'])
+            if 'combinaison' in main:
+                tampon.texte(main['combinaison'])
+            if 'cartes' in main:
+                tampon.cartes(main['cartes'])
+            if 'cartes_gagnantes' in main:
+                tampon.cartes(main['cartes_gagnantes'])
+            if 'gain' in main:
+                tampon.entier(main['gain'])
+
+
+def _tables(tampon, tables):
+    tampon.entier(len(tables))
+    for room_id, resume in tables.items():
+        tampon.texte(room_id)
+        if resume is None:
+            tampon.append(2)  # Table fermée
+            continue
+        tampon.append(int(resume['partie_en_cours']))
+        tampon.append(len(resume['joueurs']))
+        for username, joueur in resume['joueurs'].items():
+            tampon.texte(username)
+            tampon.entier(joueur['jetons'])
+
+
+def encoder(evenement, donnees, joueurs=None):
+    """Charge de l'événement (octets, ou texte base64 si elle est courte), None s'il n'a pas de forme binaire
+
+    ``joueurs`` (username -> Joueur) donne les sièges des joueurs de la table.
+    """
+    code = CODES.get(evenement)
+    if code is None:
+        return None
+    joueurs = joueurs or {}
+    tampon = Tampon((code,))
+    try:
+        if evenement == 'update_game_state':
+            tampon.entier(donnees['v'])
+            _etat(tampon, {cle: valeur for cle, valeur in donnees.items() if cle != 'v'}, joueurs)
+        elif evenement == 'patch_etat':
+            tampon.entier(donnees['v'])
+            _etat(tampon, donnees['etat'], joueurs)
+        elif evenement == 'recevoir_cartes':
+            tampon.cartes(donnees['cartes'])
+        elif evenement == 'fin_manche':
+            _fin_manche(tampon, donnees, joueurs)
+        elif evenement in ('update_tables', 'patch_tables'):
+            _tables(tampon, donnees['tables'])
+        elif evenement == 'notification':
+            if donnees.keys() != {'message', 'type'}:
+                return None
+            tampon.append(TYPES_NOTIFICATION.index(donnees['type']))
+            tampon.texte(donnees['message'])
+    except (FormatInconnu, KeyError, ValueError, TypeError):
+        return None
+    if len(tampon) < SEUIL_TEXTE:
+        return base64.b64encode(tampon).decode()
+    return bytes(tampon)
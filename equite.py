@@ -0,0 +1,147 @@
+"""Calcul d'équité (probabilités de victoire et d'égalité) pour les tapis.
+
+Le calcul est exact quand il ne manque qu'une ou zéro carte au tableau (turn
+et river) et se fait par tirages Monte Carlo avant. Les tirages sont répartis
+en lots sur un ``ProcessPoolExecutor`` ; l'appelant attend les résultats en
+scrutant les futures avec sa propre fonction de sommeil, ce qui permet à la
+boucle eventlet de continuer à servir les autres tables.
+"""
+
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import evaluateur
+
+ECHANTILLONS = int(os.environ.get('POKER_EQUITE_ECHANTILLONS', 20000))
+BUDGET = float(os.environ.get('POKER_EQUITE_BUDGET', 1.0))  # secondes
+PROCESSUS = int(os.environ.get('POKER_EQUITE_PROCESSUS', os.cpu_count() or 1))
+
+
+def _departager(rangs):
+    """Compte victoires, égalités et parts de pot à partir d'un tableau (joueurs, tirages)"""
+    meilleurs = rangs.max(axis=0)
+    gagnants = rangs == meilleurs
+    nb_gagnants = gagnants.sum(axis=0)
+    victoires = (gagnants & (nb_gagnants == 1)).sum(axis=1)
+    egalites = (gagnants & (nb_gagnants > 1)).sum(axis=1)
+    parts = (gagnants / nb_gagnants).sum(axis=1)
+    return victoires, egalites, parts
+
+
+def _evaluer_tableaux(mains, tableaux):
+    """Rangs de chaque main pour chaque tableau complet (tirages, 5)"""
+    rangs = np.empty((len(mains), len(tableaux)), dtype=np.int32)
+    for i, main in enumerate(mains):
+        cartes = np.empty((len(tableaux), 7), dtype=np.uint8)
+        cartes[:, :2] = main
+        cartes[:, 2:] = tableaux
+        rangs[i] = evaluateur.evaluate_batch(cartes)
+    return rangs
+
+
+def _reste_du_paquet(mains, tableau):
+    connues = set(tableau)
+    for main in mains:
+        connues.update(main)
+    return np.array([c for c in range(52) if c not in connues], dtype=np.uint8)
+
+
+def enumerer(mains, tableau):
+    """Équité exacte en parcourant toutes les fins de tableau possibles"""
+    reste = _reste_du_paquet(mains, tableau)
+    manquantes = 5 - len(tableau)
+    fins = np.array(list(itertools.combinations(reste, manquantes)), dtype=np.uint8)
+    if not manquantes:
+        fins = fins.reshape(1, 0)
+    tableaux = np.empty((len(fins), 5), dtype=np.uint8)
+    tableaux[:, :len(tableau)] = tableau
+    tableaux[:, len(tableau):] = fins
+    return _departager(_evaluer_tableaux(mains, tableaux)) + (len(tableaux),)
+
+
+def echantillonner(mains, tableau, echantillons, graine=None):
+    """Équité estimée sur des tableaux tirés au hasard (exécuté dans un processus du pool)"""
+    rng = np.random.default_rng(graine)
+    reste = _reste_du_paquet(mains, tableau)
+    manquantes = 5 - len(tableau)
+    # Tirage sans remise : les k plus petites clés aléatoires de chaque ligne
+    tirages = rng.random((echantillons, len(reste))).argpartition(manquantes, axis=1)[:, :manquantes]
+    tableaux = np.empty((echantillons, 5), dtype=np.uint8)
+    tableaux[:, :len(tableau)] = tableau
+    tableaux[:, len(tableau):] = reste[tirages]
+    return _departager(_evaluer_tableaux(mains, tableaux)) + (echantillons,)
+
+
+def _resultats(victoires, egalites, parts, total):
+    return [
+        {'victoire': float(v) / total, 'egalite': float(e) / total, 'equite': float(p) / total}
+        for v, e, p in zip(victoires, egalites, parts)
+    ]
+
+
+class ServiceEquite:
+    def __init__(self, processus=PROCESSUS, echantillons=ECHANTILLONS, budget=BUDGET, preflop=None):
+        self.processus = processus
+        self.preflop = preflop  # MatricePreflop, si le fichier a été construit
+        self.echantillons = echantillons
+        self.budget = budget
+        self._executeur = None
+
+    def executeur(self):
+        # Créé à la première utilisation pour ne pas lancer de processus au
+        # simple import du serveur
+        if self._executeur is None:
+            self._executeur = ProcessPoolExecutor(max_workers=self.processus)
+        return self._executeur
+
+    def calculer(self, mains, tableau, attendre=time.sleep, echantillons=None, budget=None):
+        """Retourne la liste des probabilités de chaque main
+
+        ``mains`` est une liste de paires d'index 0-51 et ``tableau`` les cartes
+        communes déjà connues. ``attendre`` est la fonction de sommeil utilisée
+        pour scruter le pool (``socketio.sleep`` côté serveur).
+        """
+        mains = [list(m) for m in mains]
+        tableau = list(tableau)
+        if len(tableau) >= 4:
+            return _resultats(*enumerer(mains, tableau))
+        if not tableau and len(mains) == 2 and self.preflop is not None:
+            # Tête-à-tête préflop : lecture directe dans les matrices précalculées ;
+            # l'équité compte la moitié des égalités, d'où la probabilité de victoire
+            equite = self.preflop.contre(mains[0], mains[1])
+            egalite = self.preflop.egalite(mains[0], mains[1])
+            return [
+                {'victoire': max(0.0, equite - egalite / 2), 'egalite': egalite, 'equite': equite},
+                {'victoire': max(0.0, 1.0 - equite - egalite / 2), 'egalite': egalite, 'equite': 1.0 - equite},
+            ]
+
+        echantillons = echantillons or self.echantillons
+        budget = self.budget if budget is None else budget
+        nb_lots = max(1, self.processus)
+        taille_lot = -(-echantillons // nb_lots)
+        graines = np.random.SeedSequence().spawn(nb_lots)
+        futures = [self.executeur().submit(echantillonner, mains, tableau, taille_lot, g) for g in graines]
+
+        # Au-delà du budget, on se contente des lots terminés (au moins un)
+        limite = time.monotonic() + budget
+        while not all(f.done() for f in futures):
+            if time.monotonic() >= limite and any(f.done() for f in futures):
+                break
+            attendre(0.01)
+        termines = [f.result() for f in futures if f.done()]
+        for f in futures:
+            f.cancel()
+
+        victoires, egalites, parts, total = termines[0]
+        for v, e, p, n in termines[1:]:
+            victoires, egalites, parts, total = victoires + v, egalites + e, parts + p, total + n
+        return _resultats(victoires, egalites, parts, total)
+
+    def fermer(self):
+        if self._executeur is not None:
+            self._executeur.shutdown(cancel_futures=True)
+            self._executeur = None
@@ -0,0 +1,292 @@
+"""Évaluateur de mains par tables précalculées.
+
+Les cartes sont des entiers de 0 à 51 : ``index = rang * 4 + couleur`` où
+``rang`` va de 0 (le 2) à 12 (l'As) et ``couleur`` suit l'ordre de
+``COULEURS``. C'est l'ordre dans lequel ``Partie.initialiser_deck`` construit
+le paquet.
+
+Chaque carte porte une clé additive : ``5 ** rang`` dans les 32 bits de poids
+faible (un multiensemble de rangs donne une somme unique puisqu'il y a au plus
+4 cartes par rang) et un compteur de 4 bits par couleur au-dessus. La somme des
+clés d'une main suffit donc à savoir s'il y a une couleur et, sinon, à trouver
+la main dans une table. La clé étant additive, elle peut aussi être complétée
+carte par carte au fil des tours d'enchères.
+
+Le rang renvoyé est un entier comparable : la catégorie (1 à 10, comme dans
+``Partie.get_nom_combinaison``) dans les bits 20 et plus, puis les valeurs
+(2 à 14) des cinq cartes de la combinaison, par ordre d'importance, sur
+4 bits chacune. Les kickers sont donc pris en compte.
+"""
+
+import numpy as np
+
+VALEURS = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']
+COULEURS = ['♠', '♥', '♦', '♣']
+
+QUINTE_FLUSH_ROYALE = 10
+QUINTE_FLUSH = 9
+CARRE = 8
+FULL = 7
+COULEUR = 6
+QUINTE = 5
+BRELAN = 4
+DEUX_PAIRES = 3
+PAIRE = 2
+CARTE_HAUTE = 1
+
+_DECALAGE_COULEURS = 32
+# Chaque compteur de couleur part de 3 : il atteint 8 (bit 3 du quartet) dès
+# qu'une couleur compte 5 cartes.
+CLE_VIDE = 0x3333 << _DECALAGE_COULEURS
+_DRAPEAU_COULEUR = 0x8888 << _DECALAGE_COULEURS
+_MASQUE_RANGS = (1 << _DECALAGE_COULEURS) - 1
+
+CLES = [5 ** (c >> 2) + (1 << (_DECALAGE_COULEURS + 4 * (c & 3))) for c in range(52)]
+# Clés de la première carte d'une main, qui portent déjà CLE_VIDE
+CLES_BASE = [CLE_VIDE + k for k in CLES]
+
+_INDEX = {(v, c): i * 4 + j for i, v in enumerate(VALEURS) for j, c in enumerate(COULEURS)}
+
+
+def index_carte(valeur, couleur):
+    """Convertit une valeur ('10', 'A'...) et une couleur en index 0-51"""
+    return _INDEX[valeur, couleur]
+
+
+def categorie(rang):
+    """Extrait la catégorie (1 à 10) d'un rang"""
+    return rang >> 20
+
+
+def _composer(cat, valeurs):
+    rang = cat
+    for i in range(5):
+        rang = (rang << 4) | (valeurs[i] if i < len(valeurs) else 0)
+    return rang
+
+
+# Masques de rangs des dix quintes, de la plus haute (As) à la plus basse (5)
+_QUINTES = [(haut, (0x1F << (haut - 6)) if haut > 5 else 0x100F) for haut in range(14, 4, -1)]
+
+
+def _quinte(masque):
+    """Retourne la hauteur de la meilleure quinte d'un masque de rangs"""
+    for haut, m in _QUINTES:
+        if masque & m == m:
+            return haut
+    return 0
+
+
+def _suite_quinte(haut):
+    return [v if v > 1 else 14 for v in range(haut, haut - 5, -1)]
+
+
+def _meilleure_sans_couleur(groupes, masque):
+    """Meilleure combinaison hors couleur ; groupes : (valeur, nombre) décroissants"""
+    valeurs = [v for v, _ in groupes]
+    carres = [v for v, n in groupes if n == 4]
+    brelans = [v for v, n in groupes if n == 3]
+    paires = [v for v, n in groupes if n == 2]
+
+    def kickers(exclues, n):
+        return [v for v in valeurs if v not in exclues][:n]
+
+    if carres:
+        q = carres[0]
+        return _composer(CARRE, [q] * 4 + kickers((q,), 1))
+    if brelans:
+        t = brelans[0]
+        autres = brelans[1:2] + paires[:1]
+        if autres:
+            return _composer(FULL, [t] * 3 + [max(autres)] * 2)
+    haut = _quinte(masque) if len(valeurs) >= 5 else 0
+    if haut:
+        return _composer(QUINTE, _suite_quinte(haut))
+    if brelans:
+        t = brelans[0]
+        return _composer(BRELAN, [t] * 3 + kickers((t,), 2))
+    if len(paires) >= 2:
+        p1, p2 = paires[:2]
+        return _composer(DEUX_PAIRES, [p1, p1, p2, p2] + kickers((p1, p2), 1))
+    if paires:
+        p = paires[0]
+        return _composer(PAIRE, [p, p] + kickers((p,), 3))
+    return _composer(CARTE_HAUTE, valeurs[:5])
+
+
+def _construire_table_rangs():
+    table = {}
+    groupes = []
+
+    def parcourir(valeur, cle, masque, nb):
+        if valeur < 2:
+            if nb:
+                table[cle] = _meilleure_sans_couleur(groupes, masque)
+            return
+        parcourir(valeur - 1, cle, masque, nb)
+        for n in range(1, min(4, 7 - nb) + 1):
+            groupes.append((valeur, n))
+            parcourir(valeur - 1, cle + n * 5 ** (valeur - 2), masque | 1 << (valeur - 2), nb + n)
+            groupes.pop()
+
+    parcourir(14, 0, 0, 0)
+    return table
+
+
+def _construire_table_couleurs():
+    table = [0] * (1 << 13)
+    for masque in range(1 << 13):
+        valeurs = [r + 2 for r in range(12, -1, -1) if masque >> r & 1]
+        if len(valeurs) < 5:
+            continue
+        haut = _quinte(masque)
+        if haut == 14:
+            table[masque] = _composer(QUINTE_FLUSH_ROYALE, _suite_quinte(haut))
+        elif haut:
+            table[masque] = _composer(QUINTE_FLUSH, _suite_quinte(haut))
+        else:
+            table[masque] = _composer(COULEUR, valeurs[:5])
+    return table
+
+
+RANGS = _construire_table_rangs()
+RANGS_COULEUR = _construire_table_couleurs()
+
+
+def _couleur_dominante(cle):
+    drapeaux = (cle & _DRAPEAU_COULEUR) >> (_DECALAGE_COULEURS + 3)
+    return (drapeaux.bit_length() - 1) >> 2
+
+
+def cle_main(cartes, cle=CLE_VIDE):
+    """Ajoute les clés des cartes à une clé existante (vide par défaut)"""
+    for c in cartes:
+        cle += CLES[c]
+    return cle
+
+
+def rang_depuis_cle(cle, cartes):
+    """Rang d'une main dont la clé a déjà été calculée"""
+    if cle & _DRAPEAU_COULEUR:
+        couleur = _couleur_dominante(cle)
+        masque = 0
+        for c in cartes:
+            if c & 3 == couleur:
+                masque |= 1 << (c >> 2)
+        return RANGS_COULEUR[masque]
+    return RANGS[cle & _MASQUE_RANGS]
+
+
+def evaluer(cartes, _base=CLES_BASE, _cles=CLES, _rangs=RANGS):
+    """Rang d'une main de 1 à 7 cartes (entiers 0-51)"""
+    # Chemin déroulé pour 7 cartes : c'est le cas de l'abattage et des
+    # simulations, et la boucle coûte autant que le reste de l'évaluation.
+    if len(cartes) == 7:
+        a, b, c, d, e, f, g = cartes
+        cle = _base[a] + _cles[b] + _cles[c] + _cles[d] + _cles[e] + _cles[f] + _cles[g]
+    else:
+        cle = CLE_VIDE
+        for c in cartes:
+            cle += _cles[c]
+    if cle & _DRAPEAU_COULEUR:
+        return rang_depuis_cle(cle, cartes)
+    return _rangs[cle & _MASQUE_RANGS]
+
+
+# Couleurs présentes dans un quartet de rang (bit i : couleur i), par ordre croissant
+_COULEURS_QUARTET = [[s for s in range(4) if q >> s & 1] for q in range(16)]
+# _CHOIX[rang][n][quartet] : les n premières cartes d'un rang présentes dans le quartet
+_CHOIX = [[None] + [[tuple(4 * r + s for s in couleurs[:n]) for couleurs in _COULEURS_QUARTET]
+                    for n in range(1, 5)]
+          for r in range(13)]
+_BITS = [1 << c for c in range(52)]
+_MASQUES_COULEUR = [sum(1 << (4 * r + s) for r in range(13)) for s in range(4)]
+_GROUPES = {}  # rang -> ((décalage du quartet, choix), ...) par ordre d'importance
+
+
+def _groupes(rang):
+    groupes = []
+    for decalage in ((16,) if categorie(rang) == CARTE_HAUTE else (16, 12, 8, 4, 0)):
+        v = (rang >> decalage) & 0xF
+        if not v:
+            continue
+        if groupes and groupes[-1][0] == v:
+            groupes[-1][1] += 1
+        else:
+            groupes.append([v, 1])
+    resultat = _GROUPES[rang] = tuple((4 * (v - 2), _CHOIX[v - 2][n]) for v, n in groupes)
+    return resultat
+
+
+def meilleures_cartes(cartes, rang, cle=None):
+    """Retrouve les cartes qui forment la combinaison décrite par le rang
+
+    Les cartes de la main forment un masque de 52 bits, un quartet par
+    rang ; chaque valeur du rang prend ses cartes dans son quartet. ``cle``
+    évite de recalculer la clé de la main pour trouver la couleur.
+    """
+    masque = sum(map(_BITS.__getitem__, cartes))
+    cat = categorie(rang)
+    if cat == COULEUR or cat >= QUINTE_FLUSH:
+        masque &= _MASQUES_COULEUR[_couleur_dominante(cle_main(cartes) if cle is None else cle)]
+    choisies = []
+    # Pour une carte haute, seule la carte la plus haute est mise en avant
+    for decalage, choix in _GROUPES.get(rang) or _groupes(rang):
+        choisies += choix[masque >> decalage & 0xF]
+    return choisies
+
+
+# Multiplicateurs de rangs dont les sommes sont distinctes pour tous les
+# multiensembles de exactement 7 cartes : la somme sert d'index direct dans
+# une table de ~7,8 millions d'entrées, sans hachage ni recherche.
+_MULTIPLICATEURS_7 = [0, 1, 5, 22, 98, 453, 2031, 8698, 22854, 83661, 262349, 636345, 1479181]
+_tables_lot = None
+
+
+def _construire_tables_lot():
+    cles = np.array([_MULTIPLICATEURS_7[c >> 2] + (1 << (_DECALAGE_COULEURS + 4 * (c & 3)))
+                     for c in range(52)], dtype=np.int64)
+
+    # Les clés base 5 de RANGS donnent le nombre de cartes de chaque rang
+    cles_base5 = np.fromiter(RANGS.keys(), dtype=np.int64, count=len(RANGS))
+    rangs = np.fromiter(RANGS.values(), dtype=np.int64, count=len(RANGS))
+    comptes = (cles_base5[:, None] // 5 ** np.arange(13, dtype=np.int64)) % 5
+    sept = comptes.sum(axis=1) == 7
+    index = comptes[sept] @ np.array(_MULTIPLICATEURS_7, dtype=np.int64)
+
+    # Moins de 7462 rangs distincts : la grande table stocke un numéro de
+    # classe sur 16 bits plutôt que le rang lui-même.
+    rangs_distincts, classes = np.unique(rangs[sept], return_inverse=True)
+    table = np.zeros(int(index.max()) + 1, dtype=np.uint16)
+    table[index] = classes
+    return cles, table, rangs_distincts.astype(np.int32), np.array(RANGS_COULEUR, dtype=np.int32)
+
+
+def evaluate_batch(cartes):
+    """Rangs d'un lot de mains : tableau (N, 7) d'index 0-51 -> N rangs
+
+    Donne exactement les mêmes rangs que ``evaluer``, sans boucle Python par
+    main.
+    """
+    global _tables_lot
+    if _tables_lot is None:
+        _tables_lot = _construire_tables_lot()
+    cles_cartes, table, rangs_classes, rangs_couleur = _tables_lot
+
+    cartes = np.asarray(cartes, dtype=np.uint8)
+    if cartes.ndim != 2 or cartes.shape[1] != 7:
+        raise ValueError('evaluate_batch attend un tableau de forme (N, 7)')
+
+    cles = cles_cartes[cartes].sum(axis=1) + CLE_VIDE
+    rangs = rangs_classes[table[cles & _MASQUE_RANGS]]
+
+    drapeaux = (cles & _DRAPEAU_COULEUR) >> (_DECALAGE_COULEURS + 3)
+    avec_couleur = np.flatnonzero(drapeaux)
+    if avec_couleur.size:
+        d = drapeaux[avec_couleur]
+        couleur = (d >= 0x10).astype(np.uint8) + (d >= 0x100) + (d >= 0x1000)
+        mains = cartes[avec_couleur]
+        bits = np.left_shift(1, (mains >> 2).astype(np.int32))
+        masques = np.where((mains & 3) == couleur[:, None], bits, 0).sum(axis=1)
+        rangs[avec_couleur] = rangs_couleur[masques]
+    return rangs
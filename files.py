@@ -0,0 +1,64 @@
+"""Files de commandes par table.
+
+Chaque table a sa file : les commandes qui la concernent (actions, arrivées,
+départs, joueurs prêts, déconnexions, traitements différés du moteur) sont
+exécutées une à une, dans l'ordre d'arrivée, par une tâche de fond propre à
+la table. Une commande peut donc attendre (entrée-sortie, calcul d'équité)
+sans qu'une autre commande de la même table ne s'intercale, tandis que les
+tables différentes avancent en parallèle. La tâche est lancée à la première
+commande et s'arrête quand la file est vide : une table inactive ne coûte
+rien.
+
+``appeler(fonction, *args)``, optionnel, exécute chaque commande : ``main.py``
+s'en sert pour grouper les émissions d'une commande (voir ``lots.py``).
+"""
+
+import collections
+import threading
+import traceback
+
+
+class FilesTables:
+    def __init__(self, lancer, appeler=None):
+        self.lancer = lancer  # lancer(fonction, *args) : démarre une tâche de fond
+        self.appeler = appeler or (lambda fonction, *args: fonction(*args))
+        self.files = {}  # room_id -> commandes (fonction, args), la première étant en cours
+        self.verrou = threading.Lock()
+        self.executees = 0  # Nombre total de commandes exécutées
+        self.profondeur_max = 0  # Plus longue file observée
+
+    def soumettre(self, room_id, fonction, *args):
+        """Ajoute une commande à la file de la table, lance sa tâche si besoin"""
+        with self.verrou:
+            file = self.files.get(room_id)
+            nouvelle = file is None
+            if nouvelle:
+                file = self.files[room_id] = collections.deque()
+            file.append((fonction, args))
+            self.profondeur_max = max(self.profondeur_max, len(file))
+        if nouvelle:
+            self.lancer(self.executer, room_id, file)
+
+    def executer(self, room_id, file):
+        while True:
+            fonction, args = file[0]
+            try:
+                self.appeler(fonction, *args)
+            except Exception:
+                traceback.print_exc()  # Une commande en échec ne bloque pas la table
+            with self.verrou:
+                file.popleft()
+                self.executees += 1
+                if not file:
+                    del self.files[room_id]
+                    return
+
+    def profondeur(self, room_id):
+        """Commandes en attente ou en cours pour la table"""
+        file = self.files.get(room_id)
+        return len(file) if file else 0
+
+    def profondeurs(self):
+        """Profondeur de chaque file non vide"""
+        with self.verrou:
+            return {room_id: len(file) for room_id, file in self.files.items()}
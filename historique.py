@@ -0,0 +1,291 @@
+"""Historique des mains jouées, stocké par colonnes compressées.
+
+Les mains terminées sont regroupées en blocs de ``TAILLE_BLOC`` mains. Dans
+un bloc, chaque champ forme une colonne d'entiers de largeur fixe (une
+table pour les mains, une pour les sièges, une pour les actions),
+compressée séparément avec zlib. Les noms de joueurs et de tables sont
+remplacés par des numéros dans un dictionnaire propre au bloc.
+
+La lecture se fait bloc par bloc, avec une mémoire bornée par la taille
+d'un bloc : ``lire_mains`` rejoue les mains une à une, ``lire_colonnes``
+ne décompresse que les colonnes demandées, pour les agrégations.
+
+Usage : python historique.py [fichier]  (résumé de l'historique)
+"""
+
+import argparse
+import atexit
+import collections
+import json
+import os
+import struct
+import time
+import zlib
+
+import numpy as np
+
+from journal import ACTIONS as ACTIONS_JOUEUR
+from journal import encoder_ou_ignorer
+from systeme import threading  # threads système même sous eventlet
+
+FICHIER = os.environ.get('POKER_HISTORIQUE', os.path.join('donnees', 'historique.bin'))
+TAILLE_BLOC = int(os.environ.get('POKER_HISTORIQUE_BLOC', 4096))
+DELAI = float(os.environ.get('POKER_HISTORIQUE_DELAI', 60))  # secondes avant d'écrire un bloc incomplet
+PERIODE = 0.5  # secondes entre deux réveils du thread d'écriture
+
+MAGIQUE = b'PKRHIST1'
+ACTIONS = ACTIONS_JOUEUR + ['petite_blind', 'grande_blind']
+PHASES = ['preflop', 'flop', 'turn', 'river']
+AUCUNE_CARTE = 255
+_LONGUEUR = struct.Struct('<I')
+
+# Une main terminée. ``graine`` redonne le paquet (``moteur.paquet_depuis_graine``),
+# ``cartes`` vaut None pour un siège non servi ; les actions sont des tuples
+# ``(siège, action, montant, phase)``.
+Main = collections.namedtuple('Main', ['room', 'numero', 'graine', 'joueurs', 'cartes', 'jetons', 'tableau',
+                                       'actions', 'pot', 'gains'])
+
+# Colonnes d'un bloc : (nom, type numpy)
+COLONNES = [
+    ('main_room', '<u4'), ('main_numero', '<u4'), ('main_graine', '<u8'), ('main_sieges', 'u1'), ('main_actions', '<u2'),
+    ('main_tableau', 'u1'), ('main_pot', '<u4'),
+    ('siege_joueur', '<u4'), ('siege_carte1', 'u1'), ('siege_carte2', 'u1'),
+    ('siege_jetons', '<u4'), ('siege_gain', '<u4'),
+    ('action_siege', 'u1'), ('action_code', 'u1'), ('action_phase', 'u1'), ('action_montant', '<u4'),
+]
+
+
+def _entier(valeur, bits):
+    if not isinstance(valeur, int):
+        raise TypeError(f'entier attendu : {valeur!r}')
+    if not 0 <= valeur < 1 << bits:
+        raise OverflowError(f'{valeur} hors de [0, 2**{bits}[')
+
+
+def verifier_main(main):
+    """Retourne la main si ``encoder_bloc`` peut l'écrire, lève ValueError, OverflowError ou TypeError sinon
+
+    Mêmes contrôles que l'encodage (codes connus, entiers dans leurs
+    colonnes), sans numpy : assez rapide pour la boucle d'événements.
+    """
+    if not len(main.joueurs) == len(main.cartes) == len(main.jetons) == len(main.gains):
+        raise ValueError('sièges, cartes, jetons et gains de longueurs différentes')
+    if len(main.tableau) > 5:
+        raise ValueError(f'{len(main.tableau)} cartes au tableau')
+    for valeur, bits in ((main.numero, 32), (main.graine or 0, 64), (main.pot, 32),
+                         (len(main.joueurs), 8), (len(main.actions), 16)):
+        _entier(valeur, bits)
+    for carte in main.tableau:
+        _entier(carte, 8)
+    for cartes in main.cartes:
+        if cartes is not None:
+            carte1, carte2 = cartes
+            _entier(carte1, 8)
+            _entier(carte2, 8)
+    for jetons, gain in zip(main.jetons, main.gains):
+        _entier(jetons, 32)
+        _entier(gain, 32)
+    for siege, action, montant, phase in main.actions:
+        _entier(siege, 8)
+        ACTIONS.index(action)
+        PHASES.index(phase)
+        _entier(montant, 32)
+    return main
+
+
+def encoder_bloc(mains):
+    """En-tête JSON et colonnes compressées d'un bloc de mains"""
+    noms = {}
+    valeurs = {nom: [] for nom, _ in COLONNES}
+    for main in mains:
+        valeurs['main_room'].append(noms.setdefault(main.room, len(noms)))
+        valeurs['main_numero'].append(main.numero)
+        valeurs['main_graine'].append(main.graine or 0)
+        valeurs['main_sieges'].append(len(main.joueurs))
+        valeurs['main_actions'].append(len(main.actions))
+        valeurs['main_tableau'].extend(list(main.tableau) + [AUCUNE_CARTE] * (5 - len(main.tableau)))
+        valeurs['main_pot'].append(main.pot)
+        for joueur, cartes, jetons, gain in zip(main.joueurs, main.cartes, main.jetons, main.gains):
+            valeurs['siege_joueur'].append(noms.setdefault(joueur, len(noms)))
+            carte1, carte2 = cartes or (AUCUNE_CARTE, AUCUNE_CARTE)
+            valeurs['siege_carte1'].append(carte1)
+            valeurs['siege_carte2'].append(carte2)
+            valeurs['siege_jetons'].append(jetons)
+            valeurs['siege_gain'].append(gain)
+        for siege, action, montant, phase in main.actions:
+            valeurs['action_siege'].append(siege)
+            valeurs['action_code'].append(ACTIONS.index(action))
+            valeurs['action_phase'].append(PHASES.index(phase))
+            valeurs['action_montant'].append(montant)
+    blobs = [zlib.compress(np.asarray(valeurs[nom], dtype=type_).tobytes()) for nom, type_ in COLONNES]
+    entete = json.dumps({
+        'mains': len(mains),
+        'noms': list(noms),
+        'colonnes': [[nom, type_, len(blob)] for (nom, type_), blob in zip(COLONNES, blobs)]
+    }).encode()
+    return _LONGUEUR.pack(len(entete)) + entete + b''.join(blobs)
+
+
+def _blocs(fichier):
+    """(en-tête, position des colonnes) de chaque bloc complet, en avançant dans le fichier"""
+    if fichier.read(len(MAGIQUE)) != MAGIQUE:
+        return
+    while True:
+        longueur = fichier.read(_LONGUEUR.size)
+        if len(longueur) < _LONGUEUR.size:
+            return
+        brut = fichier.read(_LONGUEUR.unpack(longueur)[0])
+        try:
+            entete = json.loads(brut)
+        except ValueError:
+            return  # Bloc tronqué par un arrêt pendant l'écriture
+        debut = fichier.tell()
+        taille = sum(colonne[2] for colonne in entete['colonnes'])
+        if fichier.seek(0, os.SEEK_END) < debut + taille:
+            return
+        fichier.seek(debut + taille)
+        yield entete, debut
+
+
+def lire_colonnes(chemin, colonnes=None):
+    """Pour chaque bloc, dictionnaire ``{colonne: tableau numpy}``
+
+    Seules les ``colonnes`` demandées (toutes par défaut) sont lues et
+    décompressées. La clé ``noms`` donne le dictionnaire du bloc.
+    """
+    with open(chemin, 'rb') as fichier:
+        for entete, debut in _blocs(fichier):
+            suite = fichier.tell()
+            bloc = {'noms': entete['noms']}
+            position = debut
+            for nom, type_, taille in entete['colonnes']:
+                if colonnes is None or nom in colonnes:
+                    fichier.seek(position)
+                    bloc[nom] = np.frombuffer(zlib.decompress(fichier.read(taille)), dtype=type_)
+                position += taille
+            fichier.seek(suite)
+            yield bloc
+
+
+def lire_mains(chemin):
+    """Rejoue l'historique main par main (générateur de ``Main``)"""
+    for bloc in lire_colonnes(chemin):
+        noms = bloc['noms']
+        colonnes = {nom: bloc[nom].tolist() for nom, _ in COLONNES if nom in bloc}
+        graines = colonnes.get('main_graine') or [None] * len(colonnes['main_numero'])
+        siege = action = 0
+        for i in range(len(colonnes['main_numero'])):
+            nb_sieges, nb_actions = colonnes['main_sieges'][i], colonnes['main_actions'][i]
+            sieges = range(siege, siege + nb_sieges)
+            actions = range(action, action + nb_actions)
+            yield Main(
+                room=noms[colonnes['main_room'][i]],
+                numero=colonnes['main_numero'][i],
+                graine=graines[i],
+                joueurs=[noms[colonnes['siege_joueur'][s]] for s in sieges],
+                cartes=[None if colonnes['siege_carte1'][s] == AUCUNE_CARTE
+                        else [colonnes['siege_carte1'][s], colonnes['siege_carte2'][s]] for s in sieges],
+                jetons=[colonnes['siege_jetons'][s] for s in sieges],
+                tableau=[c for c in colonnes['main_tableau'][5 * i:5 * i + 5] if c != AUCUNE_CARTE],
+                actions=[(colonnes['action_siege'][a], ACTIONS[colonnes['action_code'][a]],
+                          colonnes['action_montant'][a], PHASES[colonnes['action_phase'][a]]) for a in actions],
+                pot=colonnes['main_pot'][i],
+                gains=[colonnes['siege_gain'][s] for s in sieges]
+            )
+            siege += nb_sieges
+            action += nb_actions
+
+
+def reparer(chemin):
+    """Tronque le fichier après le dernier bloc complet ; le crée s'il n'existe pas"""
+    if not os.path.exists(chemin) or os.path.getsize(chemin) < len(MAGIQUE):
+        with open(chemin, 'wb') as fichier:
+            fichier.write(MAGIQUE)
+        return
+    with open(chemin, 'r+b') as fichier:
+        fin = len(MAGIQUE)
+        for _ in _blocs(fichier):
+            fin = fichier.tell()
+        fichier.truncate(fin)
+
+
+class Historique:
+    """Écrit les mains terminées, bloc par bloc, depuis un thread système"""
+    def __init__(self, chemin=FICHIER, taille_bloc=TAILLE_BLOC, delai=DELAI):
+        self.chemin = chemin
+        self.taille_bloc = taille_bloc
+        self.delai = delai
+        self.en_attente = collections.deque()  # Mains ajoutées par la boucle d'événements
+        self.arret = threading.Event()
+        dossier = os.path.dirname(chemin)
+        if dossier:
+            os.makedirs(dossier, exist_ok=True)
+        reparer(chemin)
+        self.ecrivain = threading.Thread(target=self.boucle, name='historique', daemon=True)
+        self.ecrivain.start()
+        atexit.register(self.fermer)
+
+    def ajouter(self, main):
+        """Met la main en attente d'écriture ; une main que le format ne peut pas écrire est écartée ici"""
+        if encoder_ou_ignorer(lambda: verifier_main(main),
+                              lambda: f'Historique : main {main.room} n°{main.numero} ignorée'):
+            self.en_attente.append(main)
+
+    def boucle(self):
+        bloc = []
+        depuis = None  # Arrivée de la plus ancienne main du bloc en cours
+        while not self.arret.wait(PERIODE):
+            while self.en_attente:
+                bloc.append(self.en_attente.popleft())
+                if len(bloc) == self.taille_bloc:
+                    self.ecrire(bloc)
+                    bloc, depuis = [], None
+            if bloc and depuis is None:
+                depuis = time.monotonic()
+            if bloc and time.monotonic() - depuis >= self.delai:
+                self.ecrire(bloc)
+                bloc, depuis = [], None
+        bloc.extend(self.en_attente)
+        if bloc:
+            self.ecrire(bloc)
+
+    def ecrire(self, bloc):
+        # Les mains ont été vérifiées par ajouter() : un échec ici est un bogue,
+        # qui coûte le bloc mais pas le thread d'écriture
+        octets = encoder_ou_ignorer(lambda: encoder_bloc(bloc),
+                                    lambda: f'Historique : bloc de {len(bloc)} mains ignoré')
+        if octets is None:
+            return
+        with open(self.chemin, 'ab') as fichier:
+            fichier.write(octets)
+            fichier.flush()
+            os.fsync(fichier.fileno())
+
+    def fermer(self):
+        if not self.arret.is_set():
+            self.arret.set()
+            self.ecrivain.join()
+
+
+def resumer(chemin):
+    """Statistiques globales, calculées colonne par colonne"""
+    mains = sieges = pot = 0
+    actions = np.zeros(len(ACTIONS), dtype=np.int64)
+    for bloc in lire_colonnes(chemin, ('main_sieges', 'main_pot', 'action_code')):
+        mains += len(bloc['main_pot'])
+        sieges += int(bloc['main_sieges'].sum(dtype=np.int64))
+        pot += int(bloc['main_pot'].sum(dtype=np.int64))
+        actions += np.bincount(bloc['action_code'], minlength=len(ACTIONS))
+    print(f'{mains} mains, {sieges / max(mains, 1):.1f} joueurs et pot de {pot / max(mains, 1):.0f}€ en moyenne')
+    for action, nombre in zip(ACTIONS, actions.tolist()):
+        print(f'{action:14s} {nombre}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('fichier', nargs='?', default=FICHIER)
+    resumer(parser.parse_args().fichier)
+
+
+if __name__ == '__main__':
+    main()
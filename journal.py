@@ -0,0 +1,279 @@
+"""Journal des parties : arrivées, donnes, actions et paiements, sur disque.
+
+Chaque événement accepté par le moteur est ajouté en fin de fichier sous
+forme d'enregistrement binaire ``<longueur, crc32, type>`` suivi de ses
+champs. La boucle d'événements ne fait qu'empiler un tuple : un thread
+système encode, écrit et appelle ``fsync`` une fois par lot (commit groupé,
+toutes les ``DELAI`` secondes). Un crash peut donc perdre au plus le
+dernier lot.
+
+Le même thread tient l'état de chaque table (joueurs, jetons, donneur) et,
+tous les ``SEUIL_INSTANTANE`` enregistrements, l'écrit dans un instantané
+puis ouvre un nouveau segment : au démarrage, il suffit de relire
+l'instantané et le dernier segment. L'état n'est suivi qu'entre deux
+manches ; une manche interrompue par un arrêt est annulée et chacun
+retrouve ses jetons du début de la manche.
+"""
+
+import atexit
+import collections
+import copy
+import json
+import os
+import struct
+import sys
+import zlib
+
+from systeme import threading  # fsync ne doit pas bloquer la boucle eventlet
+
+DOSSIER = os.environ.get('POKER_JOURNAL', os.path.join('donnees', 'journal'))
+DELAI = int(os.environ.get('POKER_JOURNAL_DELAI_MS', 5)) / 1000
+SEUIL_INSTANTANE = int(os.environ.get('POKER_JOURNAL_INSTANTANE', 10000))
+
+JOUEUR, DEPART, DONNE, ACTION, PAIEMENT = range(1, 6)
+ACTIONS = ['check', 'mise', 'allin', 'suivre', 'coucher']  # Actions d'un joueur, seule définition : l'index est le code écrit
+CODES_ACTIONS = {action: code for code, action in enumerate(ACTIONS)}
+
+ENTETE = struct.Struct('<IIB')  # longueur des champs, crc32 (type et champs), type
+_H = struct.Struct('<H')
+_I = struct.Struct('<I')
+
+
+# Ce que lèvent les encodeurs (ce module et ``historique.py``) devant une valeur
+# qu'ils ne savent pas écrire : code inconnu, nombre hors limites ou de mauvais type
+ERREURS_ENCODAGE = (KeyError, ValueError, OverflowError, TypeError, struct.error)
+
+
+def encoder_ou_ignorer(encoder, decrire):
+    """Résultat de ``encoder()``, ou None si la valeur ne peut pas être écrite
+
+    Le refus est signalé sur stderr par ``decrire()``, suivi de l'erreur ; toute autre
+    exception qu'une erreur d'encodage remonte.
+    """
+    try:
+        return encoder()
+    except ERREURS_ENCODAGE as erreur:
+        print(f'{decrire()} ({erreur!r})', file=sys.stderr, flush=True)
+        return None
+
+
+def _texte(valeur):
+    octets = valeur.encode()
+    return _H.pack(len(octets)) + octets
+
+
+def encoder(type_, champs):
+    """Enregistrement complet, en-tête compris"""
+    if type_ == JOUEUR:
+        room, username, jetons = champs
+        corps = _texte(room) + _texte(username) + _I.pack(jetons)
+    elif type_ == DEPART:
+        room, username = champs
+        corps = _texte(room) + _texte(username)
+    elif type_ == DONNE:
+        room, numero_main, dealer_index, paquet = champs
+        corps = _texte(room) + struct.pack('<IHB', numero_main, dealer_index, len(paquet)) + bytes(paquet)
+    elif type_ == ACTION:
+        room, numero_main, username, action, montant = champs
+        corps = _texte(room) + _I.pack(numero_main) + _texte(username) + struct.pack('<BI', CODES_ACTIONS[action], montant)
+    else:
+        room, numero_main, dealer_index, jetons = champs
+        corps = _texte(room) + struct.pack('<IHH', numero_main, dealer_index, len(jetons))
+        corps += b''.join(_texte(u) + _I.pack(j) for u, j in jetons.items())
+    crc = zlib.crc32(corps, type_)
+    return ENTETE.pack(len(corps), crc, type_) + corps
+
+
+class _Lecteur:
+    def __init__(self, octets):
+        self.octets = octets
+        self.position = 0
+
+    def lire(self, format_):
+        valeurs = struct.unpack_from(format_, self.octets, self.position)
+        self.position += struct.calcsize(format_)
+        return valeurs
+
+    def texte(self):
+        longueur, = self.lire('<H')
+        self.position += longueur
+        return bytes(self.octets[self.position - longueur:self.position]).decode()
+
+
+def decoder(type_, corps):
+    """Champs d'un enregistrement, dans l'ordre passé à ``encoder``"""
+    lecteur = _Lecteur(corps)
+    room = lecteur.texte()
+    if type_ == JOUEUR:
+        return room, lecteur.texte(), lecteur.lire('<I')[0]
+    if type_ == DEPART:
+        return room, lecteur.texte()
+    if type_ == DONNE:
+        numero_main, dealer_index, taille = lecteur.lire('<IHB')
+        return room, numero_main, dealer_index, bytes(corps[lecteur.position:lecteur.position + taille])
+    if type_ == ACTION:
+        numero_main, = lecteur.lire('<I')
+        username = lecteur.texte()
+        code, montant = lecteur.lire('<BI')
+        return room, numero_main, username, ACTIONS[code], montant
+    numero_main, dealer_index, nombre = lecteur.lire('<IHH')
+    jetons = {}
+    for _ in range(nombre):
+        username = lecteur.texte()
+        jetons[username] = lecteur.lire('<I')[0]
+    return room, numero_main, dealer_index, jetons
+
+
+def lire_segment(chemin):
+    """Enregistrements ``(type, champs)`` valides d'un segment
+
+    La lecture s'arrête au premier enregistrement tronqué ou corrompu
+    (écriture interrompue par un arrêt brutal).
+    """
+    with open(chemin, 'rb') as fichier:
+        octets = memoryview(fichier.read())
+    enregistrements = []
+    position = 0
+    while position + ENTETE.size <= len(octets):
+        longueur, crc, type_ = ENTETE.unpack_from(octets, position)
+        debut = position + ENTETE.size
+        corps = octets[debut:debut + longueur]
+        if len(corps) < longueur or zlib.crc32(corps, type_) != crc:
+            break
+        enregistrements.append((type_, decoder(type_, corps)))
+        position = debut + longueur
+    return enregistrements
+
+
+def appliquer(tables, type_, champs):
+    """Reporte un enregistrement sur l'état des tables entre deux manches"""
+    if type_ == JOUEUR:
+        room, username, jetons = champs
+        table = tables.setdefault(room, {'joueurs': {}, 'dealer_index': 0, 'numero_main': 0})
+        table['joueurs'][username] = jetons
+    elif type_ == DEPART:
+        room, username = champs
+        table = tables.get(room)
+        if table is not None:
+            table['joueurs'].pop(username, None)
+            if not table['joueurs']:
+                del tables[room]
+    elif type_ == PAIEMENT:
+        room, numero_main, dealer_index, jetons = champs
+        table = tables.get(room)
+        if table is not None:
+            table['joueurs'] = dict(jetons)
+            table['dealer_index'] = dealer_index
+            table['numero_main'] = numero_main
+
+
+def _segment(dossier, numero):
+    return os.path.join(dossier, f'segment-{numero:06d}.bin')
+
+
+class Journal:
+    def __init__(self, dossier=DOSSIER, delai=DELAI, seuil_instantane=SEUIL_INSTANTANE):
+        self.dossier = dossier
+        self.delai = delai
+        self.seuil_instantane = seuil_instantane
+        self.en_attente = collections.deque()  # (type, champs) empilés par la boucle d'événements
+        self.arret = threading.Event()
+        os.makedirs(dossier, exist_ok=True)
+        self.reprise = self.recuperer()  # Tables à recréer au démarrage
+        self.tables = copy.deepcopy(self.reprise)  # État courant, tenu par le thread d'écriture
+        self.numero = self.instantane(self.numero + 1)
+        self.fichier = open(_segment(dossier, self.numero), 'ab')
+        self.ecrivain = threading.Thread(target=self.boucle, name='journal', daemon=True)
+        self.ecrivain.start()
+        atexit.register(self.fermer)
+
+    def recuperer(self):
+        """État des tables au démarrage : dernier instantané puis segments suivants"""
+        tables = {}
+        self.numero = 0
+        chemin = os.path.join(self.dossier, 'instantane.json')
+        if os.path.exists(chemin):
+            with open(chemin) as fichier:
+                instantane = json.load(fichier)
+            tables = instantane['tables']
+            self.numero = instantane['segment'] - 1
+        segments = sorted(nom for nom in os.listdir(self.dossier) if nom.startswith('segment-'))
+        for nom in segments:
+            numero = int(nom[len('segment-'):-len('.bin')])
+            if numero <= self.numero:
+                continue
+            enregistrements = lire_segment(os.path.join(self.dossier, nom))
+            for type_, champs in enregistrements:
+                appliquer(tables, type_, champs)
+            self.numero = numero
+        return tables
+
+    def instantane(self, numero):
+        """Écrit l'état des tables, valable à partir du segment ``numero``, et supprime les anciens segments"""
+        temporaire = os.path.join(self.dossier, 'instantane.tmp')
+        with open(temporaire, 'w') as fichier:
+            json.dump({'segment': numero, 'tables': self.tables}, fichier)
+            fichier.flush()
+            os.fsync(fichier.fileno())
+        os.replace(temporaire, os.path.join(self.dossier, 'instantane.json'))
+        for nom in os.listdir(self.dossier):
+            if nom.startswith('segment-') and int(nom[len('segment-'):-len('.bin')]) < numero:
+                os.remove(os.path.join(self.dossier, nom))
+        self.depuis_instantane = 0
+        return numero
+
+    def boucle(self):
+        while not self.arret.wait(self.delai):
+            self.vider()
+
+    def vider(self):
+        """Écrit le lot en attente avec un seul fsync"""
+        lot = []
+        while self.en_attente:
+            lot.append(self.en_attente.popleft())
+        if not lot:
+            return
+        octets = []
+        valides = []
+        for type_, champs in lot:
+            # Un enregistrement invalide est perdu, pas le thread d'écriture ni le reste du lot
+            enregistrement = encoder_ou_ignorer(lambda: encoder(type_, champs),
+                                                lambda: f'Journal : enregistrement {type_} {champs!r} ignoré')
+            if enregistrement is not None:
+                octets.append(enregistrement)
+                valides.append((type_, champs))
+        lot = valides
+        self.fichier.write(b''.join(octets))
+        self.fichier.flush()
+        os.fsync(self.fichier.fileno())
+        for type_, champs in lot:
+            appliquer(self.tables, type_, champs)
+        self.depuis_instantane += len(lot)
+        if self.depuis_instantane >= self.seuil_instantane:
+            self.fichier.close()
+            self.numero = self.instantane(self.numero + 1)
+            self.fichier = open(_segment(self.dossier, self.numero), 'ab')
+
+    def fermer(self):
+        if not self.arret.is_set():
+            self.arret.set()
+            self.ecrivain.join()
+            self.vider()
+            self.fichier.close()
+
+    # Appelées par le moteur depuis la boucle d'événements : aucune écriture ici
+
+    def noter_joueur(self, room, username, jetons):
+        self.en_attente.append((JOUEUR, (room, username, jetons)))
+
+    def noter_depart(self, room, username):
+        self.en_attente.append((DEPART, (room, username)))
+
+    def noter_donne(self, room, numero_main, dealer_index, paquet):
+        self.en_attente.append((DONNE, (room, numero_main, dealer_index, bytes(paquet))))
+
+    def noter_action(self, room, numero_main, username, action, montant):
+        self.en_attente.append((ACTION, (room, numero_main, username, action, montant)))
+
+    def noter_paiement(self, room, numero_main, dealer_index, jetons):
+        self.en_attente.append((PAIEMENT, (room, numero_main, dealer_index, jetons)))
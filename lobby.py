@@ -0,0 +1,70 @@
+"""Liste des tables affichée dans le lobby.
+
+Seuls les clients qui regardent le lobby (salle ``SALLE``) reçoivent la
+liste : un joueur la quitte en s'asseyant à une table et la rejoint en se
+levant. Le résumé est tenu à jour table par table ; les tables modifiées
+sont regroupées et envoyées au plus une fois toutes les ``DELAI`` secondes,
+sous forme de patch ne contenant que les tables qui ont changé (None pour
+une table fermée). En mode réparti, les patchs des autres shards sont
+reportés dans ``distantes`` pour que la liste complète les inclue.
+"""
+
+import os
+
+SALLE = 'lobby'
+DELAI = int(os.environ.get('POKER_LOBBY_DELAI_MS', 250)) / 1000
+
+
+def resume_table(partie):
+    return {
+        'joueurs': {u: {'jetons': j.jetons} for u, j in partie.joueurs.items()},
+        'partie_en_cours': partie.partie_en_cours
+    }
+
+
+class Lobby:
+    def __init__(self, emettre, planifier, delai=DELAI):
+        self.emettre = emettre  # emettre(evenement, donnees)
+        self.planifier = planifier  # planifier(delai, fonction)
+        self.delai = delai
+        self.tables = {}  # room_id -> résumé, tel que les clients le connaissent
+        self.distantes = {}  # room_id -> résumé des tables des autres shards
+        self.modifiees = {}  # room_id -> partie (None si fermée), en attente d'envoi
+        self.envoi_prevu = False
+
+    def table_modifiee(self, room_id, partie):
+        """Note qu'une table a changé ; l'envoi est différé et regroupé"""
+        self.modifiees[room_id] = partie
+        if not self.envoi_prevu:
+            self.envoi_prevu = True
+            self.planifier(self.delai, self.envoyer)
+
+    def envoyer(self):
+        self.envoi_prevu = False
+        modifiees, self.modifiees = self.modifiees, {}
+        patch = {}
+        for room_id, partie in modifiees.items():
+            resume = resume_table(partie) if partie is not None else None
+            if resume == self.tables.get(room_id):
+                continue
+            if resume is None:
+                del self.tables[room_id]
+            else:
+                self.tables[room_id] = resume
+            patch[room_id] = resume
+        if patch:
+            self.emettre('patch_tables', {'tables': patch})
+
+    def tables_distantes(self, patch):
+        """Applique un patch émis par le lobby d'un autre shard"""
+        for room_id, resume in patch.items():
+            if resume is None:
+                self.distantes.pop(room_id, None)
+            else:
+                self.distantes[room_id] = resume
+
+    def liste(self):
+        """Liste complète pour un client qui arrive dans le lobby"""
+        if self.distantes:
+            return {'tables': {**self.distantes, **self.tables}}
+        return {'tables': self.tables}
@@ -0,0 +1,54 @@
+"""Envoi groupé des événements produits par une commande de table.
+
+Une action de joueur produit souvent plusieurs événements : notification,
+patch d'état, puis au changement de rue une autre notification, la
+combinaison de chaque joueur et un autre patch. Envoyés un à un, ce sont
+autant de trames WebSocket et de rendus côté client.
+
+Pendant une commande de table (voir ``files.py``), ``main.py`` range les
+émissions dans le ``Lot`` courant au lieu de les envoyer ; les
+destinataires sont relevés au moment de l'émission, les arrivées et départs
+de la commande sont donc respectés. À la fin de la commande, chaque client
+reçoit ses événements, dans l'ordre, en un seul paquet ``lot`` que la page
+applique d'un bloc. Les clients qui reçoivent la même suite (les
+spectateurs, et les joueurs tant qu'aucun événement privé ne les
+distingue) partagent un paquet, encodé une fois. Un client qui n'a qu'un
+événement le reçoit tel quel.
+"""
+
+import contextvars
+
+EVENEMENT = 'lot'
+
+# Lot de la commande en cours ; chaque tâche eventlet (greenlet) a son propre contexte
+courant = contextvars.ContextVar('lot', default=None)
+
+
+class Lot:
+    def __init__(self):
+        self.evenements = []  # (evenement, donnees, joueurs)
+        self.destinataires = {}  # sid -> index de ses événements, dans l'ordre
+
+    def ajouter(self, sids, evenement, donnees, joueurs=None):
+        index = len(self.evenements)
+        self.evenements.append((evenement, donnees, joueurs))
+        for sid in sids:
+            self.destinataires.setdefault(sid, []).append(index)
+
+    def groupes(self):
+        """(sids, index des événements) : chaque suite d'événements et les clients qui la reçoivent"""
+        groupes = {}
+        for sid, index in self.destinataires.items():
+            groupes.setdefault(tuple(index), []).append(sid)
+        return [(sids, index) for index, sids in groupes.items()]
+
+
+def executer(envoyer, fonction, *args):
+    """Exécute ``fonction(*args)`` avec un lot courant, remis à ``envoyer(lot)`` à la fin"""
+    lot = Lot()
+    jeton = courant.set(lot)
+    try:
+        fonction(*args)
+    finally:
+        courant.reset(jeton)
+        envoyer(lot)
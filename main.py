@@ -1,1020 +1,620 @@
-from flask import Flask, render_template, request
+from flask import Flask, render_template, request, jsonify, copy_current_request_context, abort
 from flask_socketio import SocketIO, emit, join_room, leave_room
-import random
-from collections import Counter
+import functools
+import hmac
 import time
 import os
+from equite import ServiceEquite
+from preflop import MatricePreflop
+from moteur import Partie, Carte, NB_SIEGES
+from lobby import Lobby, SALLE as SALLE_LOBBY
+from journal import Journal, DOSSIER as DOSSIER_JOURNAL
+from historique import Historique, FICHIER as FICHIER_HISTORIQUE
+from files import FilesTables
+from minuteries import RoueMinuteries
+from metriques import Metriques
+from profil import Profileur, SurveillantBoucle
+import repartition
+import binaire
+import lots
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'votre_clé_secrète_ici'
-socketio = SocketIO(app, ping_timeout=5, ping_interval=2)
+socketio = SocketIO(app, ping_timeout=5, ping_interval=2, **repartition.options_socketio())
 
 games = {}
-
-class Carte:
-    VALEURS = {'2': 2, '3': 3, '4': 4, '5': 5, '6': 6, '7': 7, '8': 8, '9': 9, '10': 10, 'J': 11, 'Q': 12, 'K': 13, 'A': 14}
-    
-    def __init__(self, valeur, couleur):
-        self.valeur = valeur
-        self.couleur = couleur
-        
-    def to_dict(self):
-        return {'valeur': self.valeur, 'couleur': self.couleur}
-    
-    def get_valeur_numerique(self):
-        return self.VALEURS[self.valeur]
-
-class GestionTour:
-    def __init__(self, joueurs):
-        self.joueurs = joueurs
-        self.ordre_joueurs = list(joueurs.keys())
-        self.index_actuel = 0
-        self.dernier_miseur = None
-        self.tour_termine = False
-        self.premier_joueur_tour = None  # Pour suivre le premier joueur du tour
-        
-    def joueur_actuel(self):
-        """Retourne le joueur actuel"""
-        if not self.ordre_joueurs or self.index_actuel >= len(self.ordre_joueurs):
-            return None
-        return self.ordre_joueurs[self.index_actuel]
-    
-    def passer_au_suivant(self):
-        """Passe au joueur suivant qui est encore en jeu"""
-        if not self.ordre_joueurs:
-            return None
-            
-        # Sauvegarder le premier joueur du tour si pas encore défini
-        if self.premier_joueur_tour is None:
-            self.premier_joueur_tour = self.joueur_actuel()
-            
-        self.index_actuel = (self.index_actuel + 1) % len(self.ordre_joueurs)
-        
-        # Chercher le prochain joueur actif
-        tentatives = 0
-        while tentatives < len(self.ordre_joueurs):
-            if self.ordre_joueurs[self.index_actuel] in self.joueurs and self.joueurs[self.ordre_joueurs[self.index_actuel]]['en_jeu']:
-                return self.ordre_joueurs[self.index_actuel]
-            self.index_actuel = (self.index_actuel + 1) % len(self.ordre_joueurs)
-            tentatives += 1
-            
-        return None
-    
-    def verifier_tour_complet(self, mises_tour, mise_actuelle):
-        """Vérifie si le tour est complet (tous les joueurs ont misé le même montant)"""
-        joueurs_actifs = [j for j in self.ordre_joueurs if self.joueurs[j]['en_jeu']]
-        
-        # S'il ne reste qu'un joueur
-        if len(joueurs_actifs) <= 1:
-            self.tour_termine = True
-            return True
-            
-        # Vérifier si tous les joueurs actifs ont misé le même montant
-        for joueur in joueurs_actifs:
-            if mises_tour[joueur] != mise_actuelle:
-                return False
-        
-        # Si tous les joueurs ont misé le même montant, on vérifie si on a fait un tour complet
-        if self.premier_joueur_tour is None:
-            # Premier tour du betting round
-            self.premier_joueur_tour = self.joueur_actuel()
-            return False
+sessions = {}  # request.sid -> (room, username)
+sid_joueurs = {}  # (room, username) -> request.sid de la connexion en cours
+files = FilesTables(socketio.start_background_task)  # Commandes de chaque table, exécutées une à une
+derniere_table = {}  # request.sid -> table de la dernière commande du client
+clients_binaires = set()  # request.sid des clients qui ont demandé le format binaire
+spectateurs = {}  # room -> request.sid des spectateurs de la table
+roue = RoueMinuteries(socketio.start_background_task, socketio.sleep)  # Tous les délais de toutes les tables
+metriques = Metriques()
+metriques.suivre_serveur(socketio.server)
+DELAI_RECONNEXION = float(os.environ.get('POKER_DELAI_RECONNEXION', 15))  # secondes
+SEUIL_BLOCAGE = int(os.environ.get('POKER_SEUIL_BLOCAGE_MS', 100)) / 1000  # 0 : pas de surveillance de la boucle
+JETON_ADMIN = os.environ.get('POKER_ADMIN_JETON', '')  # Vide : routes /admin désactivées
+DUREE_MAX_PROFIL = 300  # secondes
+SUFFIXE_BINAIRE = '\x00b'  # Salle des clients au format binaire : ajouté au nom de la salle
+codes_evenements = {}  # code d'un handler -> événement Socket.IO, pour situer les blocages
+surveillant = (SurveillantBoucle(socketio.start_background_task, socketio.sleep, SEUIL_BLOCAGE, codes_evenements, Partie)
+               if SEUIL_BLOCAGE else None)
+profileur = None  # Profilage en cours
+matrice_preflop = MatricePreflop.ouvrir()  # None tant que `python preflop.py` n'a pas été lancé
+service_equite = ServiceEquite(preflop=matrice_preflop)
+if DOSSIER_JOURNAL:  # POKER_JOURNAL vide : pas de journal
+    journal = Journal(os.path.join(DOSSIER_JOURNAL, f'shard{repartition.SHARD}') if repartition.URLS else DOSSIER_JOURNAL)
+else:
+    journal = None
+if FICHIER_HISTORIQUE:  # POKER_HISTORIQUE vide : pas d'historique
+    historique = Historique(f'{FICHIER_HISTORIQUE}.shard{repartition.SHARD}' if repartition.URLS else FICHIER_HISTORIQUE)
+else:
+    historique = None
+
+class SortieSocketIO:
+    """Relaie les événements du moteur aux clients Socket.IO"""
+    muette = False
+    
+    def emettre(self, evenement):
+        if evenement.nom == 'nouvelle_manche':
+            metriques.noter_main()
+        diffuser(evenement.nom, evenement.donnees, evenement.salle, self.joueurs())
+    
+    def joueurs(self):
+        return None  # username -> Joueur, pour les sièges du format binaire
+    
+    def tables_modifiees(self, partie):
+        broadcast_tables_update(partie.room_id)
+    
+    def planifier(self, delai, fonction, *args):
+        if delai:
+            roue.armer(delai, fonction, *args)
         else:
-            # On vérifie si on est revenu au premier joueur du tour
-            return self.joueur_actuel() == self.premier_joueur_tour
-            
-        return False
-
-class Partie:
-    def __init__(self, room_id):
-        self.room_id = room_id
-        self.joueurs = {}
-        self.deck = []
-        self.pot = 0
-        self.cartes_communes = []
-        self.mise_actuelle = 0
-        self.phase = 'attente'  # attente, preflop, flop, turn, river
-        self.petite_blind = 10
-        self.grande_blind = 20
-        self.dealer_index = 0
-        self.mises_tour = {}
-        self.gestion_tour = None
-        self.deconnexions_temporaires = {}
-        self.joueurs_prets = set()  # Pour suivre les joueurs prêts
-        self.partie_en_cours = False
-        self.initialiser_deck()
-
-    def initialiser_deck(self):
-        valeurs = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']
-        couleurs = ['♠', '♥', '♦', '♣']
-        self.deck = [Carte(v, c) for v in valeurs for c in couleurs]
-        random.shuffle(self.deck)
-
-    def distribuer_cartes(self):
-        self.phase = 'preflop'
-        self.pot = 0
-        self.cartes_communes = []
-        self.mise_actuelle = self.grande_blind
-        self.joueurs_prets.clear()  # Réinitialiser les joueurs prêts
-        self.partie_en_cours = True  # Marquer la partie comme en cours
-        
-        # Notifier immédiatement tous les clients du changement d'état
-        broadcast_tables_update()
-        
-        # Vérifier et éliminer les joueurs sans jetons
-        joueurs_elimines = []
-        for username, joueur in self.joueurs.items():
-            if joueur['jetons'] <= 0:
-                joueur['en_jeu'] = False
-                joueurs_elimines.append(username)
-                socketio.emit('notification', {
-                    'message': f'{username} n\'a plus de jetons et ne peut pas participer à cette manche',
-                    'type': 'error'
-                }, room=self.room_id)
-        
-        # S'il ne reste qu'un joueur avec des jetons, terminer la partie
-        joueurs_avec_jetons = [u for u, j in self.joueurs.items() if j['jetons'] > 0]
-        if len(joueurs_avec_jetons) <= 1:
-            if joueurs_avec_jetons:
-                socketio.emit('notification', {
-                    'message': f'{joueurs_avec_jetons[0]} a gagné la partie !',
-                    'type': 'success'
-                }, room=self.room_id)
-            return
-        
-        # Distribution des cartes
-        joueurs_liste = list(self.joueurs.keys())
-        for username in joueurs_liste:
-            if self.joueurs[username]['jetons'] > 0:  # Ne distribuer qu'aux joueurs avec des jetons
-                self.joueurs[username]['cartes'] = [self.deck.pop().to_dict() for _ in range(2)]
-                self.joueurs[username]['en_jeu'] = True  # S'assurer que tous les joueurs sont en jeu
-                self.mises_tour[username] = 0
-                self.evaluer_et_envoyer_combinaison(username)
-        
-        # Mise des blinds
-        petite_blind_index = (self.dealer_index + 1) % len(joueurs_liste)
-        grande_blind_index = (self.dealer_index + 2) % len(joueurs_liste)
-        
-        # S'assurer que les joueurs des blinds ont assez de jetons
-        while self.joueurs[joueurs_liste[petite_blind_index]]['jetons'] <= 0:
-            petite_blind_index = (petite_blind_index + 1) % len(joueurs_liste)
-        while self.joueurs[joueurs_liste[grande_blind_index]]['jetons'] <= 0:
-            grande_blind_index = (grande_blind_index + 1) % len(joueurs_liste)
-        
-        # Petite blind
-        petite_blind_joueur = joueurs_liste[petite_blind_index]
-        montant_petite_blind = min(self.petite_blind, self.joueurs[petite_blind_joueur]['jetons'])
-        self.joueurs[petite_blind_joueur]['jetons'] -= montant_petite_blind
-        self.pot += montant_petite_blind
-        self.mises_tour[petite_blind_joueur] = montant_petite_blind
-        
-        # Grande blind
-        grande_blind_joueur = joueurs_liste[grande_blind_index]
-        montant_grande_blind = min(self.grande_blind, self.joueurs[grande_blind_joueur]['jetons'])
-        self.joueurs[grande_blind_joueur]['jetons'] -= montant_grande_blind
-        self.pot += montant_grande_blind
-        self.mises_tour[grande_blind_joueur] = montant_grande_blind
-        self.mise_actuelle = montant_grande_blind
-        
-        # Initialiser la gestion des tours
-        self.gestion_tour = GestionTour(self.joueurs)
-        # Positionner sur le joueur après la grande blind
-        self.gestion_tour.index_actuel = (grande_blind_index + 1) % len(joueurs_liste)
-        self.gestion_tour.dernier_miseur = grande_blind_joueur
-        
-        # Envoi des cartes aux joueurs
-        for username in joueurs_liste:
-            if self.joueurs[username]['jetons'] > 0:  # Ne distribuer qu'aux joueurs avec des jetons
-                socketio.emit('recevoir_cartes', {
-                    'cartes': self.joueurs[username]['cartes']
-                }, room=username)
-        
-        self.update_game_state()
-
-    def next_phase(self):
-        joueurs_liste = [u for u, j in self.joueurs.items() if j['en_jeu']]
-        if len(joueurs_liste) <= 1:
-            self.fin_manche(joueurs_liste[0] if joueurs_liste else None)
-            return
-
-        if self.phase == 'preflop':
-            self.phase = 'flop'
-            self.cartes_communes.extend([self.deck.pop().to_dict() for _ in range(3)])
-            socketio.emit('notification', {
-                'message': 'Distribution du Flop',
-                'type': 'phase'
-            }, room=self.room_id)
-        elif self.phase == 'flop':
-            self.phase = 'turn'
-            self.cartes_communes.append(self.deck.pop().to_dict())
-            socketio.emit('notification', {
-                'message': 'Distribution du Turn',
-                'type': 'phase'
-            }, room=self.room_id)
-        elif self.phase == 'turn':
-            self.phase = 'river'
-            self.cartes_communes.append(self.deck.pop().to_dict())
-            socketio.emit('notification', {
-                'message': 'Distribution de la River',
-                'type': 'phase'
-            }, room=self.room_id)
-        elif self.phase == 'river':
-            if all(not j['en_jeu'] or self.mises_tour[u] == self.mise_actuelle 
-                  for u, j in self.joueurs.items()):
-                self.evaluer_mains()
-            return
-        
-        # Réinitialiser les mises pour la nouvelle phase
-        self.mise_actuelle = 0
-        self.mises_tour = {username: 0 for username in self.joueurs}
-        
-        # Réinitialiser la gestion des tours pour la nouvelle phase
-        self.gestion_tour = GestionTour(self.joueurs)
-        # Commencer par le premier joueur à gauche du dealer qui est encore en jeu
-        self.gestion_tour.index_actuel = (self.dealer_index + 1) % len(self.joueurs)
-        joueur_suivant = self.gestion_tour.passer_au_suivant()
-        
-        if not joueur_suivant:
-            self.fin_manche(None)
+            socketio.start_background_task(fonction, *args)
+    
+    def armer(self, delai, fonction, *args):
+        return roue.armer(delai, fonction, *args)
+    
+    def attendre(self, secondes):
+        socketio.sleep(secondes)
+
+class SortieTable(SortieSocketIO):
+    """Sortie d'une table : ses traitements différés passent par sa file de commandes"""
+    def __init__(self, room):
+        self.room = room
+    
+    def planifier(self, delai, fonction, *args):
+        super().planifier(delai, files.soumettre, self.room, fonction, *args)
+    
+    def armer(self, delai, fonction, *args):
+        return roue.armer(delai, files.soumettre, self.room, fonction, *args)
+    
+    def joueurs(self):
+        game = games.get(self.room)
+        return game.joueurs if game else None
+
+sortie_socketio = SortieSocketIO()
+lobby = Lobby(lambda evenement, donnees: diffuser(evenement, donnees, SALLE_LOBBY, partagee=bool(repartition.MESSAGE_QUEUE)),
+              sortie_socketio.planifier)
+if repartition.MESSAGE_QUEUE:
+    # Seul le lobby est partagé : les joueurs d'une table sont tous connectés à son shard
+    repartition.limiter_file(socketio.server.manager, {SALLE_LOBBY, SALLE_LOBBY + SUFFIXE_BINAIRE})
+    repartition.suivre_emissions(socketio.server.manager, 'patch_tables',
+                                 lambda donnees: lobby.tables_distantes(donnees['tables']))
+
+def salle_client(salle):
+    """Variante de la salle pour le client courant : les clients binaires ont leurs propres salles"""
+    return salle + SUFFIXE_BINAIRE if request.sid in clients_binaires else salle
+
+def diffuser(evenement, donnees, salle, joueurs=None, partagee=False):
+    """Émet vers une salle, en JSON et, pour les clients qui l'ont demandé, en binaire
+
+    Chaque variante est encodée une seule fois, puis le même paquet est
+    écrit à tous ses destinataires (joueurs et spectateurs). La variante
+    binaire n'est encodée que si la salle a des clients binaires dans ce
+    processus, ou toujours pour une salle ``partagee`` entre shards.
+    Pendant une commande de table, l'événement rejoint le lot de la commande
+    (voir ``lots.py``), sauf pour une salle ``partagee``.
+    """
+    salle_binaire = salle + SUFFIXE_BINAIRE
+    lot = lots.courant.get()
+    if lot is not None and not partagee:
+        membres = socketio.server.manager.rooms.get('/', {})
+        lot.ajouter([*membres.get(salle, ()), *membres.get(salle_binaire, ())], evenement, donnees, joueurs)
+        return
+    if partagee or salle_binaire in socketio.server.manager.rooms.get('/', ()):
+        charge = binaire.encoder(evenement, donnees, joueurs)
+        if charge is not None:
+            with metriques.emission((evenement,)):
+                socketio.emit(binaire.EVENEMENT, charge, room=salle_binaire)
+        elif not partagee:
+            # Même paquet pour les deux variantes : encodé une fois pour tous les destinataires
+            socketio.emit(evenement, donnees, room=(salle, salle_binaire))
             return
-        
-        # Évaluer les nouvelles combinaisons pour tous les joueurs
-        for username in self.joueurs:
-            self.evaluer_et_envoyer_combinaison(username)
-        
-        self.update_game_state()
-
-    def get_nom_combinaison(self, valeur):
-        combinaisons = {
-            10: 'Quinte Flush Royale',
-            9: 'Quinte Flush',
-            8: 'Carré',
-            7: 'Full House',
-            6: 'Couleur',
-            5: 'Quinte',
-            4: 'Brelan',
-            3: 'Deux Paires',
-            2: 'Paire',
-            1: 'Carte Haute'
-        }
-        return combinaisons.get(valeur, 'Inconnu')
-
-    def fin_manche(self, gagnant):
-        if gagnant:
-            gain_total = self.pot
-            
-            self.joueurs[gagnant]['jetons'] += gain_total
-            socketio.emit('fin_manche', {
-                'gagnant': gagnant,
-                'gain': gain_total,
-                'mains': {u: {'valeur': v, 'cartes': self.joueurs[u]['cartes']} for u, v in self.joueurs.items() if u == gagnant or self.joueurs[u]['en_jeu']}
-            }, room=self.room_id)
-        
-        self.dealer_index = (self.dealer_index + 1) % len(self.joueurs)
-        self.phase = 'attente'
-        self.pot = 0
-        self.cartes_communes = []
-        self.mise_actuelle = 0
-        self.mises_tour = {}
-        self.partie_en_cours = False  # Marquer la partie comme terminée
-        self.initialiser_deck()
-        
-        # Notifier immédiatement tous les clients du changement d'état
-        broadcast_tables_update()
-        
-        socketio.emit('nouvelle_manche', {'delai': 3}, room=self.room_id)
-        self.update_game_state()
-
-    def evaluer_mains(self):
-        mains = {}
-        mains_valeurs = {}  # Pour stocker les valeurs numériques des mains
-        for username, joueur in self.joueurs.items():
-            if not joueur['en_jeu']:
-                continue
-            
-            cartes_joueur = [Carte(**c) for c in joueur['cartes']]
-            toutes_cartes = cartes_joueur + [Carte(**c) for c in self.cartes_communes]
-            valeur_main, cartes_combinaison = self.evaluer_main(toutes_cartes)
-            mains[username] = {
-                'valeur': valeur_main,
-                'cartes': [c.to_dict() for c in cartes_combinaison],
-                'main_complete': [c.to_dict() for c in cartes_joueur]
-            }
-            mains_valeurs[username] = valeur_main
-        
-        if mains:
-            # Trouver le gagnant basé sur la valeur de la main
-            gagnant = max(mains_valeurs.items(), key=lambda x: x[1])[0]
-            
-            # Calculer le gain total (pot + mises du tour en cours)
-            gain_total = self.pot
-            for mise in self.mises_tour.values():
-                gain_total += mise
-                
-            self.joueurs[gagnant]['jetons'] += gain_total
-            
-            # Préparer les données pour l'émission
-            resultats_mains = {
-                username: {
-                    'valeur': info['valeur'],
-                    'combinaison': self.get_nom_combinaison(info['valeur']),
-                    'cartes': info['main_complete'],
-                    'cartes_gagnantes': info['cartes']
-                }
-                for username, info in mains.items()
-            }
-            
-            socketio.emit('fin_manche', {
-                'gagnant': gagnant,
-                'gain': gain_total,
-                'mains': resultats_mains
-            }, room=self.room_id)
-            
-            # Préparation de la prochaine manche
-            self.dealer_index = (self.dealer_index + 1) % len(self.joueurs)
-            self.phase = 'attente'
-            self.pot = 0
-            self.cartes_communes = []
-            self.mise_actuelle = 0
-            self.mises_tour = {}
-            self.initialiser_deck()
-            
-            # Démarrer automatiquement la prochaine manche après un court délai
-            socketio.emit('nouvelle_manche', {'delai': 3}, room=self.room_id)
-            
-            self.update_game_state()
-
-    def evaluer_main(self, cartes):
-        if not cartes:  # Si la liste des cartes est vide
-            return 0, []  # Retourner une valeur par défaut
-            
-        valeurs = [c.get_valeur_numerique() for c in cartes]
-        couleurs = [c.couleur for c in cartes]
-        cartes_combinaison = []  # Pour stocker les cartes qui forment la combinaison
-        
-        # Vérification de la quinte flush royale et quinte flush
-        for couleur in set(couleurs):
-            cartes_couleur = [c for c in cartes if c.couleur == couleur]
-            if len(cartes_couleur) >= 5:
-                valeurs_couleur = sorted([c.get_valeur_numerique() for c in cartes_couleur], reverse=True)
-                for i in range(len(valeurs_couleur) - 4):
-                    if valeurs_couleur[i:i+5] == [14, 13, 12, 11, 10]:
-                        cartes_combinaison = [c for c in cartes_couleur if c.get_valeur_numerique() in [10, 11, 12, 13, 14]]
-                        return 10, cartes_combinaison  # Quinte flush royale
-                    if valeurs_couleur[i] - valeurs_couleur[i+4] == 4:
-                        val_debut = valeurs_couleur[i]
-                        cartes_combinaison = [c for c in cartes_couleur if val_debut >= c.get_valeur_numerique() >= val_debut-4]
-                        return 9, cartes_combinaison  # Quinte flush
-        
-        # Carré
-        compteur = Counter(valeurs)
-        for valeur, count in compteur.items():
-            if count == 4:
-                cartes_combinaison = [c for c in cartes if c.get_valeur_numerique() == valeur]
-                # Ajouter la plus haute carte restante
-                autres_cartes = [c for c in cartes if c.get_valeur_numerique() != valeur]
-                if autres_cartes:
-                    cartes_combinaison.append(max(autres_cartes, key=lambda c: c.get_valeur_numerique()))
-                return 8, cartes_combinaison
-        
-        # Full house
-        brelan = None
-        paire = None
-        for valeur, count in compteur.items():
-            if count == 3 and (brelan is None or valeur > brelan):
-                brelan = valeur
-            elif count == 2 and (paire is None or valeur > paire):
-                paire = valeur
-        if brelan is not None and paire is not None:
-            cartes_combinaison = [c for c in cartes if c.get_valeur_numerique() in [brelan, paire]]
-            return 7, cartes_combinaison
-        
-        # Couleur
-        for couleur in set(couleurs):
-            cartes_couleur = [c for c in cartes if c.couleur == couleur]
-            if len(cartes_couleur) >= 5:
-                cartes_combinaison = sorted(cartes_couleur, key=lambda c: c.get_valeur_numerique(), reverse=True)[:5]
-                return 6, cartes_combinaison
-        
-        # Quinte
-        valeurs_uniques = sorted(set(valeurs), reverse=True)
-        for i in range(len(valeurs_uniques) - 4):
-            if valeurs_uniques[i] - valeurs_uniques[i+4] == 4:
-                val_debut = valeurs_uniques[i]
-                cartes_combinaison = [c for c in cartes if val_debut >= c.get_valeur_numerique() >= val_debut-4]
-                return 5, cartes_combinaison
-        
-        # Brelan
-        for valeur, count in compteur.items():
-            if count == 3:
-                cartes_combinaison = [c for c in cartes if c.get_valeur_numerique() == valeur]
-                # Ajouter les deux plus hautes cartes restantes
-                autres_cartes = sorted([c for c in cartes if c.get_valeur_numerique() != valeur], 
-                                     key=lambda c: c.get_valeur_numerique(), reverse=True)[:2]
-                cartes_combinaison.extend(autres_cartes)
-                return 4, cartes_combinaison
-        
-        # Deux paires
-        paires = []
-        for valeur, count in compteur.items():
-            if count == 2:
-                paires.append(valeur)
-        if len(paires) >= 2:
-            paires.sort(reverse=True)  # Trier les paires par ordre décroissant
-            paires = paires[:2]  # Garder les deux plus hautes paires
-            cartes_combinaison = [c for c in cartes if c.get_valeur_numerique() in paires]
-            # Ajouter la plus haute carte restante
-            autres_cartes = [c for c in cartes if c.get_valeur_numerique() not in paires]
-            if autres_cartes:
-                cartes_combinaison.append(max(autres_cartes, key=lambda c: c.get_valeur_numerique()))
-            return 3, cartes_combinaison
-        
-        # Paire
-        for valeur, count in compteur.items():
-            if count == 2:
-                cartes_combinaison = [c for c in cartes if c.get_valeur_numerique() == valeur]
-                # Ajouter les trois plus hautes cartes restantes
-                autres_cartes = sorted([c for c in cartes if c.get_valeur_numerique() != valeur], 
-                                     key=lambda c: c.get_valeur_numerique(), reverse=True)[:3]
-                cartes_combinaison.extend(autres_cartes)
-                return 2, cartes_combinaison
-        
-        # Carte haute
-        cartes_triees = sorted(cartes, key=lambda c: c.get_valeur_numerique(), reverse=True)
-        return 1, [cartes_triees[0]]  # Retourner la plus haute carte
-
-    def update_game_state(self):
-        # S'assurer que mises_tour contient tous les joueurs actuels
-        for username in self.joueurs:
-            if username not in self.mises_tour:
-                self.mises_tour[username] = 0
-
-        # Déterminer les positions des blinds
-        joueurs_liste = list(self.joueurs.keys())
-        if len(joueurs_liste) >= 2:
-            dealer_index = self.dealer_index % len(joueurs_liste)
-            big_blind_index = (self.dealer_index + 2) % len(joueurs_liste)
-            dealer = joueurs_liste[dealer_index]
-            big_blind = joueurs_liste[big_blind_index]
         else:
-            dealer = None
-            big_blind = None
-
-        socketio.emit('update_game_state', {
-            'pot': self.pot,
-            'tour_actuel': self.gestion_tour.joueur_actuel() if self.gestion_tour else None,
-            'mise_actuelle': self.mise_actuelle,
-            'phase': self.phase,
-            'cartes_communes': self.cartes_communes,
-            'partie_en_cours': self.partie_en_cours,
-            'joueurs': {
-                u: {
-                    'jetons': j['jetons'],
-                    'en_jeu': j['en_jeu'],
-                    'mise_tour': self.mises_tour.get(u, 0),
-                    'is_dealer': u == dealer,
-                    'is_big_blind': u == big_blind
-                } for u, j in self.joueurs.items()
-            }
-        }, room=self.room_id)
-
-    def evaluer_et_envoyer_combinaison(self, username):
-        # Vérifier si le joueur existe encore dans la partie
-        if username not in self.joueurs:
-            socketio.emit('combinaison_actuelle', {
-                'combinaison': 'Non disponible',
-                'cartes_gagnantes': []
-            }, room=username)
-            return
-        
-        joueur = self.joueurs[username]
-        if not joueur['en_jeu']:
-            return
-            
-        cartes_joueur = [Carte(**c) for c in joueur['cartes']]
-        toutes_cartes = cartes_joueur + [Carte(**c) for c in self.cartes_communes]
-        
-        if not toutes_cartes:  # S'il n'y a pas de cartes à évaluer
-            socketio.emit('combinaison_actuelle', {
-                'combinaison': 'En attente',
-                'cartes_gagnantes': []
-            }, room=username)
+            socketio.emit(evenement, donnees, room=salle_binaire)
+    socketio.emit(evenement, donnees, room=salle)
+
+def repondre(evenement, donnees, joueurs=None):
+    """Comme ``emit`` vers le client courant, dans son format"""
+    lot = lots.courant.get()
+    if lot is not None:
+        lot.ajouter((request.sid,), evenement, donnees, joueurs)
+        return
+    if request.sid in clients_binaires:
+        charge = binaire.encoder(evenement, donnees, joueurs)
+        if charge is not None:
+            with metriques.emission((evenement,)):
+                emit(binaire.EVENEMENT, charge)
             return
-            
-        valeur_main, cartes_combinaison = self.evaluer_main(toutes_cartes)
-        combinaison = self.get_nom_combinaison(valeur_main) if valeur_main > 0 else 'En attente'
-        
-        # Convertir les cartes de la combinaison en format lisible
-        cartes_gagnantes = [{'valeur': c.valeur, 'couleur': c.couleur} for c in cartes_combinaison]
-        
-        socketio.emit('combinaison_actuelle', {
-            'combinaison': combinaison,
-            'cartes_gagnantes': cartes_gagnantes
-        }, room=username)
-
-    def gerer_deconnexion_temporaire(self, username):
-        # Supprimer immédiatement le joueur
-        if username in self.joueurs:
-            # Si c'était le tour du joueur déconnecté
-            if self.gestion_tour and self.gestion_tour.joueur_actuel() == username:
-                # Coucher automatiquement le joueur
-                self.joueurs[username]['en_jeu'] = False
-                socketio.emit('notification', {
-                    'message': f'{username} a été déconnecté et ses cartes ont été couchées',
-                    'type': 'error'
-                }, room=self.room_id)
-                
-                # Vérifier s'il ne reste qu'un joueur
-                joueurs_actifs = [j for j in self.joueurs if self.joueurs[j]['en_jeu']]
-                if len(joueurs_actifs) == 1:
-                    self.fin_manche(joueurs_actifs[0])
-                else:
-                    # Passer au joueur suivant
-                    self.gestion_tour.passer_au_suivant()
-                    self.update_game_state()
-            
-            # Supprimer le joueur et continuer la partie
-            self.retirer_joueur(username)
-            socketio.emit('notification', {
-                'message': f'{username} a quitté la table',
-                'type': 'error'
-            }, room=self.room_id)
-            
-            # Si la table est vide après la déconnexion, la supprimer
-            if not self.joueurs:
-                if self.room_id in games:
-                    del games[self.room_id]
-                    socketio.emit('update_tables', {
-                        'tables': {
-                            room_id: {
-                                'joueurs': {
-                                    u: {'jetons': j['jetons']} 
-                                    for u, j in game.joueurs.items()
-                                },
-                                'partie_en_cours': game.partie_en_cours
-                            } for room_id, game in games.items()
-                        }
-                    }, broadcast=True)  # Envoyer à tous les clients
-
-    def retirer_joueur(self, username):
-        if username in self.joueurs:
-            # Nettoyer les mises du joueur
-            if username in self.mises_tour:
-                self.pot += self.mises_tour[username]  # Ajouter la mise au pot
-                del self.mises_tour[username]
-            
-            # Retirer le joueur des joueurs prêts
-            if username in self.joueurs_prets:
-                self.joueurs_prets.remove(username)
-            
-            # Supprimer le joueur
-            del self.joueurs[username]
-            if username in self.deconnexions_temporaires:
-                del self.deconnexions_temporaires[username]
-            
-            # Mettre à jour la gestion du tour si nécessaire
-            if self.gestion_tour:
-                self.gestion_tour.ordre_joueurs = list(self.joueurs.keys())
-                if len(self.joueurs) < 2:
-                    if len(self.joueurs) == 1:
-                        dernier_joueur = next(iter(self.joueurs.keys()))
-                        # Réinitialiser l'index avant de finir la manche
-                        self.gestion_tour.index_actuel = 0
-                        self.fin_manche(dernier_joueur)
-                    else:
-                        self.phase = 'attente'
+    emit(evenement, donnees)
+
+def envoyer_lot(lot):
+    """Envoie à chaque client ses événements du lot en un paquet, dans son format"""
+    charges = {}  # index -> charge binaire, encodée une fois pour tous les groupes
+    for sids, index in lot.groupes():
+        noms = [lot.evenements[i][0] for i in index]
+        texte = tuple(sid for sid in sids if sid not in clients_binaires)
+        binaires = tuple(sid for sid in sids if sid in clients_binaires)
+        for membres, format_binaire in ((texte, False), (binaires, True)):
+            if not membres:
+                continue
+            paquet = []
+            for i in index:
+                evenement, donnees, joueurs = lot.evenements[i]
+                if format_binaire:
+                    if i not in charges:
+                        charges[i] = binaire.encoder(evenement, donnees, joueurs)
+                    if charges[i] is not None:
+                        evenement, donnees = binaire.EVENEMENT, charges[i]
+                paquet.append([evenement, donnees])
+            with metriques.emission(noms):
+                if len(paquet) == 1:
+                    socketio.emit(*paquet[0], room=membres)
                 else:
-                    # Si c'était le tour du joueur déconnecté
-                    if self.gestion_tour.joueur_actuel() == username:
-                        # Réinitialiser l'index si nécessaire
-                        if self.gestion_tour.index_actuel >= len(self.joueurs):
-                            self.gestion_tour.index_actuel = 0
-                        self.gestion_tour.passer_au_suivant()
-                    self.update_game_state()
-
-    def verifier_tous_prets(self):
-        """Vérifie si tous les joueurs sont prêts"""
-        if self.partie_en_cours:
-            return False
-        if len(self.joueurs) < 2:  # Il faut au moins 2 joueurs
-            return False
-        return len(self.joueurs_prets) == len(self.joueurs)  # Tous les joueurs doivent être prêts
-
-    def demarrer_partie(self):
-        """Démarre une nouvelle partie"""
-        if not self.verifier_tous_prets():
-            return False
-            
-        self.partie_en_cours = True
-        self.phase = 'preflop'
-        self.pot = 0
-        self.cartes_communes = []
-        self.mise_actuelle = self.grande_blind
-        self.mises_tour = {}
-        self.initialiser_deck()
-        
-        # Distribution des cartes
-        for username in self.joueurs:
-            self.joueurs[username]['cartes'] = [self.deck.pop().to_dict() for _ in range(2)]
-            self.joueurs[username]['en_jeu'] = True
-            self.mises_tour[username] = 0
-            
-            # Envoyer les cartes à chaque joueur
-            socketio.emit('recevoir_cartes', {
-                'cartes': self.joueurs[username]['cartes']
-            }, room=username)
-        
-        # Mise des blinds
-        joueurs_liste = list(self.joueurs.keys())
-        petite_blind_index = (self.dealer_index + 1) % len(joueurs_liste)
-        grande_blind_index = (self.dealer_index + 2) % len(joueurs_liste)
-        
-        # Petite blind
-        petite_blind_joueur = joueurs_liste[petite_blind_index]
-        montant_petite_blind = min(self.petite_blind, self.joueurs[petite_blind_joueur]['jetons'])
-        self.joueurs[petite_blind_joueur]['jetons'] -= montant_petite_blind
-        self.pot += montant_petite_blind
-        self.mises_tour[petite_blind_joueur] = montant_petite_blind
-        
-        # Grande blind
-        grande_blind_joueur = joueurs_liste[grande_blind_index]
-        montant_grande_blind = min(self.grande_blind, self.joueurs[grande_blind_joueur]['jetons'])
-        self.joueurs[grande_blind_joueur]['jetons'] -= montant_grande_blind
-        self.pot += montant_grande_blind
-        self.mises_tour[grande_blind_joueur] = montant_grande_blind
-        self.mise_actuelle = montant_grande_blind
-        
-        # Initialiser la gestion des tours
-        self.gestion_tour = GestionTour(self.joueurs)
-        self.gestion_tour.index_actuel = (grande_blind_index + 1) % len(joueurs_liste)
-        
-        # Notifications
-        socketio.emit('notification', {
-            'message': 'La partie commence !',
+                    socketio.emit(lots.EVENEMENT, paquet, room=membres)
+
+files.appeler = functools.partial(lots.executer, envoyer_lot)
+
+def fermer_table(room):
+    """Supprime une table vide ; ses spectateurs sont renvoyés au lobby"""
+    del games[room]
+    if spectateurs.pop(room, None):
+        diffuser('table_fermee', {'room': room}, room)
+    for salle in (room, room + SUFFIXE_BINAIRE):
+        socketio.server.close_room(salle, namespace='/')
+
+def nouvelle_partie(room):
+    return Partie(room, sortie=SortieTable(room), service_equite=service_equite, matrice_preflop=matrice_preflop,
+                  journal=journal, historique=historique)
+
+def evenement(nom):
+    """Enregistre le handler de l'événement Socket.IO ``nom`` et mesure sa durée"""
+    def decorateur(handler):
+        codes_evenements[handler.__code__] = nom
+
+        @functools.wraps(handler)
+        def mesurer(*args):
+            debut = time.perf_counter()
+            try:
+                return handler(*args)
+            finally:
+                metriques.observer(nom, time.perf_counter() - debut)
+        return socketio.on(nom)(mesurer)
+    return decorateur
+
+def commande_table(nom):
+    """Comme ``evenement``, mais exécute le handler dans la file de commandes de la table ``data['room']``
+
+    Le contexte de la requête (``request.sid``, ``emit``, ``join_room``) est
+    conservé pour l'exécution différée. La durée mesurée inclut l'attente
+    dans la file.
+    """
+    def decorateur(handler):
+        codes_evenements[handler.__code__] = nom
+
+        def executer(debut, data):
+            try:
+                handler(data)
+            finally:
+                metriques.observer(nom, time.perf_counter() - debut)
+
+        @functools.wraps(handler)
+        def soumettre(data):
+            derniere_table[request.sid] = data['room']
+            files.soumettre(data['room'], copy_current_request_context(executer), time.perf_counter(), data)
+        return socketio.on(nom)(soumettre)
+    return decorateur
+
+def enregistrer_session(room, username):
+    """Associe la connexion courante au joueur assis à la table"""
+    sessions.pop(sid_joueurs.get((room, username)), None)  # Connexion précédente du joueur
+    precedente = sessions.get(request.sid)  # Place précédente de cette connexion
+    if precedente:
+        sid_joueurs.pop(precedente, None)
+    sessions[request.sid] = (room, username)
+    sid_joueurs[(room, username)] = request.sid
+
+def oublier_session(room, username):
+    sessions.pop(sid_joueurs.pop((room, username), None), None)
+
+def reprendre_place(game, username):
+    """Le joueur revient sur sa place après une coupure : rien n'est réinitialisé"""
+    if game.deconnexions_temporaires.pop(username, None) is not None:
+        diffuser('notification', {
+            'message': f'{username} s\'est reconnecté',
             'type': 'success'
-        }, room=self.room_id)
-        
-        # Mise à jour de l'état du jeu
-        self.update_game_state()
-        return True
+        }, game.room_id)
+    
+    repondre('table_creee', {
+        'username': username,
+        'room': game.room_id,
+        'partie_en_cours': game.partie_en_cours
+    })
+    repondre('update_game_state', game.etat_complet(), game.joueurs)
+    
+    # Renvoyer les cartes et la combinaison de la manche en cours
+    joueur = game.joueurs[username]
+    if game.phase != 'attente' and joueur.en_jeu and joueur.cartes:
+        repondre('recevoir_cartes', {'cartes': Carte.vers_dicts(joueur.cartes)})
+        game.evaluer_et_envoyer_combinaison(username, demandee=True)
+
+def rediriger(evenement, data):
+    """Renvoie le client vers le shard qui possède la table ; False si elle est locale"""
+    if repartition.est_locale(data['room']):
+        return False
+    repondre('changer_shard', {'url': repartition.url(data['room']), 'evenement': evenement, 'donnees': data})
+    return True
+
+def expirer_deconnexion(room, username, instant):
+    """Fin du délai de reconnexion : le joueur est couché et retiré de la table"""
+    game = games.get(room)
+    if game is None or game.deconnexions_temporaires.get(username) != instant:
+        return  # Table fermée ou joueur revenu entre-temps
+    game.gerer_deconnexion_temporaire(username)
+    
+    # Si la table est vide après la déconnexion, la supprimer
+    if not game.joueurs:
+        fermer_table(room)
+    broadcast_tables_update(room)
+
+def restaurer_tables():
+    """Recrée les tables du journal après un redémarrage, entre deux manches
+
+    Les joueurs ont le délai de reconnexion habituel pour reprendre leur place.
+    """
+    instant = time.monotonic()
+    for room, table in journal.reprise.items():
+        game = games[room] = nouvelle_partie(room)
+        for username, jetons in table['joueurs'].items():
+            game.ajouter_joueur(username, jetons)
+            game.deconnexions_temporaires[username] = instant
+            game.sortie.planifier(DELAI_RECONNEXION, expirer_deconnexion, room, username, instant)
+        game.dealer_index = table['dealer_index'] % len(game.joueurs)
+        game.numero_main = table['numero_main']
+        lobby.table_modifiee(room, game)
+
+if journal:
+    restaurer_tables()
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
-@socketio.on('creer_table')
+@app.route('/files')
+def etat_files():
+    """Profondeur des files de commandes (commandes en attente ou en cours par table)"""
+    return jsonify(tables=files.profondeurs(), executees=files.executees, profondeur_max=files.profondeur_max)
+
+@app.route('/metrics')
+def exposer_metriques():
+    """Métriques du worker au format texte de Prometheus"""
+    texte = metriques.texte([
+        ('poker_tables', 'Tables ouvertes', len(games)),
+        ('poker_joueurs', 'Joueurs assis', sum(len(game.joueurs) for game in games.values())),
+        ('poker_spectateurs', 'Spectateurs des tables', sum(len(sids) for sids in spectateurs.values())),
+        ('poker_tables_en_jeu', 'Tables avec une main en cours', sum(game.partie_en_cours for game in games.values())),
+        ('poker_commandes_en_attente', 'Commandes en attente ou en cours dans les files des tables',
+         sum(files.profondeurs().values())),
+        ('poker_minuteries', 'Minuteries armées', len(roue)),
+    ] + ([
+        ('poker_boucle_blocages', 'Blocages de la boucle au-delà du seuil', surveillant.blocages),
+        ('poker_boucle_retard_max_secondes', 'Plus long retard de la boucle', surveillant.retard_max),
+    ] if surveillant else []))
+    return app.response_class(texte, mimetype='text/plain; version=0.0.4')
+
+def verifier_admin():
+    jeton = request.headers.get('X-Admin-Jeton', '')
+    if not JETON_ADMIN or not hmac.compare_digest(jeton.encode(), JETON_ADMIN.encode()):
+        abort(403)
+
+@app.route('/admin/profil', methods=['POST'])
+def profiler():
+    """Profile la boucle pendant ``?secondes=N`` (ou jusqu'à /admin/profil/arreter), renvoie les piles repliées"""
+    global profileur
+    verifier_admin()
+    if profileur is not None:
+        abort(409)  # Un seul profilage à la fois
+    secondes = min(request.args.get('secondes', 10, type=float), DUREE_MAX_PROFIL)
+    profileur = Profileur()
+    profileur.demarrer()
+    fin = time.monotonic() + secondes
+    while time.monotonic() < fin and not profileur.arret.is_set():
+        socketio.sleep(0.1)
+    texte = profileur.arreter()
+    profileur = None
+    return app.response_class(texte, mimetype='text/plain',
+                              headers={'Content-Disposition': 'attachment; filename=profil.folded'})
+
+@app.route('/admin/profil/arreter', methods=['POST'])
+def arreter_profil():
+    """Termine le profilage en cours, dont la requête renvoie alors le résultat"""
+    verifier_admin()
+    if profileur is not None:
+        profileur.arret.set()
+    return jsonify(en_cours=profileur is not None)
+
+@commande_table('creer_table')
 def handle_create_table(data):
+    if rediriger('creer_table', data):
+        return
     username = data['username']
     room = data['room']
     
     if room not in games:
-        games[room] = Partie(room)
+        games[room] = nouvelle_partie(room)
+    elif username not in games[room].joueurs and len(games[room].joueurs) >= NB_SIEGES:
+        repondre('erreur', {'message': 'La table est pleine'})
+        return
     
-    join_room(room)
-    join_room(username)
+    join_room(salle_client(room))
+    join_room(salle_client(username))
+    leave_room(salle_client(SALLE_LOBBY))
+    enregistrer_session(room, username)
     
-    games[room].joueurs[username] = {
-        'cartes': [],
-        'jetons': 1000,
-        'en_jeu': True
-    }
+    games[room].ajouter_joueur(username)
     
     # Émettre l'état actuel à tous les joueurs
-    emit('table_creee', {
+    repondre('table_creee', {
         'username': username,
         'room': room
     })
     
-    # Mettre à jour la liste des tables pour tous les clients
-    emit('update_tables', {
-        'tables': {
-            room_id: {
-                'joueurs': {
-                    u: {'jetons': j['jetons']} 
-                    for u, j in game.joueurs.items()
-                },
-                'partie_en_cours': game.partie_en_cours
-            } for room_id, game in games.items()
-        }
-    }, broadcast=True)  # Envoyer à tous les clients
+    # Mettre à jour la liste des tables du lobby
+    broadcast_tables_update(room)
     
-    # Mettre à jour l'état du jeu
-    games[room].update_game_state()
+    # Mettre à jour l'état du jeu, état complet pour le créateur de la table
+    repondre('update_game_state', games[room].etat_complet(), games[room].joueurs)
 
-@socketio.on('rejoindre_partie')
+@commande_table('rejoindre_partie')
 def on_join(data):
+    if rediriger('rejoindre_partie', data):
+        return
     username = data['username']
     room = data['room']
     
     if room not in games:
-        emit('erreur', {'message': 'Cette table n\'existe plus'})
+        repondre('erreur', {'message': 'Cette table n\'existe plus'})
         return
     
-    if len(games[room].joueurs) >= 7:
-        emit('erreur', {'message': 'La table est pleine'})
+    # Un joueur déjà assis (reconnexion) retrouve sa place
+    reconnexion = username in games[room].joueurs
+    if not reconnexion and len(games[room].joueurs) >= NB_SIEGES:
+        repondre('erreur', {'message': 'La table est pleine'})
         return
     
-    join_room(room)
-    join_room(username)
+    join_room(salle_client(room))
+    join_room(salle_client(username))
+    leave_room(salle_client(SALLE_LOBBY))
+    enregistrer_session(room, username)
     
-    games[room].joueurs[username] = {
-        'cartes': [],
-        'jetons': 1000,
-        'en_jeu': not games[room].partie_en_cours  # Le joueur n'est pas en jeu si une partie est en cours
-    }
+    if reconnexion:
+        reprendre_place(games[room], username)
+        return
+    
+    games[room].ajouter_joueur(username)
     
     # Émettre l'état actuel à tous les joueurs
-    emit('joueur_rejoint', {
+    diffuser('joueur_rejoint', {
         'username': username,
         'joueurs': {
-            u: {'jetons': j['jetons']} 
+            u: {'jetons': j.jetons}
             for u, j in games[room].joueurs.items()
         },
         'partie_en_cours': games[room].partie_en_cours
-    }, room=room)
+    }, room)
     
-    # Mettre à jour l'état du jeu pour tous les joueurs
-    games[room].update_game_state()
+    # Mettre à jour l'état du jeu pour tous les joueurs, état complet pour le nouveau
+    repondre('update_game_state', games[room].etat_complet(), games[room].joueurs)
     
-    # Mettre à jour la liste des tables pour tous les clients
-    emit('update_tables', {
-        'tables': {
-            room_id: {
-                'joueurs': {
-                    u: {'jetons': j['jetons']} 
-                    for u, j in game.joueurs.items()
-                },
-                'partie_en_cours': game.partie_en_cours
-            } for room_id, game in games.items()
-        }
-    }, broadcast=True)  # Envoyer à tous les clients
+    # Mettre à jour la liste des tables du lobby
+    broadcast_tables_update(room)
     
     # Si on a 2 joueurs ou plus et qu'aucune partie n'est en cours, activer le bouton démarrer
     if len(games[room].joueurs) >= 2 and not games[room].partie_en_cours:
-        emit('activer_demarrage', room=room)
+        diffuser('activer_demarrage', None, room)
     
     # Cacher le lobby et afficher le jeu pour le joueur qui rejoint
-    emit('table_creee', {
+    repondre('table_creee', {
         'username': username,
         'room': room,
         'partie_en_cours': games[room].partie_en_cours
     })
 
-def broadcast_tables_update():
-    """Fonction utilitaire pour diffuser la mise à jour des tables à tous les clients"""
-    tables_data = {
-        'tables': {
-            room_id: {
-                'joueurs': {
-                    u: {'jetons': j['jetons']} 
-                    for u, j in game.joueurs.items()
-                },
-                'partie_en_cours': game.partie_en_cours
-            } for room_id, game in games.items()
-        }
-    }
-    socketio.emit('update_tables', tables_data)
+def broadcast_tables_update(room):
+    """Signale au lobby qu'une table a changé ou a été fermée (envoi regroupé)"""
+    lobby.table_modifiee(room, games.get(room))
 
-@socketio.on('demarrer_partie')
+@commande_table('demarrer_partie')
 def start_game(data):
     room = data['room']
     if room in games:
         game = games[room]
+        if game.phase != 'attente':
+            return  # Manche déjà lancée : chaque client envoie demarrer_partie après nouvelle_manche
         if len(game.joueurs) >= 2:
-            # Mettre à jour l'état de la partie
+            # Mettre à jour l'état de la partie (la liste des tables est
+            # rediffusée par distribuer_cartes)
             game.partie_en_cours = True
             
-            # Notifier immédiatement tous les clients du changement d'état
-            broadcast_tables_update()
-            
             # Notifier le démarrage de la partie
-            socketio.emit('partie_demarree', {
+            diffuser('partie_demarree', {
                 'partie_en_cours': True,
                 'room': room
-            }, room=room)
+            }, room)
             
-            # Distribuer les cartes et continuer la partie
+            # Distribuer les cartes et continuer la partie (envoie aussi l'état du jeu)
             game.distribuer_cartes()
-            
-            # Mettre à jour l'état du jeu
-            game.update_game_state()
         else:
-            emit('erreur', {'message': 'Il faut au moins 2 joueurs pour démarrer la partie'}, room=room)
+            diffuser('erreur', {'message': 'Il faut au moins 2 joueurs pour démarrer la partie'}, room)
 
-@socketio.on('action_joueur')
+@commande_table('action_joueur')
 def handle_action(data):
     room = data['room']
-    username = data['username']
-    action = data['action']
-    montant = data.get('montant', 0)
-    
     if room not in games:
         return
-        
-    game = games[room]
-    if username != game.gestion_tour.joueur_actuel() or not game.joueurs[username]['en_jeu']:
-        emit('erreur', {'message': 'Ce n\'est pas votre tour'}, room=username)
-        return
-    
-    # Vérifier si le joueur a encore des jetons
-    if game.joueurs[username]['jetons'] <= 0:
-        game.joueurs[username]['en_jeu'] = False
-        socketio.emit('notification', {
-            'message': f'{username} n\'a plus de jetons et est éliminé de la partie',
-            'type': 'error'
-        }, room=room)
-        # Vérifier s'il ne reste qu'un joueur
-        joueurs_actifs = [j for j in game.joueurs if game.joueurs[j]['en_jeu']]
-        if len(joueurs_actifs) == 1:
-            game.fin_manche(joueurs_actifs[0])
-            return
-        game.gestion_tour.passer_au_suivant()
-        game.update_game_state()
-        return
-    
-    mise_necessaire = game.mise_actuelle - game.mises_tour[username]
-    
-    if action == 'check':
-        if mise_necessaire > 0:
-            emit('erreur', {'message': 'Vous ne pouvez pas checker, vous devez suivre ou vous coucher'}, room=username)
-            return
-        # Notification de check
-        socketio.emit('notification', {
-            'message': f'{username} checke',
-            'type': 'action'
-        }, room=room)
-    elif action == 'mise':
-        if montant < mise_necessaire:
-            emit('erreur', {'message': f'Mise insuffisante. Minimum requis: {mise_necessaire}€'}, room=username)
-            return
-        # Vérifier le montant maximum possible (total des jetons des autres joueurs)
-        joueurs_actifs = [j for j in game.joueurs if game.joueurs[j]['en_jeu'] and j != username]
-        max_jetons_autres = sum(game.joueurs[j]['jetons'] for j in joueurs_actifs)
-        montant_max = min(game.joueurs[username]['jetons'], max_jetons_autres)
-        if montant > montant_max:
-            emit('erreur', {'message': f'Mise impossible. Maximum possible: {montant_max}€'}, room=username)
-            return
-        if montant > game.joueurs[username]['jetons']:
-            emit('erreur', {'message': f'Vous n\'avez pas assez de jetons. Vous avez {game.joueurs[username]["jetons"]}€'}, room=username)
-            return
-        game.pot += montant
-        game.joueurs[username]['jetons'] -= montant
-        game.mise_actuelle = game.mises_tour[username] + montant
-        game.mises_tour[username] += montant
-        game.gestion_tour.dernier_miseur = username
-        # Notification de mise
-        socketio.emit('notification', {
-            'message': f'{username} a misé {montant}€',
-            'type': 'action'
-        }, room=room)
-    elif action == 'allin':
-        montant = game.joueurs[username]['jetons']
-        game.pot += montant
-        game.joueurs[username]['jetons'] = 0
-        game.mise_actuelle = max(game.mise_actuelle, game.mises_tour[username] + montant)
-        game.mises_tour[username] += montant
-        game.gestion_tour.dernier_miseur = username
-        # Notification de all-in
-        socketio.emit('notification', {
-            'message': f'{username} est All-in avec {montant}€ !',
-            'type': 'action'
-        }, room=room)
-    elif action == 'suivre':
-        if mise_necessaire > game.joueurs[username]['jetons']:
-            emit('erreur', {'message': 'Vous n\'avez pas assez de jetons'}, room=username)
-            return
-        game.pot += mise_necessaire
-        game.joueurs[username]['jetons'] -= mise_necessaire
-        game.mises_tour[username] += mise_necessaire
-        # Notification de suivi
-        socketio.emit('notification', {
-            'message': f'{username} a suivi ({mise_necessaire}€)',
-            'type': 'action'
-        }, room=room)
-    elif action == 'coucher':
-        game.joueurs[username]['en_jeu'] = False
-        # Notification d'abandon
-        socketio.emit('notification', {
-            'message': f'{username} s\'est couché',
-            'type': 'action'
-        }, room=room)
-        # Si tous les autres joueurs se sont couchés sauf un
-        joueurs_actifs = [j for j in game.joueurs if game.joueurs[j]['en_jeu']]
-        if len(joueurs_actifs) == 1:
-            game.fin_manche(joueurs_actifs[0])
-            return
-    
-    # Vérifier si le tour est terminé
-    if game.gestion_tour.verifier_tour_complet(game.mises_tour, game.mise_actuelle):
-        if game.phase == 'river':
-            if all(not j['en_jeu'] or game.mises_tour[u] == game.mise_actuelle 
-                  for u, j in game.joueurs.items()):
-                game.evaluer_mains()
-            return
-        game.next_phase()
-    else:
-        # Passer au joueur suivant
-        game.gestion_tour.passer_au_suivant()
-        game.update_game_state()
+    games[room].jouer(data['username'], data['action'], data.get('montant', 0))
 
-@socketio.on('quitter_partie')
+@commande_table('quitter_partie')
 def on_leave(data):
-    username = data['username']
     room = data['room']
     
+    if oublier_spectateur(room, request.sid):
+        leave_room(salle_client(room))
+        join_room(salle_client(SALLE_LOBBY))
+        repondre('update_tables', lobby.liste())
+        return
+    
+    username = data['username']
     if room in games:
         game = games[room]
         if username in game.joueurs:
             # Coucher le joueur s'il est encore en jeu
-            if game.phase != 'attente' and game.joueurs[username]['en_jeu']:
-                game.joueurs[username]['en_jeu'] = False
+            if game.phase != 'attente' and game.joueurs[username].en_jeu:
+                game.joueurs[username].en_jeu = False
                 if game.gestion_tour and game.gestion_tour.joueur_actuel() == username:
                     game.gestion_tour.passer_au_suivant()
             
             # Retirer le joueur de la partie
             game.retirer_joueur(username)
             
-            # Quitter les rooms
-            leave_room(room)
-            leave_room(username)
+            # Quitter les rooms et revenir au lobby
+            oublier_session(room, username)
+            leave_room(salle_client(room))
+            leave_room(salle_client(username))
+            join_room(salle_client(SALLE_LOBBY))
             
             # Notifier les autres joueurs
-            emit('joueur_parti', {'username': username}, room=room)
+            diffuser('joueur_parti', {'username': username}, room)
             
             # Si la partie est vide, la supprimer
             if not game.joueurs:
-                del games[room]
+                fermer_table(room)
             
-            # Mettre à jour la liste des tables pour tous les clients
-            emit('update_tables', {
-                'tables': {
-                    room_id: {
-                        'joueurs': {
-                            u: {'jetons': j['jetons']} 
-                            for u, j in game.joueurs.items()
-                        },
-                        'partie_en_cours': game.partie_en_cours
-                    } for room_id, game in games.items()
-                }
-            }, broadcast=True)  # Envoyer à tous les clients
+            # Mettre à jour la liste des tables du lobby, liste complète pour
+            # le joueur qui y revient
+            broadcast_tables_update(room)
+            repondre('update_tables', lobby.liste())
             
             # Mettre à jour l'état du jeu pour les joueurs restants
             if game.joueurs:
                 game.update_game_state()
 
-@socketio.on('demander_combinaison')
+@commande_table('regarder_table')
+def handle_regarder_table(data):
+    """Le client suit la table sans s'y asseoir : état public, fins de manche, pas de cartes privées"""
+    if rediriger('regarder_table', data):
+        return
+    room = data['room']
+    if room not in games:
+        repondre('erreur', {'message': 'Cette table n\'existe plus'})
+        return
+    
+    # La salle de la table seulement : les cartes et combinaisons passent par la salle de chaque joueur
+    spectateurs.setdefault(room, set()).add(request.sid)
+    join_room(salle_client(room))
+    leave_room(salle_client(SALLE_LOBBY))
+    repondre('spectateur', {'room': room, 'partie_en_cours': games[room].partie_en_cours})
+    repondre('update_game_state', games[room].etat_complet(), games[room].joueurs)
+
+def oublier_spectateur(room, sid):
+    """Retire ``sid`` des spectateurs de la table ; False s'il n'en était pas"""
+    sids = spectateurs.get(room)
+    if not sids or sid not in sids:
+        return False
+    sids.discard(sid)
+    if not sids:
+        del spectateurs[room]
+    return True
+
+@commande_table('demander_etat')
+def handle_demander_etat(data):
+    # Le client a manqué un patch : lui renvoyer l'état complet
+    room = data['room']
+    if room in games:
+        repondre('update_game_state', games[room].etat_complet(), games[room].joueurs)
+
+@commande_table('demander_combinaison')
 def handle_demander_combinaison(data):
     room = data['room']
     username = data['username']
     
     if room in games:
-        games[room].evaluer_et_envoyer_combinaison(username)
+        games[room].evaluer_et_envoyer_combinaison(username, demandee=True)
 
-@socketio.on('connect')
+@evenement('connect')
 def handle_connect(auth):
     session_id = request.sid
+    if auth and auth.get('format') == 'binaire':
+        clients_binaires.add(session_id)
     emit('connected', {'sid': session_id})
     
-    # Envoyer immédiatement l'état actuel des tables au client qui se connecte
-    broadcast_tables_update()
-    
-    # Envoyer la liste des tables disponibles
-    emit('update_tables', {
-        'tables': {
-            room_id: {
-                'joueurs': {
-                    u: {'jetons': j['jetons']} 
-                    for u, j in game.joueurs.items()
-                },
-                'partie_en_cours': game.partie_en_cours
-            } for room_id, game in games.items()
-        }
-    }, broadcast=True)  # Envoyer à tous les clients
-    
-    # Vérifier si le joueur était temporairement déconnecté
-    for game in games.values():
-        for username in game.deconnexions_temporaires:
-            if username in game.joueurs:
-                del game.deconnexions_temporaires[username]
-                socketio.emit('notification', {
-                    'message': f'{username} s\'est reconnecté',
-                    'type': 'success'
-                }, room=game.room_id)
-                break
+    # Le client arrive dans le lobby : liste complète des tables, puis les
+    # changements au fil de l'eau
+    join_room(salle_client(SALLE_LOBBY))
+    repondre('update_tables', lobby.liste())
 
-@socketio.on('disconnect')
+@evenement('disconnect')
 def handle_disconnect():
-    # Parcourir toutes les parties pour trouver le joueur déconnecté
-    for room_id, game in list(games.items()):
-        for username in list(game.joueurs.keys()):
-            game.gerer_deconnexion_temporaire(username)
-            break
+    clients_binaires.discard(request.sid)
+    # Traitée dans la file de la table, après les commandes déjà envoyées par ce client
+    room = derniere_table.pop(request.sid, None)
+    if room is not None:
+        files.soumettre(room, deconnecter, request.sid, room)
+
+def deconnecter(sid, room_file):
+    """Déconnexion du client ``sid``, exécutée dans la file de ``room_file``"""
+    # Seule la table du joueur déconnecté est concernée
+    oublier_spectateur(room_file, sid)
+    session = sessions.pop(sid, None)
+    if session is None:
+        return  # Client du lobby, spectateur, ou connexion déjà remplacée par une reconnexion
+    del sid_joueurs[session]
+    room, username = session
+    if room == room_file:
+        garder_place(room, username)
+    else:
+        files.soumettre(room, garder_place, room, username)
+
+def garder_place(room, username):
+    """Garde la place du joueur déconnecté pendant le délai de reconnexion"""
+    game = games.get(room)
+    if game is None or username not in game.joueurs:
+        return
+    instant = time.monotonic()
+    game.deconnexions_temporaires[username] = instant
+    diffuser('joueur_deconnecte', {
+        'username': username,
+        'message': f'{username} est déconnecté, en attente de reconnexion'
+    }, room)
+    game.sortie.planifier(DELAI_RECONNEXION, expirer_deconnexion, room, username, instant)
 
-@socketio.on('ping_client')
+@evenement('ping_client')
 def handle_ping():
     emit('pong_server')
 
-@socketio.on('joueur_pret')
+@commande_table('joueur_pret')
 def handle_joueur_pret(data):
     room = data['room']
     username = data['username']
@@ -1025,26 +625,27 @@ def handle_joueur_pret(data):
     game = games[room]
     
     if game.partie_en_cours:
-        emit('erreur', {'message': 'La partie est déjà en cours'}, room=username)
+        diffuser('erreur', {'message': 'La partie est déjà en cours'}, username)
         return
         
-    game.joueurs_prets.add(username)
+    if username in game.joueurs:
+        game.joueurs[username].pret = True
     
-    socketio.emit('update_joueurs_prets', {
-        'joueurs_prets': list(game.joueurs_prets)
-    }, room=room)
+    diffuser('update_joueurs_prets', {
+        'joueurs_prets': game.joueurs_prets
+    }, room)
     
     if game.verifier_tous_prets():
         if game.demarrer_partie():
-            socketio.emit('partie_demarree', {
+            diffuser('partie_demarree', {
                 'room': room,
                 'partie_en_cours': True
-            }, room=room)
+            }, room)
             
-            # Notifier immédiatement tous les clients du changement d'état
-            broadcast_tables_update()
+            # Notifier le lobby du changement d'état
+            broadcast_tables_update(room)
 
-@socketio.on('joueur_pas_pret')
+@commande_table('joueur_pas_pret')
 def handle_joueur_pas_pret(data):
     room = data['room']
     username = data['username']
@@ -1053,28 +654,22 @@ def handle_joueur_pas_pret(data):
         return
         
     game = games[room]
-    if username in game.joueurs_prets:
-        game.joueurs_prets.remove(username)
+    if username in game.joueurs:
+        game.joueurs[username].pret = False
     
     # Notifier tous les joueurs du changement d'état
-    socketio.emit('update_joueurs_prets', {
-        'joueurs_prets': list(game.joueurs_prets)
-    }, room=room)
+    diffuser('update_joueurs_prets', {
+        'joueurs_prets': game.joueurs_prets
+    }, room)
 
-@socketio.on('demander_update_tables')
+@evenement('demander_update_tables')
 def handle_demander_update_tables():
-    # Envoyer la liste des tables disponibles
-    socketio.emit('update_tables', {
-        'tables': {
-            room_id: {
-                'joueurs': {
-                    u: {'jetons': j['jetons']} 
-                    for u, j in game.joueurs.items()
-                },
-                'partie_en_cours': game.partie_en_cours
-            } for room_id, game in games.items()
-        }
-    }, broadcast=True)  # Envoyer à tous les clients
+    # Envoyer la liste des tables disponibles au seul demandeur, qui suit
+    # désormais le lobby
+    join_room(salle_client(SALLE_LOBBY))
+    repondre('update_tables', lobby.liste())
 
 if __name__ == '__main__':
-    socketio.run(app, debug=True, host='0.0.0.0', port=5000) 
\ No newline at end of file
+    # Pas de rechargement automatique en mode réparti : il doublerait les processus
+    socketio.run(app, debug=True, host='0.0.0.0', port=int(os.environ.get('PORT', 5000)),
+                 use_reloader=not repartition.URLS) 
\ No newline at end of file
@@ -0,0 +1,158 @@
+"""Métriques du serveur, exposées au format texte de Prometheus.
+
+Les compteurs sont de simples entiers modifiés par la boucle d'événements :
+un worker eventlet n'exécute qu'une tâche à la fois, il n'y a donc ni verrou
+ni opération atomique à payer. Chaque worker a ses propres compteurs ;
+Prometheus additionne les workers (ou les shards) à la lecture.
+
+- ``poker_evenement_duree_secondes`` : histogramme, par événement Socket.IO,
+  du temps entre la réception et la fin du traitement (attente dans la file
+  de la table comprise) ;
+- ``poker_emissions_total`` : appels à ``emit`` par événement ;
+- ``poker_paquets_envoyes_total`` et ``poker_octets_envoyes_total`` : paquets
+  et octets effectivement envoyés aux clients, par événement (un lot, voir
+  ``lots.py``, est compté sous ``lot``, ses pièces jointes binaires avec lui) ;
+- ``poker_evenements_envoyes_total`` : événements remis aux clients, seuls
+  ou dans un lot, sous leur propre nom (sauf les événements binaires relayés
+  par la file partagée des shards, comptés sous ``b``) ;
+- ``poker_mains_total`` et ``poker_mains_par_minute`` : mains terminées.
+"""
+
+import bisect
+import collections
+import contextlib
+import time
+
+BORNES = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)  # secondes
+FENETRE_MAINS = 60  # secondes
+
+
+class Histogramme:
+    __slots__ = ('comptes', 'somme')
+
+    def __init__(self):
+        self.comptes = [0] * (len(BORNES) + 1)  # Le dernier compte est au-delà de la dernière borne
+        self.somme = 0.0
+
+    def observer(self, valeur):
+        self.comptes[bisect.bisect_left(BORNES, valeur)] += 1
+        self.somme += valeur
+
+
+def _nom_evenement(donnees):
+    """Nom de l'événement d'un paquet Socket.IO encodé (``2["nom",…]``, ``51-["nom",…]``)"""
+    if isinstance(donnees, str) and donnees[:1] in ('2', '5'):
+        debut = donnees.find('["', 0, 64)
+        if debut >= 0:
+            return donnees[debut + 2:donnees.find('"', debut + 2)]
+    return '(protocole)'
+
+
+def _etiquette(valeur):
+    return str(valeur).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metriques:
+    def __init__(self):
+        self.durees = collections.defaultdict(Histogramme)  # événement -> histogramme
+        self.emissions = collections.Counter()  # événement -> appels à emit
+        self.paquets = collections.Counter()  # événement -> paquets envoyés
+        self.octets = collections.Counter()  # événement -> octets envoyés
+        self.evenements = collections.Counter()  # événement -> remises à un client, seul ou dans un lot
+        self.contenu = None  # Noms des événements du paquet en cours d'émission, s'il les cache (lot, binaire)
+        self._en_tete = '(protocole)'  # Événement du dernier paquet texte : ses pièces jointes le suivent
+        self.mains = 0
+        self.fins_mains = collections.deque()  # Instants des mains terminées dans la dernière fenêtre
+
+    def observer(self, evenement, duree):
+        self.durees[evenement].observer(duree)
+
+    def noter_main(self):
+        self.mains += 1
+        maintenant = time.monotonic()
+        self.fins_mains.append(maintenant)
+        while self.fins_mains[0] < maintenant - FENETRE_MAINS:
+            self.fins_mains.popleft()
+
+    def mains_par_minute(self):
+        limite = time.monotonic() - FENETRE_MAINS
+        while self.fins_mains and self.fins_mains[0] < limite:
+            self.fins_mains.popleft()
+        return len(self.fins_mains) * 60 / FENETRE_MAINS
+
+    @contextlib.contextmanager
+    def emission(self, noms):
+        """Les paquets émis dans le bloc remettent les événements ``noms`` (lot, charge binaire)"""
+        self.contenu = noms
+        try:
+            yield
+        finally:
+            self.contenu = None
+
+    def compter_envoi(self, donnees):
+        if isinstance(donnees, bytes):
+            evenement = self._en_tete  # Pièce jointe binaire, envoyée juste après son en-tête
+        else:
+            evenement = self._en_tete = _nom_evenement(donnees)
+            if evenement != '(protocole)':
+                for nom in self.contenu or (evenement,):
+                    self.evenements[nom] += 1
+        self.paquets[evenement] += 1
+        self.octets[evenement] += len(donnees)  # JSON encodé en ASCII : autant d'octets que de caractères
+
+    def suivre_serveur(self, serveur):
+        """Compte les ``emit`` et les paquets envoyés par un ``socketio.Server``"""
+        emettre = serveur.emit
+        envoyer_eio = serveur._send_eio_packet
+
+        def emit(event, *args, **kwargs):
+            self.emissions[event] += 1
+            return emettre(event, *args, **kwargs)
+
+        def _send_packet(eio_sid, pkt):
+            # Même envoi que socketio.Server._send_packet (connexions, accusés de réception)
+            encode = pkt.encode()
+            for morceau in encode if isinstance(encode, list) else [encode]:
+                self.compter_envoi(morceau)
+                serveur.eio.send(eio_sid, morceau)
+
+        def _send_eio_packet(eio_sid, eio_pkt):
+            # Diffusions : paquet encodé une fois par le gestionnaire, envoyé à chaque client
+            self.compter_envoi(eio_pkt.data)
+            envoyer_eio(eio_sid, eio_pkt)
+
+        serveur.emit = emit
+        serveur._send_packet = _send_packet
+        serveur._send_eio_packet = _send_eio_packet
+
+    def texte(self, jauges=()):
+        """Exposition Prometheus ; ``jauges`` : (nom, aide, valeur) calculées à la lecture"""
+        lignes = [
+            '# HELP poker_evenement_duree_secondes Durée de traitement des événements Socket.IO',
+            '# TYPE poker_evenement_duree_secondes histogram',
+        ]
+        for evenement, histogramme in sorted(self.durees.items()):
+            etiquette = f'evenement="{_etiquette(evenement)}"'
+            cumul = 0
+            for borne, compte in zip(BORNES + (float('inf'),), histogramme.comptes):
+                cumul += compte
+                le = '+Inf' if borne == float('inf') else repr(borne)
+                lignes.append(f'poker_evenement_duree_secondes_bucket{{{etiquette},le="{le}"}} {cumul}')
+            lignes.append(f'poker_evenement_duree_secondes_sum{{{etiquette}}} {histogramme.somme!r}')
+            lignes.append(f'poker_evenement_duree_secondes_count{{{etiquette}}} {cumul}')
+        for nom, aide, compteur in (
+            ('poker_emissions_total', 'Appels à emit par événement', self.emissions),
+            ('poker_paquets_envoyes_total', 'Paquets envoyés aux clients par événement', self.paquets),
+            ('poker_octets_envoyes_total', 'Octets envoyés aux clients par événement', self.octets),
+            ('poker_evenements_envoyes_total', 'Événements remis aux clients, seuls ou dans un lot',
+             self.evenements),
+        ):
+            lignes += [f'# HELP {nom} {aide}', f'# TYPE {nom} counter']
+            lignes += [f'{nom}{{evenement="{_etiquette(e)}"}} {n}' for e, n in sorted(compteur.items())]
+        lignes += ['# HELP poker_mains_total Mains terminées', '# TYPE poker_mains_total counter',
+                   f'poker_mains_total {self.mains}']
+        jauges = [('poker_mains_par_minute', 'Mains terminées sur la dernière minute', self.mains_par_minute()),
+                  *jauges]
+        for nom, aide, valeur in jauges:
+            lignes += [f'# HELP {nom} {aide}', f'# TYPE {nom} gauge', f'{nom} {valeur}']
+        return '\n'.join(lignes) + '\n'
@@ -0,0 +1,85 @@
+"""Roue de minuteries hachée, partagée par toutes les tables.
+
+Les échéances sont rangées dans ``TAILLE`` cases parcourues à raison d'une
+case toutes les ``RESOLUTION`` secondes ; une minuterie plus lointaine
+qu'un tour de roue attend dans sa case le nombre de tours voulu. Armer et
+annuler une minuterie coûtent O(1) quel que soit le nombre de minuteries,
+et une seule tâche de fond fait avancer la roue, au lieu d'une tâche
+endormie par délai en cours.
+
+Les fonctions sont appelées depuis la tâche de la roue : elles doivent
+rendre la main vite (par exemple en déposant une commande dans la file
+d'une table).
+"""
+
+import math
+import time
+import traceback
+
+RESOLUTION = 0.05  # secondes par case
+TAILLE = 1024  # cases : un tour de roue dure RESOLUTION * TAILLE secondes
+
+
+class Minuterie:
+    __slots__ = ('case', 'tours', 'fonction', 'args')
+
+    def __init__(self, case, tours, fonction, args):
+        self.case = case  # Case de la roue où la minuterie attend, None une fois échue ou annulée
+        self.tours = tours  # Tours de roue restants avant l'échéance
+        self.fonction = fonction
+        self.args = args
+
+    def annuler(self):
+        if self.case is not None:
+            del self.case[self]
+            self.case = None
+
+
+class RoueMinuteries:
+    def __init__(self, lancer, attendre, resolution=RESOLUTION, taille=TAILLE):
+        self.lancer = lancer  # lancer(fonction) : démarre une tâche de fond
+        self.attendre = attendre  # attendre(secondes) : sommeil coopératif
+        self.resolution = resolution
+        self.cases = [{} for _ in range(taille)]  # Minuterie -> None (ensemble ordonné)
+        self.position = 0  # Dernière case traitée
+        self.demarree = False
+
+    def armer(self, delai, fonction, *args):
+        """Appelle ``fonction(*args)`` dans ``delai`` secondes (arrondi à la résolution supérieure)"""
+        if not self.demarree:
+            self.demarree = True
+            self.lancer(self.tourner)
+        pas = max(1, math.ceil(delai / self.resolution))
+        case = self.cases[(self.position + pas) % len(self.cases)]
+        minuterie = Minuterie(case, (pas - 1) // len(self.cases), fonction, args)
+        case[minuterie] = None
+        return minuterie
+
+    def avancer(self):
+        """Passe à la case suivante et appelle les minuteries échues"""
+        self.position = (self.position + 1) % len(self.cases)
+        case = self.cases[self.position]
+        echues = []
+        for minuterie in list(case):
+            if minuterie.tours:
+                minuterie.tours -= 1
+            else:
+                del case[minuterie]
+                minuterie.case = None
+                echues.append(minuterie)
+        for minuterie in echues:
+            try:
+                minuterie.fonction(*minuterie.args)
+            except Exception:
+                traceback.print_exc()  # Une minuterie en échec n'arrête pas la roue
+
+    def tourner(self):
+        """Tâche de la roue : une case par pas, en rattrapant le retard éventuel"""
+        echeance = time.monotonic()
+        while True:
+            echeance += self.resolution
+            self.attendre(max(0, echeance - time.monotonic()))
+            self.avancer()
+
+    def __len__(self):
+        return sum(len(case) for case in self.cases)
@@ -0,0 +1,1089 @@
+"""Moteur de jeu : distribution, enchères et abattage, sans serveur.
+
+``Partie`` ne connaît pas Socket.IO : chaque message destiné aux clients est
+un ``Evenement`` remis à une sortie. La sortie décide de ce qu'il en advient
+(envoi Socket.IO dans ``main.py``, rien du tout pour une simulation) et
+fournit aussi de quoi différer un traitement (déroulé des tapis, calcul
+d'équité).
+
+Une sortie expose :
+
+- ``muette`` : vrai si les événements sont ignorés ; la partie évite alors de
+  construire l'état de table et les combinaisons ;
+- ``emettre(evenement)`` ;
+- ``tables_modifiees(partie)`` : le résumé de la table dans le lobby a changé ;
+- ``planifier(delai, fonction, *args)`` : appelle ``fonction`` plus tard ;
+- ``armer(delai, fonction, *args)`` : idem, mais renvoie une minuterie
+  annulable (méthode ``annuler``), ou None si la sortie n'en arme pas
+  (chrono de parole, délai entre deux manches) ;
+- ``attendre(secondes)`` : fonction de sommeil utilisée en tâche de fond.
+
+Un ``journal`` optionnel (voir ``journal.py``) reçoit les arrivées, donnes,
+actions acceptées et paiements ; un ``historique`` optionnel (voir
+``historique.py``) reçoit chaque main terminée.
+"""
+
+import os
+import random
+import time
+from collections import deque, namedtuple
+
+import abattage
+import evaluateur
+from historique import Main
+from journal import ACTIONS  # Actions possibles d'un joueur, dans l'ordre de leurs codes sur disque
+
+DELAI_TAPIS = 2  # secondes entre deux rues quand plus personne ne peut miser
+DELAI_MANCHE = 3  # secondes entre la fin d'une manche et la donne suivante
+DELAI_ACTION = float(os.environ.get('POKER_DELAI_ACTION', 30))  # secondes pour jouer avant check ou abandon automatique
+NB_SIEGES = 7  # places par table
+TAILLE_RESERVE = 4  # paquets mélangés d'avance par table
+
+# ``salle`` est l'identifiant de table ou le nom du joueur destinataire
+Evenement = namedtuple('Evenement', ['nom', 'donnees', 'salle'])
+
+
+def differences(avant, apres):
+    """Champs de ``apres`` absents ou différents dans ``avant``
+    
+    Les dictionnaires imbriqués (joueurs) sont comparés champ par champ ; un
+    champ disparu vaut None dans le patch.
+    """
+    if avant is None:
+        return apres
+    patch = {}
+    for cle, valeur in apres.items():
+        ancienne = avant.get(cle)
+        if valeur != ancienne:
+            if isinstance(valeur, dict) and isinstance(ancienne, dict):
+                patch[cle] = differences(ancienne, valeur)
+            else:
+                patch[cle] = valeur
+    for cle in avant.keys() - apres.keys():
+        patch[cle] = None
+    return patch
+
+
+class SortieNulle:
+    """Ignore les événements ; les traitements différés sont exécutés tout de suite"""
+    muette = True
+
+    def emettre(self, evenement):
+        pass
+
+    def tables_modifiees(self, partie):
+        pass
+
+    def planifier(self, delai, fonction, *args):
+        fonction(*args)
+
+    def armer(self, delai, fonction, *args):
+        return None  # Pas de minuteries : les simulations jouent à la place des joueurs
+
+    def attendre(self, secondes):
+        time.sleep(secondes)
+
+
+class SortieListe(SortieNulle):
+    """Conserve les événements émis, pour les outils et le débogage"""
+    muette = False
+
+    def __init__(self):
+        self.evenements = []
+
+    def emettre(self, evenement):
+        self.evenements.append(evenement)
+
+
+class Carte:
+    """Carte à jouer. Les 52 instances sont créées une seule fois (CARTES) :
+    la partie ne manipule que leurs index 0-51, l'objet sert à l'affichage."""
+    __slots__ = ('valeur', 'couleur', 'index', '_dict')
+    VALEURS = {'2': 2, '3': 3, '4': 4, '5': 5, '6': 6, '7': 7, '8': 8, '9': 9, '10': 10, 'J': 11, 'Q': 12, 'K': 13, 'A': 14}
+    
+    def __init__(self, valeur, couleur):
+        self.valeur = valeur
+        self.couleur = couleur
+        self.index = evaluateur.index_carte(valeur, couleur)
+        self._dict = {'valeur': valeur, 'couleur': couleur}  # Format envoyé au client, construit une fois
+        
+    def to_dict(self):
+        return self._dict
+    
+    def get_valeur_numerique(self):
+        return self.VALEURS[self.valeur]
+    
+    def get_index(self):
+        return self.index
+    
+    @staticmethod
+    def depuis_index(index):
+        return CARTES[index]
+    
+    @staticmethod
+    def vers_dicts(index):
+        """Convertit une liste d'index en cartes au format du client"""
+        return [CARTES[i]._dict for i in index]
+
+
+# Les 52 cartes, rangées par index (rang * 4 + couleur)
+CARTES = tuple(Carte(v, c) for v in evaluateur.VALEURS for c in evaluateur.COULEURS)
+PAQUET = bytes(range(52))
+
+
+def paquet_depuis_graine(graine):
+    """Paquet mélangé d'une main, reproductible à partir de sa graine"""
+    paquet = bytearray(PAQUET)
+    random.Random(graine).shuffle(paquet)
+    return paquet
+
+
+class ReservePaquets:
+    """Paquets déjà mélangés d'une table, tirés de son propre flux aléatoire
+
+    Sans graine, les graines des mains viennent du générateur du système
+    (imprévisible) ; avec une graine, la suite des paquets est reproductible.
+    La réserve est remplie hors du chemin critique, via ``planifier``.
+    """
+    def __init__(self, graine=None, taille=TAILLE_RESERVE):
+        self.flux = random.SystemRandom() if graine is None else random.Random(graine)
+        self.taille = taille
+        self.prets = deque()  # (graine, paquet)
+        self.remplissage_prevu = False
+
+    def suivant(self):
+        graine = self.flux.getrandbits(64)
+        return graine, paquet_depuis_graine(graine)
+
+    def prendre(self):
+        return self.prets.popleft() if self.prets else self.suivant()
+
+    def remplir(self):
+        self.remplissage_prevu = False
+        while len(self.prets) < self.taille:
+            self.prets.append(self.suivant())
+
+
+class Joueur:
+    """Joueur assis à une table : siège, tapis, cartes et mise de la rue en cours"""
+    __slots__ = ('nom', 'siege', 'jetons', 'cartes', 'en_jeu', 'mise_tour', 'pret')
+
+    def __init__(self, nom, siege, jetons, en_jeu):
+        self.nom = nom
+        self.siege = siege
+        self.jetons = jetons
+        self.cartes = []
+        self.en_jeu = en_jeu
+        self.mise_tour = 0  # Misé pendant la rue en cours
+        self.pret = False
+
+
+class GestionTour:
+    def __init__(self, joueurs):
+        self.ordre_joueurs = list(joueurs.values())  # Objets Joueur, dans l'ordre des sièges
+        self.index_actuel = 0
+        self.dernier_miseur = None
+        self.tour_termine = False
+        self.premier_joueur_tour = None  # Pour suivre le premier joueur du tour
+        
+    def joueur_actuel(self):
+        """Retourne le joueur actuel"""
+        if self.index_actuel >= len(self.ordre_joueurs):
+            return None
+        return self.ordre_joueurs[self.index_actuel].nom
+    
+    def placer(self, index):
+        """Place le tour sur le premier joueur pouvant agir à partir de ``index``"""
+        for i in range(len(self.ordre_joueurs)):
+            self.index_actuel = (index + i) % len(self.ordre_joueurs)
+            joueur = self.ordre_joueurs[self.index_actuel]
+            if joueur.en_jeu and joueur.jetons > 0:
+                return joueur.nom
+        self.index_actuel = len(self.ordre_joueurs)  # Tour de personne
+        return None
+    
+    def passer_au_suivant(self):
+        """Passe au joueur suivant qui est encore en jeu"""
+        if not self.ordre_joueurs:
+            return None
+            
+        # Sauvegarder le premier joueur du tour si pas encore défini
+        if self.premier_joueur_tour is None:
+            self.premier_joueur_tour = self.joueur_actuel()
+            
+        self.index_actuel = (self.index_actuel + 1) % len(self.ordre_joueurs)
+        
+        # Chercher le prochain joueur actif (les joueurs à tapis n'ont plus à parler)
+        tentatives = 0
+        while tentatives < len(self.ordre_joueurs):
+            joueur = self.ordre_joueurs[self.index_actuel]
+            if joueur.en_jeu and joueur.jetons > 0:
+                return joueur.nom
+            self.index_actuel = (self.index_actuel + 1) % len(self.ordre_joueurs)
+            tentatives += 1
+            
+        return None
+    
+    def verifier_tour_complet(self, mise_actuelle):
+        """Vérifie si le tour est complet (tous les joueurs ont misé le même montant)"""
+        joueurs_actifs = [j for j in self.ordre_joueurs if j.en_jeu]
+        
+        # S'il ne reste qu'un joueur
+        if len(joueurs_actifs) <= 1:
+            self.tour_termine = True
+            return True
+            
+        # Vérifier si tous les joueurs actifs ont misé le même montant
+        # (un joueur à tapis n'a plus à égaler la mise)
+        joueurs_a_egaler = [j for j in joueurs_actifs if j.jetons > 0]
+        for joueur in joueurs_a_egaler:
+            if joueur.mise_tour != mise_actuelle:
+                return False
+        
+        # Personne ne peut plus relancer
+        if len(joueurs_a_egaler) <= 1:
+            return True
+        
+        # Si tous les joueurs ont misé le même montant, on vérifie si on a fait un tour complet
+        if self.premier_joueur_tour is None:
+            # Premier tour du betting round
+            self.premier_joueur_tour = self.joueur_actuel()
+            return False
+        else:
+            # On vérifie si on est revenu au premier joueur du tour
+            return self.joueur_actuel() == self.premier_joueur_tour
+            
+        return False
+
+
+class Partie:
+    def __init__(self, room_id, sortie=None, service_equite=None, matrice_preflop=None, journal=None,
+                 historique=None, graine=None):
+        self.room_id = room_id
+        self.sortie = sortie or SortieNulle()
+        self.journal = journal  # Journal sur disque des parties (optionnel)
+        self.historique = historique  # Historique des mains jouées (optionnel)
+        self.main_historique = None  # (joueurs, cartes, jetons, actions) de la manche, pour l'historique
+        self.service_equite = service_equite  # Calcul d'équité des tapis (optionnel)
+        self.matrice_preflop = matrice_preflop  # Équité préflop affichée avec la combinaison (optionnelle)
+        self.version = 0  # Numéro du dernier patch d'état envoyé
+        self.etat_envoye = None  # État tel que les clients le connaissent
+        self.sieges = [None] * NB_SIEGES  # Joueur assis à chaque place
+        self.joueurs = {}  # username -> Joueur, dans l'ordre des sièges
+        self.deck = bytearray()
+        self.paquets = ReservePaquets(graine)  # graine : parties reproductibles (tests, simulations)
+        self.graine_main = None  # Graine du paquet de la manche en cours
+        self.pot = 0
+        self.cartes_communes = []
+        self.mise_actuelle = 0
+        self.phase = 'attente'  # attente, preflop, flop, turn, river
+        self.petite_blind = 10
+        self.grande_blind = 20
+        self.dealer_index = 0
+        self.mises_totales = {}  # Total misé par chaque joueur pendant la manche, pour les pots annexes
+        self.numero_main = 0
+        self.gestion_tour = None
+        self.numero_action = 0  # Actions acceptées depuis la création de la table
+        self.cle_tour = None  # (main, phase, joueur, action) du tour de parole chronométré
+        self.minuterie_tour = None
+        self.deconnexions_temporaires = {}
+        self.partie_en_cours = False
+        self.reinitialiser_combinaisons()
+        self.initialiser_deck()
+
+    def initialiser_deck(self):
+        # Paquet déjà mélangé : le mélange suivant se fait en dehors de l'action en cours
+        self.graine_main, self.deck = self.paquets.prendre()
+        if not self.paquets.remplissage_prevu:
+            self.paquets.remplissage_prevu = True
+            self.sortie.planifier(0, self.paquets.remplir)
+
+    def distribuer_cartes(self):
+        self.phase = 'preflop'
+        self.pot = 0
+        self.cartes_communes = []
+        self.reinitialiser_combinaisons()
+        self.mises_totales = {}
+        self.numero_main += 1
+        self.mise_actuelle = self.grande_blind
+        self.remettre_mises()
+        for joueur in self.joueurs.values():
+            joueur.pret = False  # Réinitialiser les joueurs prêts
+        self.partie_en_cours = True  # Marquer la partie comme en cours
+        
+        # Notifier immédiatement tous les clients du changement d'état
+        self.sortie.tables_modifiees(self)
+        
+        # Vérifier et éliminer les joueurs sans jetons
+        joueurs_elimines = []
+        for username, joueur in self.joueurs.items():
+            if joueur.jetons <= 0:
+                joueur.en_jeu = False
+                joueurs_elimines.append(username)
+                self.emettre('notification', {
+                    'message': f'{username} n\'a plus de jetons et ne peut pas participer à cette manche',
+                    'type': 'error'
+                }, self.room_id)
+        
+        # S'il ne reste qu'un joueur avec des jetons, terminer la partie
+        joueurs_avec_jetons = [u for u, j in self.joueurs.items() if j.jetons > 0]
+        if len(joueurs_avec_jetons) <= 1:
+            if joueurs_avec_jetons:
+                self.emettre('notification', {
+                    'message': f'{joueurs_avec_jetons[0]} a gagné la partie !',
+                    'type': 'success'
+                }, self.room_id)
+            self.phase = 'attente'
+            self.partie_en_cours = False
+            return
+        
+        # Distribution des cartes
+        if self.journal:
+            self.journal.noter_donne(self.room_id, self.numero_main, self.dealer_index, self.deck)
+        joueurs_liste = list(self.joueurs.keys())
+        for username in joueurs_liste:
+            if self.joueurs[username].jetons > 0:  # Ne distribuer qu'aux joueurs avec des jetons
+                self.joueurs[username].cartes = [self.deck.pop(), self.deck.pop()]
+                self.joueurs[username].en_jeu = True  # S'assurer que tous les joueurs sont en jeu
+        self.debut_historique()
+        
+        # Mise des blinds
+        petite_blind_index = (self.dealer_index + 1) % len(joueurs_liste)
+        
+        # S'assurer que les joueurs des blinds ont assez de jetons (deux joueurs différents)
+        while self.joueurs[joueurs_liste[petite_blind_index]].jetons <= 0:
+            petite_blind_index = (petite_blind_index + 1) % len(joueurs_liste)
+        grande_blind_index = (petite_blind_index + 1) % len(joueurs_liste)
+        while self.joueurs[joueurs_liste[grande_blind_index]].jetons <= 0:
+            grande_blind_index = (grande_blind_index + 1) % len(joueurs_liste)
+        
+        # Petite blind
+        petite_blind_joueur = joueurs_liste[petite_blind_index]
+        montant_petite_blind = min(self.petite_blind, self.joueurs[petite_blind_joueur].jetons)
+        self.miser(petite_blind_joueur, montant_petite_blind)
+        self.noter_historique(petite_blind_joueur, 'petite_blind', montant_petite_blind)
+        
+        # Grande blind
+        grande_blind_joueur = joueurs_liste[grande_blind_index]
+        montant_grande_blind = min(self.grande_blind, self.joueurs[grande_blind_joueur].jetons)
+        self.miser(grande_blind_joueur, montant_grande_blind)
+        self.noter_historique(grande_blind_joueur, 'grande_blind', montant_grande_blind)
+        self.mise_actuelle = montant_grande_blind
+        
+        # Initialiser la gestion des tours
+        self.gestion_tour = GestionTour(self.joueurs)
+        # Positionner sur le joueur après la grande blind
+        tapis = self.gestion_tour.placer((grande_blind_index + 1) % len(joueurs_liste)) is None
+        self.gestion_tour.dernier_miseur = grande_blind_joueur
+        
+        # Envoi des cartes aux joueurs
+        for username in joueurs_liste:
+            if self.joueurs[username].en_jeu:  # Ne distribuer qu'aux joueurs servis (y compris à tapis après les blinds)
+                self.emettre('recevoir_cartes', {
+                    'cartes': Carte.vers_dicts(self.joueurs[username].cartes)
+                }, username)
+        
+        # Combinaisons (et équité préflop) une fois tous les joueurs servis
+        for username in joueurs_liste:
+            self.evaluer_et_envoyer_combinaison(username)
+        
+        self.update_game_state()
+        if tapis:
+            # Les blinds ont mis tout le monde à tapis
+            self.lancer_calcul_equite()
+            self.sortie.planifier(DELAI_TAPIS, self.derouler_tapis, self.numero_main, self.phase)
+
+    def next_phase(self):
+        joueurs_liste = [u for u, j in self.joueurs.items() if j.en_jeu]
+        if len(joueurs_liste) <= 1:
+            self.fin_manche(joueurs_liste[0] if joueurs_liste else None)
+            return
+
+        if self.phase == 'preflop':
+            self.phase = 'flop'
+            self.cartes_communes.extend((self.deck.pop(), self.deck.pop(), self.deck.pop()))
+            self.emettre('notification', {
+                'message': 'Distribution du Flop',
+                'type': 'phase'
+            }, self.room_id)
+        elif self.phase == 'flop':
+            self.phase = 'turn'
+            self.cartes_communes.append(self.deck.pop())
+            self.emettre('notification', {
+                'message': 'Distribution du Turn',
+                'type': 'phase'
+            }, self.room_id)
+        elif self.phase == 'turn':
+            self.phase = 'river'
+            self.cartes_communes.append(self.deck.pop())
+            self.emettre('notification', {
+                'message': 'Distribution de la River',
+                'type': 'phase'
+            }, self.room_id)
+        elif self.phase == 'river':
+            if all(not j.en_jeu or j.jetons == 0 or j.mise_tour == self.mise_actuelle
+                  for j in self.joueurs.values()):
+                self.evaluer_mains()
+            return
+        
+        # Réinitialiser les mises pour la nouvelle phase
+        self.mise_actuelle = 0
+        self.remettre_mises()
+        
+        # Réinitialiser la gestion des tours pour la nouvelle phase
+        self.gestion_tour = GestionTour(self.joueurs)
+        
+        # Plus personne ne peut miser : dérouler le tableau jusqu'à l'abattage
+        pouvant_miser = [u for u, j in self.joueurs.items() if j.en_jeu and j.jetons > 0]
+        tapis = len(pouvant_miser) <= 1
+        if tapis:
+            self.gestion_tour.index_actuel = len(self.gestion_tour.ordre_joueurs)  # Tour de personne
+        else:
+            # Commencer par le premier joueur à gauche du dealer qui est encore en jeu
+            self.gestion_tour.index_actuel = (self.dealer_index + 1) % len(self.joueurs)
+            joueur_suivant = self.gestion_tour.passer_au_suivant()
+            
+            if not joueur_suivant:
+                self.fin_manche(None)
+                return
+        
+        # Évaluer les nouvelles combinaisons pour tous les joueurs
+        for username in self.joueurs:
+            self.evaluer_et_envoyer_combinaison(username)
+        
+        self.update_game_state()
+        self.lancer_calcul_equite()
+        if tapis:
+            self.sortie.planifier(DELAI_TAPIS, self.derouler_tapis, self.numero_main, self.phase)
+
+    def derouler_tapis(self, numero_main, phase):
+        """Distribue la rue suivante, tant que la manche n'a pas changé entre-temps"""
+        if self.numero_main == numero_main and self.phase == phase:
+            self.next_phase()
+
+    def emettre(self, nom, donnees=None, salle=None):
+        if not self.sortie.muette:
+            self.sortie.emettre(Evenement(nom, donnees, salle))
+
+    def miser(self, username, montant):
+        """Déplace des jetons d'un joueur vers le pot"""
+        joueur = self.joueurs[username]
+        joueur.jetons -= montant
+        joueur.mise_tour += montant
+        self.pot += montant
+        self.mises_totales[username] = self.mises_totales.get(username, 0) + montant
+
+    def get_nom_combinaison(self, valeur):
+        combinaisons = {
+            10: 'Quinte Flush Royale',
+            9: 'Quinte Flush',
+            8: 'Carré',
+            7: 'Full House',
+            6: 'Couleur',
+            5: 'Quinte',
+            4: 'Brelan',
+            3: 'Deux Paires',
+            2: 'Paire',
+            1: 'Carte Haute'
+        }
+        return combinaisons.get(valeur, 'Inconnu')
+
+    def fin_manche(self, gagnant):
+        if gagnant:
+            gain_total = self.pot
+            
+            self.joueurs[gagnant].jetons += gain_total
+            # Gagnant par abandon : ses cartes restent cachées (la salle compte aussi les spectateurs)
+            self.emettre('fin_manche', {'gagnant': gagnant, 'gain': gain_total}, self.room_id)
+        
+        self.dealer_index = (self.dealer_index + 1) % len(self.joueurs)
+        self.noter_fin_manche({gagnant: self.pot} if gagnant else {})
+        self.phase = 'attente'
+        self.pot = 0
+        self.cartes_communes = []
+        self.mise_actuelle = 0
+        self.remettre_mises()
+        self.mises_totales = {}
+        self.partie_en_cours = False  # Marquer la partie comme terminée
+        self.initialiser_deck()
+        
+        # Notifier immédiatement tous les clients du changement d'état
+        self.sortie.tables_modifiees(self)
+        
+        self.emettre('nouvelle_manche', {'delai': DELAI_MANCHE}, self.room_id)
+        self.sortie.armer(DELAI_MANCHE, self.manche_suivante, self.numero_main)
+        self.update_game_state()
+
+    def evaluer_mains(self):
+        en_jeu = [u for u, j in self.joueurs.items() if j.en_jeu]
+        if en_jeu:
+            # Toutes les mains en un seul passage
+            tableau = self.cartes_communes
+            mains_index = [self.joueurs[u].cartes for u in en_jeu]
+            rangs = dict(zip(en_jeu, abattage.evaluer_mains(mains_index, tableau)))
+            
+            # Pot principal et pots annexes d'après ce que chacun a misé
+            pots = abattage.construire_pots(self.mises_totales, set(en_jeu))
+            ecart = self.pot - sum(montant for montant, _ in pots)
+            if ecart and pots:
+                pots[0] = (pots[0][0] + ecart, pots[0][1])
+            elif ecart:
+                pots = [(ecart, en_jeu)]
+            
+            # Ordre de distribution des jetons indivisibles : à gauche du dealer
+            ordre = list(self.joueurs)
+            depart = (self.dealer_index + 1) % len(ordre)
+            ordre = ordre[depart:] + ordre[:depart]
+            gains, details = abattage.repartir(pots, rangs, ordre)
+            
+            for username, gain in gains.items():
+                self.joueurs[username].jetons += gain
+            gagnant = max(gains, key=gains.get)
+            
+            # Préparer les données pour l'émission (inutile si personne n'écoute)
+            if not self.sortie.muette:
+                resultats_mains = {}
+                for username, main in zip(en_jeu, mains_index):
+                    cartes = main + tableau
+                    resultats_mains[username] = {
+                        'valeur': evaluateur.categorie(rangs[username]),
+                        'combinaison': self.get_nom_combinaison(evaluateur.categorie(rangs[username])),
+                        'cartes': Carte.vers_dicts(main),
+                        'cartes_gagnantes': Carte.vers_dicts(evaluateur.meilleures_cartes(cartes, rangs[username])),
+                        'gain': gains.get(username, 0)
+                    }
+            
+                self.emettre('fin_manche', {
+                    'gagnant': gagnant,
+                    'gain': gains[gagnant],
+                    'gains': gains,
+                    'pots': [{'montant': montant, 'gagnants': gagnants} for montant, gagnants in details],
+                    'mains': resultats_mains
+                }, self.room_id)
+            
+            # Préparation de la prochaine manche
+            self.dealer_index = (self.dealer_index + 1) % len(self.joueurs)
+            self.noter_fin_manche(gains)
+            self.phase = 'attente'
+            self.pot = 0
+            self.cartes_communes = []
+            self.mise_actuelle = 0
+            self.remettre_mises()
+            self.mises_totales = {}
+            self.initialiser_deck()
+            
+            # Démarrer automatiquement la prochaine manche après un court délai
+            self.emettre('nouvelle_manche', {'delai': DELAI_MANCHE}, self.room_id)
+            self.sortie.armer(DELAI_MANCHE, self.manche_suivante, self.numero_main)
+            
+            self.update_game_state()
+
+    def manche_suivante(self, numero_main):
+        """Fin du délai entre deux manches : donne suivante s'il reste au moins deux joueurs"""
+        if self.numero_main != numero_main or self.phase != 'attente' or len(self.joueurs) < 2:
+            return  # Manche déjà lancée, ou table quittée entre-temps
+        self.partie_en_cours = True
+        self.emettre('partie_demarree', {'partie_en_cours': True, 'room': self.room_id}, self.room_id)
+        self.distribuer_cartes()
+
+    def chrono_tour(self):
+        """Arme la minuterie du joueur qui a la parole, une fois par tour de parole"""
+        joueur = self.gestion_tour.joueur_actuel() if self.gestion_tour and self.phase != 'attente' else None
+        cle = (self.numero_main, self.phase, joueur, self.numero_action) if joueur else None
+        if cle == self.cle_tour:
+            return
+        if self.minuterie_tour:
+            self.minuterie_tour.annuler()
+        self.cle_tour = cle
+        self.minuterie_tour = self.sortie.armer(DELAI_ACTION, self.expirer_tour, cle) if cle else None
+
+    def expirer_tour(self, cle):
+        """Temps de parole écoulé : le joueur checke s'il le peut, sinon il se couche"""
+        if cle != self.cle_tour:
+            return  # Le joueur a joué entre-temps
+        self.cle_tour = self.minuterie_tour = None
+        username = cle[2]
+        joueur = self.joueurs.get(username)
+        if joueur is None:
+            return
+        self.emettre('notification', {
+            'message': f'{username} n\'a pas joué à temps',
+            'type': 'error'
+        }, self.room_id)
+        self.jouer(username, 'check' if joueur.mise_tour >= self.mise_actuelle else 'coucher')
+
+    def debut_historique(self):
+        """Sièges, cartes et tapis au moment de la donne"""
+        if self.historique:
+            joueurs = list(self.joueurs)
+            self.main_historique = (
+                joueurs,
+                [list(self.joueurs[u].cartes) if self.joueurs[u].en_jeu else None for u in joueurs],
+                [self.joueurs[u].jetons for u in joueurs],
+                []
+            )
+
+    def noter_historique(self, username, action, montant):
+        if self.main_historique:
+            joueurs, _, _, actions = self.main_historique
+            actions.append((joueurs.index(username), action, montant, self.phase))
+
+    def noter_action(self, username, action, montant):
+        """Action acceptée, ``montant`` étant ce que le joueur a effectivement misé"""
+        self.numero_action += 1
+        if self.journal:
+            self.journal.noter_action(self.room_id, self.numero_main, username, action, montant)
+        self.noter_historique(username, action, montant)
+
+    def noter_fin_manche(self, gains):
+        """Jetons de chacun à la fin de la manche (reprise après un arrêt) et main pour l'historique"""
+        if self.journal:
+            self.journal.noter_paiement(self.room_id, self.numero_main, self.dealer_index,
+                                        {u: j.jetons for u, j in self.joueurs.items()})
+        if self.main_historique:
+            joueurs, cartes, jetons, actions = self.main_historique
+            self.historique.ajouter(Main(self.room_id, self.numero_main, self.graine_main, joueurs, cartes, jetons,
+                                         list(self.cartes_communes), actions, self.pot,
+                                         [gains.get(u, 0) for u in joueurs]))
+            self.main_historique = None
+
+    def evaluer_main(self, cartes):
+        if not cartes:  # Si la liste des cartes est vide
+            return 0, []  # Retourner une valeur par défaut
+        
+        index = [c.index for c in cartes]
+        rang = evaluateur.evaluer(index)
+        # Les objets Carte de la combinaison sont les instances de CARTES
+        return evaluateur.categorie(rang), [CARTES[i] for i in evaluateur.meilleures_cartes(index, rang)]
+
+    def update_game_state(self):
+        """Envoie à la table ce qui a changé depuis le dernier envoi
+        
+        Le patch porte un numéro de version par table ; s'il est vide (appel
+        en double dans un même traitement), rien n'est émis. Le chrono du
+        joueur qui a la parole est réarmé si le tour a changé.
+        """
+        self.chrono_tour()
+        if self.sortie.muette:
+            return
+        
+        etat = self.etat_table()
+        patch = differences(self.etat_envoye, etat)
+        if not patch:
+            return
+        self.version += 1
+        self.etat_envoye = etat
+        self.emettre('patch_etat', {'v': self.version, 'etat': patch}, self.room_id)
+
+    def etat_complet(self):
+        """Instantané de la table pour un joueur qui arrive ou se resynchronise"""
+        self.update_game_state()
+        etat = dict(self.etat_envoye or self.etat_table())
+        etat['v'] = self.version
+        return etat
+
+    def etat_table(self):
+        # Déterminer les positions des blinds
+        joueurs_liste = list(self.joueurs.keys())
+        if len(joueurs_liste) >= 2:
+            dealer_index = self.dealer_index % len(joueurs_liste)
+            big_blind_index = (self.dealer_index + 2) % len(joueurs_liste)
+            dealer = joueurs_liste[dealer_index]
+            big_blind = joueurs_liste[big_blind_index]
+        else:
+            dealer = None
+            big_blind = None
+
+        return {
+            'pot': self.pot,
+            'tour_actuel': self.gestion_tour.joueur_actuel() if self.gestion_tour else None,
+            'mise_actuelle': self.mise_actuelle,
+            'phase': self.phase,
+            'cartes_communes': Carte.vers_dicts(self.cartes_communes),
+            'partie_en_cours': self.partie_en_cours,
+            'joueurs': {
+                u: {
+                    'jetons': j.jetons,
+                    'en_jeu': j.en_jeu,
+                    'mise_tour': j.mise_tour,
+                    'is_dealer': u == dealer,
+                    'is_big_blind': u == big_blind
+                } for u, j in self.joueurs.items()
+            }
+        }
+
+    def reinitialiser_combinaisons(self):
+        """Vide le cache des combinaisons au début d'une nouvelle manche"""
+        self.cles_mains = {}  # username -> (nb cartes communes prises en compte, clé, index des cartes)
+        self.combinaisons = {}  # (username, nb cartes communes, adversaires) -> données de combinaison_actuelle
+        self.combinaisons_envoyees = {}  # username -> dernières données émises
+
+    def calculer_combinaison(self, username, adversaires=0):
+        """Met à jour la clé de la main du joueur avec les nouvelles cartes communes
+
+        ``adversaires`` : adversaires encore en jeu, pour l'équité avant le flop.
+        """
+        nb_communes, cle, index = self.cles_mains.get(username, (0, None, None))
+        if cle is None:
+            index = self.joueurs[username].cartes
+            cle = evaluateur.cle_main(index)
+        nouvelles = self.cartes_communes[nb_communes:]
+        cle = evaluateur.cle_main(nouvelles, cle)
+        index = index + nouvelles
+        self.cles_mains[username] = (len(self.cartes_communes), cle, index)
+        
+        if not index:  # S'il n'y a pas de cartes à évaluer
+            return {
+                'combinaison': 'En attente',
+                'cartes_gagnantes': []
+            }
+        
+        rang = evaluateur.rang_depuis_cle(cle, index)
+        donnees = {
+            'combinaison': self.get_nom_combinaison(evaluateur.categorie(rang)),
+            'cartes_gagnantes': Carte.vers_dicts(evaluateur.meilleures_cartes(index, rang, cle))
+        }
+        
+        # Avant le flop, indiquer l'équité contre les adversaires encore en jeu
+        if adversaires and self.matrice_preflop and len(index) == 2:
+            donnees['equite'] = self.matrice_preflop.contre_aleatoires(index, adversaires)
+        return donnees
+
+    def evaluer_et_envoyer_combinaison(self, username, demandee=False):
+        """Envoie sa combinaison au joueur ; ``demandee`` : le client l'a redemandée (rechargement, reconnexion)"""
+        if self.sortie.muette:
+            return
+        
+        # Vérifier si le joueur existe encore dans la partie
+        if username not in self.joueurs:
+            self.emettre('combinaison_actuelle', {
+                'combinaison': 'Non disponible',
+                'cartes_gagnantes': []
+            }, username)
+            return
+        
+        joueur = self.joueurs[username]
+        if not joueur.en_jeu:
+            return
+        
+        # Une seule évaluation par joueur et par rue ; avant le flop, l'équité
+        # dépend aussi du nombre d'adversaires encore en jeu
+        adversaires = 0
+        if not self.cartes_communes:
+            adversaires = sum(1 for u, j in self.joueurs.items() if u != username and j.en_jeu)
+        cle_cache = (username, len(self.cartes_communes), adversaires)
+        donnees = self.combinaisons.get(cle_cache)
+        if donnees is None:
+            donnees = self.combinaisons[cle_cache] = self.calculer_combinaison(username, adversaires)
+        
+        # Ne rien renvoyer si le joueur a déjà reçu cette combinaison, sauf s'il la redemande
+        if self.combinaisons_envoyees.get(username) is donnees and not demandee:
+            return
+        self.combinaisons_envoyees[username] = donnees
+        self.emettre('combinaison_actuelle', donnees, username)
+
+    def situation_tapis(self):
+        """Vérifie si les enchères sont closes avec au moins un joueur à tapis"""
+        joueurs_actifs = [u for u, j in self.joueurs.items() if j.en_jeu]
+        if len(joueurs_actifs) < 2:
+            return False
+        a_tapis = [u for u in joueurs_actifs if self.joueurs[u].jetons == 0]
+        if not a_tapis or len(joueurs_actifs) - len(a_tapis) > 1:
+            return False
+        return all(self.joueurs[u].jetons == 0 or self.joueurs[u].mise_tour == self.mise_actuelle
+                   for u in joueurs_actifs)
+
+    def lancer_calcul_equite(self):
+        """Calcule l'équité des joueurs à tapis sans bloquer la boucle d'événements"""
+        if self.service_equite is None or self.sortie.muette:
+            return
+        if self.phase not in ('preflop', 'flop', 'turn') or not self.situation_tapis():
+            return
+        mains = {u: j.cartes for u, j in self.joueurs.items() if j.en_jeu}
+        tableau = list(self.cartes_communes)
+        self.sortie.planifier(0, self.envoyer_equite, mains, tableau, self.phase)
+
+    def envoyer_equite(self, mains, tableau, phase):
+        resultats = self.service_equite.calculer(list(mains.values()), tableau, attendre=self.sortie.attendre)
+        # Ignorer un résultat arrivé après la fin de la rue ou de la manche
+        if self.phase != phase or len(self.cartes_communes) != len(tableau):
+            return
+        self.emettre('equite', {
+            'phase': phase,
+            'joueurs': dict(zip(mains, resultats))
+        }, self.room_id)
+
+    def gerer_deconnexion_temporaire(self, username):
+        # Supprimer immédiatement le joueur
+        if username in self.joueurs:
+            # Si c'était le tour du joueur déconnecté
+            if self.gestion_tour and self.gestion_tour.joueur_actuel() == username:
+                # Coucher automatiquement le joueur
+                self.joueurs[username].en_jeu = False
+                self.emettre('notification', {
+                    'message': f'{username} a été déconnecté et ses cartes ont été couchées',
+                    'type': 'error'
+                }, self.room_id)
+                
+                # Vérifier s'il ne reste qu'un joueur
+                joueurs_actifs = [j for j in self.joueurs if self.joueurs[j].en_jeu]
+                if len(joueurs_actifs) == 1:
+                    self.fin_manche(joueurs_actifs[0])
+                else:
+                    # Passer au joueur suivant
+                    self.gestion_tour.passer_au_suivant()
+                    self.update_game_state()
+            
+            # Supprimer le joueur et continuer la partie
+            self.retirer_joueur(username)
+            self.emettre('notification', {
+                'message': f'{username} a quitté la table',
+                'type': 'error'
+            }, self.room_id)
+
+    def retirer_joueur(self, username):
+        if username in self.joueurs:
+            # Libérer le siège (les mises du joueur restent dans le pot et
+            # dans mises_totales, sans droit au pot)
+            self.sieges[self.joueurs[username].siege] = None
+            self.placer_joueurs()
+            if self.journal:
+                self.journal.noter_depart(self.room_id, username)
+            if username in self.deconnexions_temporaires:
+                del self.deconnexions_temporaires[username]
+            
+            # Mettre à jour la gestion du tour si nécessaire
+            if self.gestion_tour:
+                self.gestion_tour.ordre_joueurs = list(self.joueurs.values())
+                if len(self.joueurs) < 2:
+                    if len(self.joueurs) == 1:
+                        dernier_joueur = next(iter(self.joueurs.keys()))
+                        # Réinitialiser l'index avant de finir la manche
+                        self.gestion_tour.index_actuel = 0
+                        self.fin_manche(dernier_joueur)
+                    else:
+                        self.phase = 'attente'
+                else:
+                    # Si c'était le tour du joueur déconnecté
+                    if self.gestion_tour.joueur_actuel() == username:
+                        # Réinitialiser l'index si nécessaire
+                        if self.gestion_tour.index_actuel >= len(self.joueurs):
+                            self.gestion_tour.index_actuel = 0
+                        self.gestion_tour.passer_au_suivant()
+                    self.update_game_state()
+
+    @property
+    def joueurs_prets(self):
+        """Noms des joueurs prêts, dans l'ordre des sièges"""
+        return [u for u, j in self.joueurs.items() if j.pret]
+
+    def verifier_tous_prets(self):
+        """Vérifie si tous les joueurs sont prêts"""
+        if self.partie_en_cours:
+            return False
+        if len(self.joueurs) < 2:  # Il faut au moins 2 joueurs
+            return False
+        return all(j.pret for j in self.joueurs.values())  # Tous les joueurs doivent être prêts
+
+    def demarrer_partie(self):
+        """Démarre une nouvelle partie"""
+        if not self.verifier_tous_prets():
+            return False
+            
+        self.partie_en_cours = True
+        self.phase = 'preflop'
+        self.pot = 0
+        self.cartes_communes = []
+        self.reinitialiser_combinaisons()
+        self.mises_totales = {}
+        self.numero_main += 1
+        self.mise_actuelle = self.grande_blind
+        self.remettre_mises()
+        self.initialiser_deck()
+        
+        # Distribution des cartes
+        if self.journal:
+            self.journal.noter_donne(self.room_id, self.numero_main, self.dealer_index, self.deck)
+        for username in self.joueurs:
+            self.joueurs[username].cartes = [self.deck.pop(), self.deck.pop()]
+            self.joueurs[username].en_jeu = True
+            
+            # Envoyer les cartes à chaque joueur
+            self.emettre('recevoir_cartes', {
+                'cartes': Carte.vers_dicts(self.joueurs[username].cartes)
+            }, username)
+        self.debut_historique()
+        
+        # Mise des blinds
+        joueurs_liste = list(self.joueurs.keys())
+        petite_blind_index = (self.dealer_index + 1) % len(joueurs_liste)
+        grande_blind_index = (self.dealer_index + 2) % len(joueurs_liste)
+        
+        # Petite blind
+        petite_blind_joueur = joueurs_liste[petite_blind_index]
+        montant_petite_blind = min(self.petite_blind, self.joueurs[petite_blind_joueur].jetons)
+        self.miser(petite_blind_joueur, montant_petite_blind)
+        self.noter_historique(petite_blind_joueur, 'petite_blind', montant_petite_blind)
+        
+        # Grande blind
+        grande_blind_joueur = joueurs_liste[grande_blind_index]
+        montant_grande_blind = min(self.grande_blind, self.joueurs[grande_blind_joueur].jetons)
+        self.miser(grande_blind_joueur, montant_grande_blind)
+        self.noter_historique(grande_blind_joueur, 'grande_blind', montant_grande_blind)
+        self.mise_actuelle = montant_grande_blind
+        
+        # Initialiser la gestion des tours
+        self.gestion_tour = GestionTour(self.joueurs)
+        self.gestion_tour.placer((grande_blind_index + 1) % len(joueurs_liste))
+        
+        # Notifications
+        self.emettre('notification', {
+            'message': 'La partie commence !',
+            'type': 'success'
+        }, self.room_id)
+        
+        # Mise à jour de l'état du jeu
+        self.update_game_state()
+        return True
+
+    def placer_joueurs(self):
+        """Reconstruit ``joueurs`` dans l'ordre des sièges"""
+        self.joueurs = {j.nom: j for j in self.sieges if j is not None}
+
+    def remettre_mises(self):
+        for joueur in self.joueurs.values():
+            joueur.mise_tour = 0
+
+    def ajouter_joueur(self, username, jetons=1000):
+        """Assoit le joueur à la première place libre (ou à la sienne s'il y est déjà)"""
+        en_jeu = not self.partie_en_cours  # Le joueur n'est pas en jeu si une partie est en cours
+        joueur = self.joueurs.get(username)
+        if joueur is None:
+            if None not in self.sieges:
+                raise ValueError('La table est pleine')
+            siege = self.sieges.index(None)
+            self.sieges[siege] = Joueur(username, siege, jetons, en_jeu)
+            self.placer_joueurs()
+        else:
+            joueur.jetons, joueur.cartes, joueur.en_jeu = jetons, [], en_jeu
+        if self.journal:
+            self.journal.noter_joueur(self.room_id, username, jetons)
+
+    def jouer(self, username, action, montant=0):
+        """Applique l'action d'un joueur (check, mise, allin, suivre, coucher)"""
+        if self.gestion_tour is None or self.phase == 'attente':
+            self.emettre('erreur', {'message': 'Aucune manche en cours'}, username)
+            return
+        if (username not in self.joueurs or username != self.gestion_tour.joueur_actuel()
+                or not self.joueurs[username].en_jeu):
+            self.emettre('erreur', {'message': 'Ce n\'est pas votre tour'}, username)
+            return
+        
+        # Action et montant viennent du client : rien n'est modifié ni journalisé avant ces contrôles
+        if action not in ACTIONS:
+            self.emettre('erreur', {'message': f'Action inconnue : {action}'}, username)
+            return
+        if action == 'mise' and (not isinstance(montant, int) or isinstance(montant, bool)):
+            self.emettre('erreur', {'message': 'Le montant de la mise doit être un nombre entier'}, username)
+            return
+    
+        # Un joueur à tapis reste dans la manche mais n'a plus d'action à faire
+        if self.joueurs[username].jetons <= 0:
+            self.gestion_tour.passer_au_suivant()
+            self.update_game_state()
+            return
+    
+        mise_necessaire = self.mise_actuelle - self.joueurs[username].mise_tour
+        jetons_avant = self.joueurs[username].jetons
+    
+        if action == 'check':
+            if mise_necessaire > 0:
+                self.emettre('erreur', {'message': 'Vous ne pouvez pas checker, vous devez suivre ou vous coucher'}, username)
+                return
+            # Notification de check
+            self.emettre('notification', {
+                'message': f'{username} checke',
+                'type': 'action'
+            }, self.room_id)
+        elif action == 'mise':
+            if montant < mise_necessaire:
+                self.emettre('erreur', {'message': f'Mise insuffisante. Minimum requis: {mise_necessaire}€'}, username)
+                return
+            # Vérifier le montant maximum possible (total des jetons des autres joueurs)
+            joueurs_actifs = [j for j in self.joueurs if self.joueurs[j].en_jeu and j != username]
+            max_jetons_autres = sum(self.joueurs[j].jetons for j in joueurs_actifs)
+            montant_max = min(self.joueurs[username].jetons, max_jetons_autres)
+            if montant > montant_max:
+                self.emettre('erreur', {'message': f'Mise impossible. Maximum possible: {montant_max}€'}, username)
+                return
+            if montant > self.joueurs[username].jetons:
+                self.emettre('erreur', {'message': f'Vous n\'avez pas assez de jetons. Vous avez {self.joueurs[username].jetons}€'}, username)
+                return
+            self.miser(username, montant)
+            self.mise_actuelle = self.joueurs[username].mise_tour
+            self.gestion_tour.dernier_miseur = username
+            # Notification de mise
+            self.emettre('notification', {
+                'message': f'{username} a misé {montant}€',
+                'type': 'action'
+            }, self.room_id)
+        elif action == 'allin':
+            montant = self.joueurs[username].jetons
+            self.miser(username, montant)
+            self.mise_actuelle = max(self.mise_actuelle, self.joueurs[username].mise_tour)
+            self.gestion_tour.dernier_miseur = username
+            # Notification de all-in
+            self.emettre('notification', {
+                'message': f'{username} est All-in avec {montant}€ !',
+                'type': 'action'
+            }, self.room_id)
+        elif action == 'suivre':
+            if mise_necessaire > self.joueurs[username].jetons:
+                self.emettre('erreur', {'message': 'Vous n\'avez pas assez de jetons'}, username)
+                return
+            self.miser(username, mise_necessaire)
+            # Notification de suivi
+            self.emettre('notification', {
+                'message': f'{username} a suivi ({mise_necessaire}€)',
+                'type': 'action'
+            }, self.room_id)
+        elif action == 'coucher':
+            self.joueurs[username].en_jeu = False
+            # Notification d'abandon
+            self.emettre('notification', {
+                'message': f'{username} s\'est couché',
+                'type': 'action'
+            }, self.room_id)
+            # Si tous les autres joueurs se sont couchés sauf un
+            joueurs_actifs = [j for j in self.joueurs if self.joueurs[j].en_jeu]
+            if len(joueurs_actifs) == 1:
+                self.noter_action(username, action, 0)
+                self.fin_manche(joueurs_actifs[0])
+                return
+            if self.phase == 'preflop':
+                # L'équité préflop des autres joueurs compte un adversaire de moins
+                for joueur in joueurs_actifs:
+                    self.evaluer_et_envoyer_combinaison(joueur)
+    
+        self.noter_action(username, action, jetons_avant - self.joueurs[username].jetons)
+        
+        # Vérifier si le tour est terminé
+        if self.gestion_tour.verifier_tour_complet(self.mise_actuelle):
+            if self.phase == 'river':
+                if all(not j.en_jeu or j.jetons == 0 or j.mise_tour == self.mise_actuelle
+                      for j in self.joueurs.values()):
+                    self.evaluer_mains()
+                return
+            if self.phase == 'preflop' and self.situation_tapis():
+                # Tapis préflop : l'équité (matrice précalculée en tête-à-tête) est
+                # affichée avant le flop, puis le tableau se déroule
+                self.gestion_tour.index_actuel = len(self.gestion_tour.ordre_joueurs)  # Tour de personne
+                self.update_game_state()
+                self.lancer_calcul_equite()
+                self.sortie.planifier(DELAI_TAPIS, self.derouler_tapis, self.numero_main, self.phase)
+                return
+            self.next_phase()
+        else:
+            # Passer au joueur suivant
+            self.gestion_tour.passer_au_suivant()
+            self.update_game_state()
@@ -0,0 +1,238 @@
+"""Matrice d'équité préflop précalculée et partagée par mmap.
+
+Les 1326 mains de départ se ramènent à 169 mains canoniques : 13 paires,
+78 assorties et 78 dépareillées, rangées dans une grille 13x13 : paires sur la
+diagonale, assorties quand la ligne est plus haute que la colonne,
+dépareillées dans l'autre triangle.
+
+Le fichier produit par ``python preflop.py`` contient :
+
+- un en-tête ``<4sHHH`` : signature, version, nombre de mains canoniques,
+  nombre maximum d'adversaires ;
+- la matrice 169x169 des équités tête-à-tête (main de la ligne contre main
+  de la colonne) ;
+- la matrice 169x169, symétrique, des probabilités d'égalité de ces
+  confrontations (la probabilité de victoire s'en déduit) ;
+- la table 169xN des équités contre 1 à N adversaires aux mains aléatoires.
+
+Les probabilités sont stockées en uint16 (probabilité * 65535). Le serveur ouvre le
+fichier avec ``mmap`` : les pages sont partagées entre tous les processus
+gunicorn et une consultation se résume à une lecture dans le tableau.
+"""
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+
+import evaluateur
+
+CHEMIN = os.environ.get('POKER_PREFLOP', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'donnees', 'preflop.bin'))
+SIGNATURE = b'PKPF'
+VERSION = 2  # 2 : matrice des égalités tête-à-tête
+NB_MAINS = 169
+MAX_ADVERSAIRES = 6  # 7 joueurs au plus par table
+_ENTETE = struct.Struct('<4sHHH')
+_ECHELLE = 65535
+
+
+def index_main(c1, c2):
+    """Index canonique (0-168) d'une main de départ"""
+    r1, r2 = c1 >> 2, c2 >> 2
+    haut, bas = max(r1, r2), min(r1, r2)
+    if (c1 & 3) == (c2 & 3):
+        return haut * 13 + bas  # assortie : ligne plus haute que la colonne
+    return bas * 13 + haut  # paire (diagonale) ou dépareillée
+
+
+def nom_main(index):
+    """Nom usuel d'une main canonique ('AA', 'AKs', 'T9o'...)"""
+    noms = ' 23456789TJQKA'
+    ligne, colonne = divmod(index, 13)
+    if ligne == colonne:
+        return noms[ligne + 1] * 2
+    if ligne > colonne:
+        return noms[ligne + 1] + noms[colonne + 1] + 's'
+    return noms[colonne + 1] + noms[ligne + 1] + 'o'
+
+
+def _combinaisons():
+    """Toutes les mains concrètes de chaque main canonique, en tableau (169, 12, 2)"""
+    combos = [[] for _ in range(NB_MAINS)]
+    for c1 in range(52):
+        for c2 in range(c1 + 1, 52):
+            combos[index_main(c1, c2)].append((c1, c2))
+    tableau = np.zeros((NB_MAINS, 12, 2), dtype=np.uint8)
+    nombres = np.zeros(NB_MAINS, dtype=np.int64)
+    for i, liste in enumerate(combos):
+        tableau[i, :len(liste)] = liste
+        nombres[i] = len(liste)
+    return tableau, nombres
+
+
+def _tirer_mains(rng, combos, nombres, classes):
+    choix = (rng.random(len(classes)) * nombres[classes]).astype(np.int64)
+    return combos[classes, choix]
+
+
+def _tirer_cartes(rng, exclues, nombre, ordonner=True):
+    """Tire ``nombre`` cartes distinctes par ligne, hors cartes exclues
+
+    Sans ``ordonner``, seul l'ensemble tiré est aléatoire, ce qui suffit pour
+    un tableau ; il faut un ordre aléatoire pour distribuer des mains.
+    """
+    cles = rng.random((len(exclues), 52), dtype=np.float32)
+    np.put_along_axis(cles, exclues.astype(np.int64), 2.0, axis=1)
+    choisies = cles.argpartition(nombre, axis=1)[:, :nombre]
+    if not ordonner:
+        return choisies.astype(np.uint8)
+    ordre = np.take_along_axis(cles, choisies, axis=1).argsort(axis=1)
+    return np.take_along_axis(choisies, ordre, axis=1).astype(np.uint8)
+
+
+def _parts(rangs):
+    """Part de pot de la première main (ligne 0) pour chaque tirage"""
+    meilleurs = rangs.max(axis=0)
+    gagnants = rangs == meilleurs
+    return np.where(gagnants[0], 1.0 / gagnants.sum(axis=0), 0.0)
+
+
+def _evaluer(mains, tableaux):
+    cartes = np.concatenate([mains, tableaux], axis=1)
+    return evaluateur.evaluate_batch(cartes)
+
+
+def construire_tete_a_tete(echantillons, rng, lot=200000):
+    combos, nombres = _combinaisons()
+    i, j = np.triu_indices(NB_MAINS)
+    paires_i = np.repeat(i, echantillons)
+    paires_j = np.repeat(j, echantillons)
+    parts = np.empty(len(paires_i))
+    egalites = np.empty(len(paires_i), dtype=bool)
+    for debut in range(0, len(paires_i), lot):
+        ci, cj = paires_i[debut:debut + lot], paires_j[debut:debut + lot]
+        main_a = _tirer_mains(rng, combos, nombres, ci)
+        main_b = _tirer_mains(rng, combos, nombres, cj)
+        # Retirer les mains qui partagent une carte
+        conflits = np.flatnonzero((main_a[:, :, None] == main_b[:, None, :]).any(axis=(1, 2)))
+        while conflits.size:
+            main_b[conflits] = _tirer_mains(rng, combos, nombres, cj[conflits])
+            encore = (main_a[conflits, :, None] == main_b[conflits, None, :]).any(axis=(1, 2))
+            conflits = conflits[encore]
+        tableaux = _tirer_cartes(rng, np.concatenate([main_a, main_b], axis=1), 5, ordonner=False)
+        rangs = np.stack([_evaluer(main_a, tableaux), _evaluer(main_b, tableaux)])
+        parts[debut:debut + lot] = _parts(rangs)
+        egalites[debut:debut + lot] = rangs[0] == rangs[1]
+    moyennes = parts.reshape(-1, echantillons).mean(axis=1)
+    matrice = np.empty((NB_MAINS, NB_MAINS))
+    matrice[i, j] = moyennes
+    matrice[j, i] = 1.0 - moyennes
+    np.fill_diagonal(matrice, 0.5)
+    taux_egalite = egalites.reshape(-1, echantillons).mean(axis=1)
+    matrice_egalites = np.empty((NB_MAINS, NB_MAINS))
+    matrice_egalites[i, j] = taux_egalite
+    matrice_egalites[j, i] = taux_egalite
+    return matrice, matrice_egalites
+
+
+def construire_multi(echantillons, rng, lot=100000):
+    combos, nombres = _combinaisons()
+    table = np.empty((NB_MAINS, MAX_ADVERSAIRES))
+    classes = np.repeat(np.arange(NB_MAINS), echantillons)
+    for k in range(1, MAX_ADVERSAIRES + 1):
+        parts = np.empty(len(classes))
+        for debut in range(0, len(classes), lot):
+            c = classes[debut:debut + lot]
+            heros = _tirer_mains(rng, combos, nombres, c)
+            cartes = _tirer_cartes(rng, heros, 2 * k + 5)
+            tableaux = cartes[:, 2 * k:]
+            rangs = [_evaluer(heros, tableaux)]
+            rangs += [_evaluer(cartes[:, 2 * a:2 * a + 2], tableaux) for a in range(k)]
+            parts[debut:debut + lot] = _parts(np.stack(rangs))
+        table[:, k - 1] = parts.reshape(NB_MAINS, echantillons).mean(axis=1)
+    return table
+
+
+def ecrire(chemin, matrice, egalites, multi):
+    os.makedirs(os.path.dirname(chemin) or '.', exist_ok=True)
+    temporaire = chemin + '.tmp'
+    with open(temporaire, 'wb') as f:
+        f.write(_ENTETE.pack(SIGNATURE, VERSION, NB_MAINS, MAX_ADVERSAIRES))
+        f.write(np.round(matrice * _ECHELLE).astype('<u2').tobytes())
+        f.write(np.round(egalites * _ECHELLE).astype('<u2').tobytes())
+        f.write(np.round(multi * _ECHELLE).astype('<u2').tobytes())
+    os.replace(temporaire, chemin)
+
+
+class MatricePreflop:
+    """Accès en O(1) aux équités préflop d'un fichier projeté en mémoire"""
+
+    def __init__(self, tampon):
+        signature, version, nb_mains, max_adversaires = _ENTETE.unpack_from(tampon)
+        if signature != SIGNATURE or version != VERSION or nb_mains != NB_MAINS:
+            raise ValueError('Fichier d\'équité préflop invalide')
+        self.max_adversaires = max_adversaires
+        # Vues sans copie sur les pages projetées
+        taille_matrice = NB_MAINS * NB_MAINS * 2
+        self.tete_a_tete = np.frombuffer(tampon, dtype='<u2', count=NB_MAINS * NB_MAINS,
+                                         offset=_ENTETE.size).reshape(NB_MAINS, NB_MAINS)
+        self.egalites = np.frombuffer(tampon, dtype='<u2', count=NB_MAINS * NB_MAINS,
+                                      offset=_ENTETE.size + taille_matrice).reshape(NB_MAINS, NB_MAINS)
+        self.multi = np.frombuffer(tampon, dtype='<u2', count=NB_MAINS * max_adversaires,
+                                   offset=_ENTETE.size + 2 * taille_matrice).reshape(NB_MAINS, max_adversaires)
+
+    @classmethod
+    def ouvrir(cls, chemin=CHEMIN):
+        """Projette le fichier en mémoire ; retourne None s'il n'a pas été construit"""
+        if not os.path.exists(chemin):
+            return None
+        with open(chemin, 'rb') as f:
+            tampon = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        signature, version, _, _ = _ENTETE.unpack_from(tampon)
+        if signature == SIGNATURE and version < VERSION:
+            print(f'Fichier d\'équité préflop {chemin} en version {version} : relancer `python preflop.py`',
+                  file=sys.stderr)
+            return None
+        return cls(tampon)
+
+    def contre(self, main, adverse):
+        """Équité d'une main contre une autre (paires d'index 0-51)"""
+        return int(self.tete_a_tete[index_main(*main), index_main(*adverse)]) / _ECHELLE
+
+    def egalite(self, main, adverse):
+        """Probabilité que deux mains (paires d'index 0-51) partagent le pot"""
+        return int(self.egalites[index_main(*main), index_main(*adverse)]) / _ECHELLE
+
+    def contre_aleatoires(self, main, adversaires):
+        """Équité d'une main contre ``adversaires`` mains aléatoires"""
+        adversaires = min(max(adversaires, 1), self.max_adversaires)
+        return int(self.multi[index_main(*main), adversaires - 1]) / _ECHELLE
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Construit le fichier d\'équité préflop')
+    parser.add_argument('--sortie', default=CHEMIN)
+    parser.add_argument('--echantillons', type=int, default=2000,
+                        help='tirages par confrontation tête-à-tête')
+    parser.add_argument('--echantillons-multi', type=int, default=20000,
+                        help='tirages par main et par nombre d\'adversaires')
+    parser.add_argument('--graine', type=int, default=None)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.graine)
+    debut = time.time()
+    matrice, egalites = construire_tete_a_tete(args.echantillons, rng)
+    print(f'Tête-à-tête : {time.time() - debut:.1f} s')
+    debut = time.time()
+    multi = construire_multi(args.echantillons_multi, rng)
+    print(f'Multi-joueurs : {time.time() - debut:.1f} s')
+    ecrire(args.sortie, matrice, egalites, multi)
+    print(f'Écrit dans {args.sortie}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""Profilage par échantillonnage et détection des blocages de la boucle eventlet.
+
+Un worker eventlet exécute toutes les tables dans un seul thread système :
+quand un traitement ne rend pas la main (abattage, diffusion de la liste des
+tables), tout le processus attend. Les deux outils ci-dessous observent ce
+thread depuis un thread système à part, qui continue de tourner pendant le
+blocage (il reprend le GIL à chaque intervalle de commutation de Python) :
+
+- ``Profileur`` relève la pile du thread de la boucle à intervalle régulier
+  et produit des piles repliées (``a;b;c nombre``), lisibles par
+  ``flamegraph.pl`` ou speedscope ;
+- ``SurveillantBoucle`` fait battre un cœur dans une tâche de la boucle ; si
+  le battement tarde au-delà d'un seuil, il relève la pile de la boucle et
+  signale le handler et la méthode de ``Partie`` en cours.
+"""
+
+import collections
+import os
+import sys
+import time
+
+from systeme import threading  # threads système même sous eventlet
+
+PERIODE_PROFIL = 0.005  # secondes entre deux échantillons
+PERIODE_BATTEMENT = 0.05  # secondes entre deux battements de la boucle
+
+
+def decrire(code):
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+def pile(frame):
+    """Codes de la pile, du plus externe au plus interne"""
+    codes = []
+    while frame is not None:
+        codes.append(frame.f_code)
+        frame = frame.f_back
+    codes.reverse()
+    return tuple(codes)
+
+
+class Profileur:
+    def __init__(self, periode=PERIODE_PROFIL):
+        self.ident = threading.get_ident()  # Thread système observé : celui qui crée le profileur
+        self.periode = periode
+        self.piles = collections.Counter()  # Pile (codes) -> échantillons
+        self.arret = threading.Event()
+        self.thread = threading.Thread(target=self.echantillonner, name='profileur', daemon=True)
+
+    def demarrer(self):
+        self.thread.start()
+
+    def echantillonner(self):
+        while not self.arret.wait(self.periode):
+            frame = sys._current_frames().get(self.ident)
+            if frame is not None:
+                self.piles[pile(frame)] += 1
+
+    def arreter(self):
+        """Arrête l'échantillonnage ; piles repliées, une par ligne"""
+        self.arret.set()
+        self.thread.join()
+        return ''.join(f'{";".join(decrire(code) for code in codes)} {nombre}\n'
+                       for codes, nombre in self.piles.most_common())
+
+
+class SurveillantBoucle:
+    def __init__(self, lancer, attendre, seuil, handlers, classe, periode=PERIODE_BATTEMENT):
+        self.attendre = attendre  # attendre(secondes) : sommeil coopératif
+        self.seuil = seuil  # secondes de retard avant de signaler un blocage
+        self.handlers = handlers  # code -> nom de l'événement Socket.IO
+        self.methodes = {f.__code__: f'{classe.__name__}.{nom}' for nom, f in vars(classe).items()
+                         if hasattr(f, '__code__')}
+        self.periode = periode
+        self.ident = threading.get_ident()  # Thread système de la boucle
+        self.battement = time.monotonic()
+        self.signale = False  # Blocage en cours déjà signalé
+        self.blocages = 0
+        self.retard_max = 0.0
+        self.arret = threading.Event()
+        lancer(self.battre)
+        threading.Thread(target=self.surveiller, name='surveillant', daemon=True).start()
+
+    def battre(self):
+        """Tâche de la boucle : note chaque réveil et mesure son retard"""
+        while True:
+            self.attendre(self.periode)
+            maintenant = time.monotonic()
+            retard = maintenant - self.battement - self.periode
+            self.battement = maintenant
+            self.retard_max = max(self.retard_max, retard)
+            if retard > self.seuil:
+                self.blocages += 1
+                print(f'Boucle bloquée {retard * 1000:.0f} ms', file=sys.stderr, flush=True)
+            self.signale = False
+
+    def surveiller(self):
+        """Thread système : relève la pile de la boucle quand le battement tarde"""
+        while not self.arret.wait(self.periode):
+            retard = time.monotonic() - self.battement - self.periode
+            if retard > self.seuil and not self.signale:
+                self.signale = True
+                frame = sys._current_frames().get(self.ident)
+                handler, methode = self.situer(frame)
+                print(f'Boucle bloquée depuis {retard * 1000:.0f} ms : événement {handler or "?"}, '
+                      f'{methode or "hors Partie"}, dans {decrire(frame.f_code) if frame else "?"}',
+                      file=sys.stderr, flush=True)
+
+    def situer(self, frame):
+        """(événement Socket.IO, méthode de Partie) en cours dans la pile"""
+        handler = methode = None
+        while frame is not None:
+            code = frame.f_code
+            if methode is None:
+                methode = self.methodes.get(code)
+            handler = self.handlers.get(code, handler)
+            frame = frame.f_back
+        return handler, methode
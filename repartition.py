@@ -0,0 +1,222 @@
+"""Répartition des tables entre plusieurs processus serveur (shards).
+
+Chaque table appartient à un seul processus, choisi par hachage cohérent de
+son identifiant : tout l'état d'une partie reste local et aucune action de
+jeu ne traverse le réseau. Un client qui veut créer ou rejoindre une table
+d'un autre shard est renvoyé vers l'URL de ce shard. Les processus partagent
+une file de messages Socket.IO, utilisée pour la liste des tables du lobby.
+
+Configuration par variables d'environnement :
+
+- ``POKER_SHARDS`` : URLs publiques des shards, séparées par des virgules
+  (vide : un seul processus, comportement par défaut) ;
+- ``POKER_SHARD`` : index de ce processus dans cette liste ;
+- ``POKER_MESSAGE_QUEUE`` : file partagée, ``redis://…``, ``kafka://…``, ou
+  ``local://hôte:port`` pour le courtier fourni par ce module.
+
+Usage :
+
+    python repartition.py courtier [--adresse 127.0.0.1:6000]
+    python repartition.py lancer [--shards 4] [--port 5000]
+"""
+
+import argparse
+import bisect
+import hashlib
+import os
+import subprocess
+import sys
+import threading
+from multiprocessing import Process
+from multiprocessing.connection import Client, Listener
+
+import socketio
+
+URLS = [url.strip() for url in os.environ.get('POKER_SHARDS', '').split(',') if url.strip()]
+SHARD = int(os.environ.get('POKER_SHARD', 0))
+MESSAGE_QUEUE = os.environ.get('POKER_MESSAGE_QUEUE') or None
+CLE_COURTIER = os.environ.get('POKER_COURTIER_CLE', 'poker').encode()
+REPLIQUES = 64  # Points par shard sur l'anneau
+
+
+def _hacher(texte):
+    return int.from_bytes(hashlib.blake2b(texte.encode(), digest_size=8).digest(), 'big')
+
+
+class AnneauCoherent:
+    """Hachage cohérent : ajouter un shard ne déplace qu'environ 1/N des tables"""
+    def __init__(self, shards, repliques=REPLIQUES):
+        points = sorted((_hacher(f'{shard}#{i}'), shard) for shard in shards for i in range(repliques))
+        self.cles = [cle for cle, _ in points]
+        self.shards = [shard for _, shard in points]
+
+    def shard(self, room_id):
+        return self.shards[bisect.bisect(self.cles, _hacher(room_id)) % len(self.cles)]
+
+
+anneau = AnneauCoherent(range(len(URLS))) if len(URLS) > 1 else None
+
+
+def proprietaire(room_id):
+    """Index du shard qui possède la table"""
+    return anneau.shard(room_id) if anneau else SHARD
+
+
+def est_locale(room_id):
+    return proprietaire(room_id) == SHARD
+
+
+def url(room_id):
+    """URL publique du shard qui possède la table"""
+    return URLS[proprietaire(room_id)]
+
+
+def options_socketio():
+    """Options de ``SocketIO`` selon la configuration (file partagée, origines)"""
+    options = {}
+    if MESSAGE_QUEUE and MESSAGE_QUEUE.startswith('local://'):
+        options['client_manager'] = GestionnaireLocal(MESSAGE_QUEUE)
+    elif MESSAGE_QUEUE:
+        options['message_queue'] = MESSAGE_QUEUE
+    if len(URLS) > 1:
+        options['cors_allowed_origins'] = URLS  # La page d'un shard se connecte aux autres
+    return options
+
+
+def limiter_file(gestionnaire, salles):
+    """Ne fait passer par la file que les émissions vers ``salles``
+
+    Les autres restent locales, ce qui évite un aller-retour par le courtier
+    et garde l'ordre entre les réponses d'un handler et les événements de table.
+    """
+    emettre = gestionnaire.emit
+
+    def emit(event, data, namespace=None, room=None, skip_sid=None, callback=None, **kwargs):
+        if room not in salles:
+            kwargs['ignore_queue'] = True
+        return emettre(event, data, namespace=namespace, room=room, skip_sid=skip_sid,
+                       callback=callback, **kwargs)
+
+    gestionnaire.emit = emit
+
+
+def suivre_emissions(gestionnaire, evenement, rappel):
+    """Appelle ``rappel(donnees)`` pour chaque ``evenement`` émis par un autre shard
+
+    Les émissions passent toutes par la file, y compris celles du processus
+    courant, qui sont ignorées ici.
+    """
+    traiter = gestionnaire._handle_emit
+
+    def _handle_emit(message):
+        if message.get('event') == evenement and message.get('host_id') != gestionnaire.host_id:
+            rappel(message['data'])
+        return traiter(message)
+
+    gestionnaire._handle_emit = _handle_emit
+
+
+class GestionnaireLocal(socketio.PubSubManager):
+    """File de messages Socket.IO passant par le courtier de ce module"""
+    name = 'local'
+
+    def __init__(self, url='local://127.0.0.1:6000', channel='socketio', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        hote, port = url[len('local://'):].rsplit(':', 1)
+        self.adresse = (hote, int(port))
+        self.connexion = None
+        self.verrou = threading.Lock()
+
+    def _connecter(self):
+        if self.connexion is None:
+            self.connexion = Client(self.adresse, authkey=CLE_COURTIER)
+        return self.connexion
+
+    def _publish(self, data):
+        with self.verrou:
+            self._connecter().send(data)
+
+    def _listen(self):
+        with self.verrou:
+            connexion = self._connecter()
+        while True:
+            # poll non bloquant : la boucle d'attente reste coopérative sous eventlet
+            if connexion.poll(0):
+                yield connexion.recv()
+            else:
+                self.server.sleep(0.005)
+
+
+def servir_courtier(adresse):
+    """Relaie chaque message reçu à toutes les connexions, émetteur compris"""
+    ecoute = Listener(adresse, authkey=CLE_COURTIER)
+    connexions = []
+    verrou = threading.Lock()
+
+    def relayer(connexion):
+        while True:
+            try:
+                message = connexion.recv_bytes()
+            except (EOFError, OSError):
+                break
+            with verrou:
+                for destinataire in list(connexions):
+                    try:
+                        destinataire.send_bytes(message)
+                    except OSError:
+                        connexions.remove(destinataire)
+        with verrou:
+            if connexion in connexions:
+                connexions.remove(connexion)
+
+    while True:
+        connexion = ecoute.accept()
+        with verrou:
+            connexions.append(connexion)
+        threading.Thread(target=relayer, args=(connexion,), daemon=True).start()
+
+
+def _adresse(texte):
+    hote, port = texte.rsplit(':', 1)
+    return hote, int(port)
+
+
+def lancer(shards, port, hote, adresse_courtier):
+    """Démarre le courtier local puis un processus ``main.py`` par shard"""
+    courtier = Process(target=servir_courtier, args=(adresse_courtier,), daemon=True)
+    courtier.start()
+    urls = ','.join(f'http://{hote}:{port + i}' for i in range(shards))
+    racine = os.path.dirname(os.path.abspath(__file__))
+    processus = []
+    for i in range(shards):
+        env = dict(os.environ, POKER_SHARDS=urls, POKER_SHARD=str(i), PORT=str(port + i),
+                   POKER_MESSAGE_QUEUE='local://%s:%d' % adresse_courtier)
+        processus.append(subprocess.Popen([sys.executable, os.path.join(racine, 'main.py')], env=env))
+    try:
+        for p in processus:
+            p.wait()
+    except KeyboardInterrupt:
+        for p in processus:
+            p.terminate()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commandes = parser.add_subparsers(dest='commande', required=True)
+    courtier = commandes.add_parser('courtier', help='courtier local de messages')
+    courtier.add_argument('--adresse', default='127.0.0.1:6000')
+    lanceur = commandes.add_parser('lancer', help='courtier et shards sur des ports consécutifs')
+    lanceur.add_argument('--shards', type=int, default=os.cpu_count() or 1)
+    lanceur.add_argument('--port', type=int, default=5000)
+    lanceur.add_argument('--hote', default='localhost')
+    lanceur.add_argument('--courtier', default='127.0.0.1:6000')
+    args = parser.parse_args()
+
+    if args.commande == 'courtier':
+        servir_courtier(_adresse(args.adresse))
+    else:
+        lancer(args.shards, args.port, args.hote, _adresse(args.courtier))
+
+
+if __name__ == '__main__':
+    main()
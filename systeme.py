@@ -0,0 +1,16 @@
+"""Module ``threading`` d'origine, même sous eventlet.
+
+Le worker eventlet remplace les threads par des tâches de la boucle
+(monkey patching). Les écrivains du journal et de l'historique (fsync) et
+les outils de profilage ont besoin de vrais threads système : ils importent
+``threading`` d'ici.
+"""
+
+import threading
+
+try:
+    from eventlet import patcher
+    if patcher.is_monkey_patched('thread'):
+        threading = patcher.original('threading')
+except ImportError:
+    pass